@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import json
+import numpy as np
+from getFlankUtils import read_ars, read_faidx, calc_boundary, find_territory
+from countUtils import read_bed_chunks, file_signature
+from profileUtils import Profiler, add_profile_args
+
+
+# nearest ARS (territory from calc_boundary), signed distance and leading strand flag of each read
+# forks moving right use plus strand as leading strand
+def annotate(path, arss, ars_orders, ars_index, chunksize=1000000):
+    parts = {'ars':[], 'distance':[], 'leading':[]}
+    total = 0
+    for chunk in read_bed_chunks(path, chunksize):
+        total += len(chunk)
+        chunk = chunk[chunk.strand.isin(['+', '-'])]
+        for chrom, reads in chunk.groupby('chrom', observed=True):
+            if chrom not in ars_orders:
+                continue
+            names = ars_orders[chrom]
+            idx, dist = find_territory(arss, names, reads.pos.to_numpy())
+            parts['ars'].append(np.array([ars_index[n] for n in names])[idx])
+            parts['distance'].append(dist)
+            parts['leading'].append((dist >= 0) == (reads.strand == '+').to_numpy())
+    dtypes = {'ars':np.int16 if len(ars_index) < 2**15 else np.int32, 'distance':np.int32, 'leading':bool}
+    return {k:np.concatenate(v).astype(dtypes[k]) if v else np.zeros(0, dtype=dtypes[k]) for k, v in parts.items()}, total
+
+
+# time group of each ARS, same as getFlankUtils.sep_ars: the largest separator below firing time
+def time_groups(times, ts):
+    ts = [0] + (ts or [])
+    return ts, np.clip(np.searchsorted(ts, times, side='left') - 1, 0, None)
+
+
+# counts in bins of the distance to ARS, for leading and lagging strand in each time group
+# bins are labeled like get_flanks.py: (i+1)*binsize for distance in [i*binsize, (i+1)*binsize) on both sides
+def rebin(reads, ars_times, binsize, flank, ts=None):
+    labels, groups = time_groups(ars_times, ts)
+    d = reads['distance'].astype(np.int64)
+    keep = (d >= -flank) & (d < flank)
+    d = d[keep]
+    k = np.where(d >= 0, d, -d - 1) // binsize
+    nbins = -(-flank // binsize)
+    g = groups[reads['ars'][keep]]
+    strand = (~reads['leading'][keep]).astype(np.int64)
+    counts = np.bincount((g * nbins + k) * 2 + strand, minlength=len(labels) * nbins * 2).reshape(len(labels), nbins, 2)
+    rows = []
+    for i, t in enumerate(labels):
+        for j in range(nbins):
+            for s, name in enumerate(['leading', 'lagging']):
+                rows.append([t, (j + 1) * binsize, name, int(counts[i, j, s])])
+    return rows
+
+
+def load_annotation(folder):
+    with open(os.path.join(folder, 'manifest.json')) as fr:
+        manifest = json.load(fr)
+    return manifest, {lib:np.load(os.path.join(folder, v['file'])) for lib, v in manifest['libraries'].items()}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = argparse.ArgumentParser(description='Annotate rNMPs with nearest ARS, signed distance, strand and firing time, and rebin them')
+    subparsers = parser.add_subparsers(dest='command')
+    parser_annotate = subparsers.add_parser('annotate', help='Annotate reads of libraries once')
+    parser_annotate.add_argument('ars', type=argparse.FileType('r'), help='Bed file for ars region with time')
+    parser_annotate.add_argument('index', type=argparse.FileType('r'), help='index file for background genome')
+    parser_annotate.add_argument('bed', nargs='+', help='rNMP bed files of libraries, library name is the file name without .bed')
+    parser_annotate.add_argument('-v', type=int, default=1600, help='Fork speed, base per minute')
+    parser_annotate.add_argument('--default_time', type=float, help='Firing time for ARS without time column, default=required')
+    parser_annotate.add_argument('--chunksize', type=int, default=1000000, help='Number of reads loaded at once, default=1000000')
+    parser_annotate.add_argument('-o', default='rnmp_annotation', help='Output folder, default=rnmp_annotation')
+    parser_bin = subparsers.add_parser('bin', help='Count annotated reads in bins around ARS')
+    parser_bin.add_argument('annotation', help='Folder written by annotate')
+    parser_bin.add_argument('-l', type=int, default=15000, help='Length of flank region, default=15000')
+    parser_bin.add_argument('-b', type=int, default=0, help='Bin size, default = flank length.')
+    parser_bin.add_argument('-t', type=float, default=None, nargs='+', help='separator of firing time')
+    parser_bin.add_argument('--libs', nargs='+', help='Libraries to count, default=all annotated libraries')
+    parser_bin.add_argument('-o', type=argparse.FileType('w'), default=sys.stdout, help='Output to file')
+    for p in [parser_annotate, parser_bin]:
+        add_profile_args(p)
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error('annotate or bin is needed')
+    prof = Profiler.from_args(args, f'annotate_reads {args.command}')
+
+    if args.command == 'annotate':
+        with prof.stage('read ARS') as st:
+            arss, ars_orders = read_ars(args.ars, args.default_time)
+            chrom_sizes = read_faidx(args.index)
+            ars_orders = {k:v for k, v in ars_orders.items() if k in chrom_sizes}
+            calc_boundary(arss, ars_orders, chrom_sizes, args.v, False)
+            names = [n for v in ars_orders.values() for n in v]
+            st['ars'] = len(names)
+        os.makedirs(args.o, exist_ok=True)
+        # ARS table, reads refer to ARS by row
+        ars_index = {n:i for i, n in enumerate(names)}
+        with open(os.path.join(args.o, 'ars.tsv'), 'w') as fw:
+            fw.write('Name\tChrom\tPosition\tTime\tLeft_boundary\tRight_boundary\n')
+            for n in names:
+                a = arss[n]
+                fw.write(f'{n}\t{a.chrom}\t{a.pos}\t{a.firing_time}\t{a.left_end_point}\t{a.right_end_point}\n')
+        libraries = {}
+        for path in args.bed:
+            name = os.path.basename(path).rsplit('.bed', 1)[0]
+            with prof.stage(f'annotate {name}') as st:
+                reads, st['reads'] = annotate(path, arss, ars_orders, ars_index, args.chunksize)
+                np.savez(os.path.join(args.o, f'{name}.npz'), **reads)
+                st['annotated'] = len(reads['distance'])
+            libraries[name] = {'file':f'{name}.npz', 'source':file_signature(path), 'reads':st['reads'], 'annotated':st['annotated']}
+        with open(os.path.join(args.o, 'manifest.json'), 'w') as fw:
+            json.dump({'ars':'ars.tsv', 'speed':args.v, 'ars_times':[arss[n].firing_time for n in names], 'libraries':libraries}, fw, indent=1)
+    else:
+        if args.b == 0:
+            args.b = args.l
+        with prof.stage('load') as st:
+            manifest, libraries = load_annotation(args.annotation)
+            st['libraries'] = len(libraries)
+        ars_times = np.array(manifest['ars_times'])
+        args.o.write('Library\tTime\tPosition\tStrand\tSum\n')
+        with prof.stage('rebin', binsize=args.b, flank=args.l):
+            for lib in (args.libs or list(libraries)):
+                for row in rebin(libraries[lib], ars_times, args.b, args.l, args.t):
+                    args.o.write('\t'.join([str(x) for x in [lib] + row]) + '\n')
+
+    prof.write()
+    print('Done!', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import io
+import json
+import time
+import platform
+import resource
+import subprocess
+import tracemalloc
+import contextlib
+import multiprocessing
+from collections import defaultdict
+import numpy as np
+import syntheticUtils as su
+
+CASES = ['read_data', 'bins', 'get_region', 'normalize', 'merge', 'calc_p', 'rate_simulation']
+
+
+# synthetic inputs in workdir, reused when the same parameters were generated before
+def generate(args):
+    os.makedirs(args.workdir, exist_ok=True)
+    params = {k:getattr(args, k) for k in ['reads', 'libs', 'ars', 'positions', 'binsize', 'seed']}
+    manifest = os.path.join(args.workdir, 'manifest.json')
+    if os.path.exists(manifest):
+        with open(manifest) as fr:
+            if json.load(fr) == params:
+                return
+    rng = np.random.default_rng(args.seed)
+    w = lambda x: os.path.join(args.workdir, x)
+    su.write_faidx(w('genome.fa.fai'))
+    su.write_ars(w('ars.bed'), su.make_ars(args.ars, rng))
+    libinfo = su.make_libinfo(args.libs)
+    su.write_libinfo(w('libinfo.tsv'), libinfo)
+    os.makedirs(w('libs'), exist_ok=True)
+    for lib in libinfo:
+        su.write_reads(w(f'libs/{lib[0]}.bed'), args.reads, rng)
+    # bin positions of the frequency tables, one row for each library, time, position and strand
+    positions = list(range(args.binsize, (args.positions + 1) * args.binsize, args.binsize))
+    su.make_freq_table(libinfo, positions, rng).to_csv(w('freq.tsv'), sep='\t', index=False)
+    su.make_bg_table('bench', positions, rng).to_csv(w('bg.tsv'), sep='\t')
+    for i in range(4):
+        su.write_count_file(w(f'count{i}.tsv'), libinfo, rng)
+    su.make_pvalue_table(libinfo, rng).to_csv(w('pvalue.tsv'), sep='\t', index=False)
+    with open(manifest, 'w') as fw:
+        json.dump(params, fw)
+    print(f'Synthetic data generated in {args.workdir}', file=sys.stderr)
+
+
+# each case takes workdir and arguments, and returns the number of processed items
+def case_read_data(d, args):
+    from checkTimeInputs import read_ars, generate_windows, read_data
+    with open(f'{d}/ars.bed') as fr:
+        ars = read_ars(fr)
+    windows = generate_windows(ars, args.flank, False)
+    read_data(windows, [f'L{i}' for i in range(args.libs)], f'{d}/libs')
+    return args.reads * args.libs
+
+
+def case_bins(d, args):
+    from getFlankUtils import read_ars, read_faidx, calc_boundary, sep_ars
+    with open(f'{d}/ars.bed') as fr:
+        arss, ars_orders = read_ars(fr)
+    with open(f'{d}/genome.fa.fai') as fr:
+        chrom_sizes = read_faidx(fr)
+    calc_boundary(arss, ars_orders, chrom_sizes, 1600, False, args.flank)
+    bins = defaultdict(lambda : defaultdict(lambda : defaultdict(list)))
+    for t, v in sep_ars(arss, None).items():
+        for name in v:
+            arss[name].add_bins(bins[t], args.binsize)
+    return sum(len(x) for v in bins.values() for v1 in v.values() for x in v1.values())
+
+
+def case_get_region(d, args):
+    import get_region
+    get_region.main([f'{d}/freq.tsv', '-s', '0', '-e', str(args.positions * args.binsize // 2), '-o', f'{d}/region.tsv'])
+    return count_lines(f'{d}/freq.tsv')
+
+
+def case_normalize(d, args):
+    import normalize_ars
+    normalize_ars.main([f'{d}/freq.tsv', f'{d}/bg.tsv', '--name', 'bench', '-o', f'{d}/norm.tsv'])
+    return count_lines(f'{d}/freq.tsv')
+
+
+def case_merge(d, args):
+    from checkTimeInputs import read_libinfo
+    from merge import read_files
+    with open(f'{d}/libinfo.tsv') as fr:
+        lib_info = {k:list(v) for k, v in read_libinfo(fr).items()}
+    frs = [open(f'{d}/count{i}.tsv') for i in range(4)]
+    df = read_files(frs, lib_info)
+    for fr in frs:
+        fr.close()
+    return len(df)
+
+
+def case_calc_p(d, args):
+    import calc_p_ars
+    calc_p_ars.main([f'{d}/pvalue.tsv', '-o', f'{d}/pvalue_out.tsv'])
+    return count_lines(f'{d}/pvalue.tsv')
+
+
+def case_rate_simulation(d, args):
+    from rate_simulation import PARAMS, simulate
+    params = dict(PARAMS)
+    params['nars'] = args.nars
+    simulate(params)
+    return args.nars
+
+
+def count_lines(path):
+    with open(path) as fr:
+        return sum(1 for _ in fr) - 1
+
+
+# run one case with timers, called in a fresh process
+def run_case(job):
+    name, args = job
+    func = globals()[f'case_{name}']
+    if args.tracemalloc:
+        tracemalloc.start()
+    # scripts report progress on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        wall, cpu = time.perf_counter(), time.process_time()
+        items = func(args.workdir, args)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    result = {'wall':wall, 'cpu':cpu, 'items':items, 'items_per_s':items / wall if wall > 0 else None}
+    if args.tracemalloc:
+        result['peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    scale = 2**20 if sys.platform == 'darwin' else 2**10
+    result['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    return result
+
+
+# run a case several times, each time in a new process so peak memory is not shared
+def measure(name, args):
+    ctx = multiprocessing.get_context('spawn')
+    runs = []
+    for _ in range(args.repeat):
+        with ctx.Pool(1) as pool:
+            runs.append(pool.apply(run_case, ([name, args],)))
+    best = min(runs, key=lambda x: x['wall'])
+    best['runs'] = [x['wall'] for x in runs]
+    return best
+
+
+def git_revision():
+    d = os.path.dirname(os.path.abspath(__file__))
+    try:
+        rev = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=d, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=d, capture_output=True, text=True).stdout.strip() != ''
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return rev, dirty
+
+
+# compare wall time with a previous result file
+def compare(path, results):
+    with open(path) as fr:
+        old = json.load(fr)
+    print(f'Compared with {old.get("revision")}:', file=sys.stderr)
+    for name, v in results.items():
+        if name in old['cases']:
+            o = old['cases'][name]['wall']
+            print(f'{name:<16}{o:10.3f}s {v["wall"]:10.3f}s {o / v["wall"]:8.2f}x', file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark ARS analysis steps on synthetic data')
+    parser.add_argument('-c', nargs='+', default=CASES, choices=CASES, help=f'Cases to run, default={CASES}')
+    parser.add_argument('--reads', type=int, default=1000000, help='Number of reads in each library, default=1000000')
+    parser.add_argument('--libs', type=int, default=4, help='Number of libraries, default=4')
+    parser.add_argument('--ars', type=int, default=400, help='Approximate number of ARS, default=400')
+    parser.add_argument('--flank', type=int, default=15000, help='Flank length, default=15000')
+    parser.add_argument('--binsize', type=int, default=100, help='Bin size for flank bins, default=100')
+    parser.add_argument('--positions', type=int, default=20000, help='Number of bin positions in frequency and background tables for get_region and normalize, default=20000')
+    parser.add_argument('--nars', type=int, default=4000, help='Number of simulated ARS for rate_simulation, default=4000')
+    parser.add_argument('--seed', type=int, default=1919, help='Random seed for synthetic data, default=1919')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of runs of each case, best is reported, default=1')
+    parser.add_argument('--tracemalloc', action='store_true', help='Trace peak Python memory, slows down the cases')
+    parser.add_argument('--workdir', default='benchmark_data', help='Folder for synthetic data, default=benchmark_data')
+    parser.add_argument('--compare', help='Previous result file to compare with')
+    parser.add_argument('-o', default='benchmark.json', help='Output JSON file, default=benchmark.json')
+    args = parser.parse_args(argv)
+    args.workdir = os.path.abspath(args.workdir)
+
+    generate(args)
+
+    results = {}
+    for name in args.c:
+        results[name] = measure(name, args)
+        r = results[name]
+        print(f'{name:<16}{r["wall"]:10.3f}s wall {r["cpu"]:10.3f}s cpu {r["items_per_s"]:14.1f} items/s {r["max_rss_mb"]:8.1f} MB', file=sys.stderr)
+
+    rev, dirty = git_revision()
+    report = {'revision':rev, 'dirty':dirty, 'date':time.strftime('%Y-%m-%dT%H:%M:%S'), \
+            'python':platform.python_version(), 'platform':platform.platform(), 'numpy':np.__version__, \
+            'params':{k:getattr(args, k) for k in ['reads', 'libs', 'ars', 'flank', 'binsize', 'positions', 'nars', 'seed', 'repeat']}, \
+            'cases':results}
+    with open(args.o, 'w') as fw:
+        json.dump(report, fw, indent=2)
+    if args.compare:
+        compare(args.compare, results)
+
+    print('Done!', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+import argparse
+from countUtils import build_index
+from profileUtils import Profiler, add_profile_args
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a position index of rNMP bed files for fast window counting')
+    parser.add_argument('bed', nargs='+', help='rNMP bed files of libraries, library name is the file name without .bed')
+    parser.add_argument('-o', default='rnmp_index', help='Index folder, default=rnmp_index')
+    parser.add_argument('--chunksize', type=int, default=1000000, help='Number of reads loaded at once, default=1000000')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'build_index')
+
+    with prof.stage('index', files=len(args.bed)) as st:
+        libraries = build_index(args.bed, args.o, args.chunksize)
+        st['reads'] = sum(v['reads'] for v in libraries.values())
+
+    prof.write()
+    print('Done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,13 +4,12 @@ import argparse
 import sys
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import scipy.stats as stats
-from sklearn import linear_model
-from matplotlib.ticker import FuncFormatter
+from permutationUtils import paired_permutation_test
+from profileUtils import Profiler, add_profile_args
+from storeUtils import open_store, add_store_args, region_table
 
-def main():
+def main(argv=None, data=None):
 
     # argparse
     parser = argparse.ArgumentParser(description='Run statistical test for ARS region comparison\n Strand: Wilcoxon, Time and flank: ')
@@ -20,13 +19,27 @@ def main():
     parser.add_argument('-m', type=int, default=100, help='Minimum number of ribose as threshold, default=100')
     parser.add_argument('-s', nargs='*',default=['leading', 'lagging'], help='[leading,lagging]')
     parser.add_argument('--ttest', action='store_true', help='Use paired t-test instead of Wilcoxon')
+    parser.add_argument('--test', default='wilcoxon', choices=['wilcoxon', 'ttest', 'permutation'], help='Paired test for leading/lagging comparison, default=wilcoxon')
+    parser.add_argument('--permutations', type=int, default=100000, help='Number of permutations for permutation test, exact test is used if all sign flips are fewer, default=100000')
+    parser.add_argument('--seed', type=int, default=1919, help='Random seed for permutation test, default=1919')
+    parser.add_argument('--threads', type=int, default=1, help='Number of processes for permutation test, default=1')
     parser.add_argument('-o', type=argparse.FileType('w'), default=sys.stdout, help='Output to file')
-    args = parser.parse_args()
+    add_store_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'calc_p_ars')
 
     le,la = args.s
+    if args.ttest:
+        args.test = 'ttest'
 
     # get information for bed file
-    df = pd.read_csv(args.ars, sep='\t')
+    with prof.stage('read') as st:
+        if args.store:
+            df = region_table(open_store(args.store), args.analysis, args.l, args.time_split, args.time_labels, pool_time=True)
+        else:
+            df = data.copy() if data is not None else pd.read_csv(args.ars, sep='\t')
+        st['rows'] = len(df)
     df['Genotype'] = pd.Categorical(df['Genotype'], ['WT', 'pip', 'rnh1', 'rnh201', 'RED'])
     df['RE'] = pd.Categorical(df['RE'], ['RE1', 'RE2', 'RE3'])
     df['String'] = pd.Categorical(df['String'], ['E134', 'BY4741', 'BY4742', 'YFP17', 'W303', 'S288C'])
@@ -42,16 +55,22 @@ def main():
     cols = df.columns
     feature = cols[7:]
     args.o.write('Time\tFlank\tGenotype\tNum\t' + '\t'.join(feature) + '\n')
-    for t in args.t:
-        for f in args.l:
-            for g in group:
-                da = df[(df.Time == t) & (df.Strand == le) & (df.Flank == f) & (df.Genotype.isin(g))]
-                db = df[(df.Time == t) & (df.Strand == la) & (df.Flank == f) & (df.Genotype.isin(g))]
-                if args.ttest:
-                    p = [stats.ttest_rel(da[x], db[x])[1] for x in feature]
-                else:
-                    p = [stats.wilcoxon(da[x], db[x])[1] for x in feature]
-                args.o.write('\t'.join([t,str(f),'&'.join(g), str(len(da))] + [str(x) for x in p]) +'\n')
+    with prof.stage(f'{args.test} tests', features=len(feature)) as st:
+        st['tests'] = 0
+        for t in args.t:
+            for f in args.l:
+                for g in group:
+                    da = df[(df.Time == t) & (df.Strand == le) & (df.Flank == f) & (df.Genotype.isin(g))]
+                    db = df[(df.Time == t) & (df.Strand == la) & (df.Flank == f) & (df.Genotype.isin(g))]
+                    if args.test == 'permutation':
+                        p = paired_permutation_test(da[feature].values, db[feature].values, n_perm=args.permutations, seed=args.seed, threads=args.threads)
+                    elif args.test == 'ttest':
+                        p = [stats.ttest_rel(da[x], db[x])[1] for x in feature]
+                    else:
+                        p = [stats.wilcoxon(da[x], db[x])[1] for x in feature]
+                    st['tests'] += len(feature)
+                    args.o.write('\t'.join([t,str(f),'&'.join(g), str(len(da))] + [str(x) for x in p]) +'\n')
+    prof.write()
     print('Done!')
 
 if __name__ == '__main__':
@@ -1,7 +1,5 @@
 import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 from collections import defaultdict
 from scipy.stats import linregress
 
@@ -26,17 +24,43 @@ def generate_summary(df):
     data = pd.concat(d)
     return data
 
+# column of ratio used for regression
+def get_ratio_feature(use_MLE_ratio=True, logrithm=True):
+    if logrithm:
+        return 'log_MLE_ratio' if use_MLE_ratio else 'log_ratio'
+    else:
+        return 'MLE_ratio' if use_MLE_ratio else 'Ratio'
+
+
+# linear regression of ratio with firing time for each genotype
+def ratio_regression(df, genotypes, use_MLE_ratio=True, logrithm=True):
+    feature = get_ratio_feature(use_MLE_ratio, logrithm)
+    d = []
+    for g in genotypes:
+        da = df[df.Genotype==g]
+        times = da.Firing_time.values
+        ratios = da[feature].values
+        # remove nan
+        times = times[~np.isnan(ratios)]
+        ratios = ratios[~np.isnan(ratios)]
+        # remove inf
+        ratios[ratios == np.inf] = np.max(ratios[ratios!=np.inf])
+        ratios[ratios == 0] = np.min(ratios[ratios!=0])
+        w,b,r2,_,_ = linregress(times, ratios)
+        d.append([g, feature, w, b, r2])
+    return pd.DataFrame(d, columns=['Genotype', 'Feature', 'Coefficient', 'Bias', 'R'])
+
+
 # draw scatter plot for ratio
 def draw_ratio_scatter(df, genotypes,output=None, use_MLE_ratio=True, logrithm=True, use_efficiency=False):
+    import seaborn as sns
+    import matplotlib.pyplot as plt
     palette = sns.hls_palette(16, l=0.5, s=1)
     palette = [palette[0], palette[14], '#003f3f','#000000']
     df = df[df.Genotype.isin(genotypes)]
     sns.set(style='ticks')
     fig, ax = plt.subplots(figsize=(10,8))
-    if logrithm:
-        feature = 'log_MLE_ratio' if use_MLE_ratio else 'log_ratio'
-    else:
-        feature = 'MLE_ratio' if use_MLE_ratio else 'Ratio'
+    feature = get_ratio_feature(use_MLE_ratio, logrithm)
     palette = palette[:len(df.Genotype.unique())]
     sns.scatterplot(x='Firing_time', y=feature, hue='Genotype', hue_order=genotypes, data=df, palette=palette, ax=ax)
     if use_efficiency:
@@ -49,17 +73,8 @@ def draw_ratio_scatter(df, genotypes,output=None, use_MLE_ratio=True, logrithm=T
     r2s = {}
     c=0
     title = 'Leading/lagging ratio with ARS firing time'
-    for g in genotypes:
-        da = df[df.Genotype==g]
-        times = da.Firing_time.values
-        ratios = da[feature].values
-        # remove nan
-        times = times[~np.isnan(ratios)]
-        ratios = ratios[~np.isnan(ratios)]
-        # remove inf
-        ratios[ratios == np.inf] = np.max(ratios[ratios!=np.inf])
-        ratios[ratios == 0] = np.min(ratios[ratios!=0])
-        w,b,r2,_,_ = linregress(times, ratios)
+    regr = ratio_regression(df, genotypes, use_MLE_ratio, logrithm)
+    for g, w, b, r2 in zip(regr.Genotype, regr.Coefficient, regr.Bias, regr.R):
         plt.plot(xlim,[xlim[0]*w+b, xlim[1]*w+b], c=palette[c], linewidth=3)
         # store infomation
         title += '\n{}: Coefficient={:.4f}, bias={:.4f}, R-square={:.4f}'.format(g, w,b, r2)
@@ -1,5 +1,11 @@
+import os
+import sys
+import json
 from collections import defaultdict
+import numpy as np
 import pandas as pd
+from countUtils import file_signature
+from storeUtils import add_libraries, add_windows, add_counts
 
 # read lib info
 def read_libinfo(fr):
@@ -12,14 +18,34 @@ def read_libinfo(fr):
     return libinfo
 
 
-# read ars
-def read_ars(fr):
+# read chromosome alias table: alias and the name used in output, tab separated
+def read_alias(fr):
+    alias = {}
+    for l in fr:
+        ws = l.rstrip('\n').split('\t')
+        if l.startswith('#') or len(ws) < 2:
+            continue
+        alias[ws[0]] = ws[1]
+    return alias
+
+
+# read ars, chromosome names are normalized with alias table
+# default firing time is used for ARS without time column
+def read_ars(fr, alias=None, default_time=None):
     ars = defaultdict(list)
     for l in fr:
-        ws = l.split('\t')
+        ws = l.rstrip('\n').split('\t')
         if len(ws) < 4:
             continue
-        ars[ws[0]].append((ws[0], int(ws[1]), int(ws[2]), float(ws[4])))
+        if len(ws) > 4:
+            t = float(ws[4])
+        elif default_time is not None:
+            t = default_time
+        else:
+            sys.exit(f'{fr.name}: ARS {ws[3]} has no firing time (column 5), use --default_time')
+        if alias:
+            ws[0] = alias.get(ws[0], ws[0])
+        ars[ws[0]].append((ws[0], int(ws[1]), int(ws[2]), t))
     return ars
 
 
@@ -72,26 +98,65 @@ def remove_ribosomal(windows):
     return win
 
 # read data from bed file
-def read_data(ars, libs, folder):
+def read_data(ars, libs, folder, alias=None):
+    return read_data_sets([ars], libs, folder, alias)[0]
+
+
+# read data of several window sets from bed file, each read is checked against all sets in one pass
+# reads on strands other than + and - have no leading or lagging strand and are skipped, as in build_index
+def read_data_sets(window_sets, libs, folder, alias=None):
     # initialization
-    data = {}
-    for a in ars:
-        data[a] = {'leading':defaultdict(int), 'lagging':defaultdict(int)}
+    data_sets = []
+    for ars in window_sets:
+        data = {}
+        for a in ars:
+            data[a] = {'leading':defaultdict(int), 'lagging':defaultdict(int)}
+        data_sets.append(data)
     # read bed pair
     for lib in libs:
         with open(folder + '/{}.bed'.format(lib)) as fr:
             for l in fr:
                 ws = l.rstrip('\n').split('\t')
-                if len(ws) != 6:
+                if len(ws) != 6 or ws[5] not in ('+', '-'):
                     continue
+                if alias:
+                    ws[0] = alias.get(ws[0], ws[0])
                 ws[1] = int(ws[1])
                 ws[2] = int(ws[2])
-                pos = find_pos(ws, ars, 0, len(ars)-1)
-                if pos:
-                    if ws[5] == pos[5]:
-                        data[pos]['leading'][lib] += 1
-                    else :
-                        data[pos]['lagging'][lib] += 1
+                for ars, data in zip(window_sets, data_sets):
+                    pos = find_pos(ws, ars, 0, len(ars)-1)
+                    if pos:
+                        if ws[5] == pos[5]:
+                            data[pos]['leading'][lib] += 1
+                        else :
+                            data[pos]['lagging'][lib] += 1
+    return data_sets
+
+
+# count reads in windows from a position index (countUtils.CountIndex) instead of bed files
+# same result as read_data for single base reads and non-overlapping windows
+def read_index(ars, libs, index, alias=None):
+    data = {}
+    groups = defaultdict(list)
+    for a in ars:
+        data[a] = {'leading':defaultdict(int), 'lagging':defaultdict(int)}
+        groups[(a[0], a[5])].append(a)
+    for lib in libs:
+        # chromosome names in the index of each normalized name
+        names = defaultdict(list)
+        for c in index.chroms(lib):
+            names[alias.get(c, c) if alias else c].append(c)
+        for (chrom, strand), ws in groups.items():
+            starts = np.array([w[1] for w in ws])
+            ends = np.array([w[2] for w in ws])
+            other = '-' if strand == '+' else '+'
+            for s, key in [[strand, 'leading'], [other, 'lagging']]:
+                counts = np.zeros(len(ws), dtype=np.int64)
+                for c in names[chrom]:
+                    counts += index.count(lib, c, s, starts, ends)
+                for w, c in zip(ws, counts):
+                    if c:
+                        data[w][key][lib] += int(c)
     return data
 
 
@@ -151,3 +216,75 @@ def generate_df(data, libinfo):
             'Leading','Lagging'])
     return df
 
+
+
+# source bed file signature of each library, from the bed folder or the index manifest
+def library_sources(libs, folder, index=None):
+    if index:
+        return {lib:index.libraries[lib]['source'] for lib in libs if lib in index.libraries}
+    paths = {lib:os.path.join(folder, f'{lib}.bed') for lib in libs}
+    return {lib:file_signature(p) for lib, p in paths.items() if os.path.exists(p)}
+
+
+# write windows and counts of a dataframe from generate_df to a count store
+def store_df(conn, analysis, df, l, libinfo, sources=None):
+    add_libraries(conn, libinfo, sources)
+    first = df[df.Library == df.Library.iloc[0]]
+    add_windows(conn, analysis, zip(first.Window_chr, first.Window_start, first.Window_end, [None]*len(first), \
+            first.Firing_time, [l]*len(first), first.Leading_pos))
+    add_counts(conn, analysis, {lib:(v.Leading.to_numpy(), v.Lagging.to_numpy()) for lib, v in df.groupby('Library', sort=False)})
+
+
+# parameters that decide the windows, saved next to the data csv
+def run_params(ars_path, l, block_ribosomal, alias_path=None, default_time=None):
+    ars = file_signature(ars_path) if os.path.exists(ars_path) else ars_path
+    params = {'ars':ars, 'l':l, 'block_ribosomal':block_ribosomal}
+    if default_time is not None:
+        params['default_time'] = default_time
+    if alias_path:
+        params['alias'] = file_signature(alias_path) if os.path.exists(alias_path) else alias_path
+    return params
+
+
+def write_sources(basename, params, sources):
+    with open(basename + '_data.json', 'w') as fw:
+        json.dump({'params':params, 'libraries':sources}, fw, indent=1)
+
+
+# data and library sources of a previous run with the same parameters, None if not usable
+def read_previous(basename, params):
+    path = basename + '_data.json'
+    if not os.path.exists(path) or not os.path.exists(basename + '_data.csv'):
+        return None
+    with open(path) as fr:
+        previous = json.load(fr)
+    if previous['params'] != params:
+        return None
+    return pd.read_csv(basename + '_data.csv'), previous['libraries']
+
+
+# libraries without counts or with changed source file
+def changed_libraries(libs, df, previous, sources):
+    counted = set(df.Library.astype(str))
+    return [lib for lib in libs if lib not in counted or lib not in previous or previous[lib] != sources.get(lib)]
+
+
+# windows of a dataframe from generate_df, in the original order
+def windows_from_df(df):
+    first = df[df.Library == df.Library.iloc[0]]
+    return list(zip(first.Window_chr.tolist(), first.Window_start.tolist(), first.Window_end.tolist(), \
+            first.Firing_time.tolist(), ['leading']*len(first), first.Leading_pos.tolist()))
+
+
+# replace rows of recounted libraries, drop libraries not in the list, keep the order of the list
+# new is None when no library was counted
+def update_df(df, new, libinfo):
+    recounted = [] if new is None else new.Library
+    df = df[df.Library.astype(str).isin(libinfo) & ~df.Library.astype(str).isin(recounted)].copy()
+    df['Library'] = df.Library.astype(str)
+    for i, c in enumerate(['String', 'Genotype', 'RESet']):
+        df[c] = df.Library.map(lambda x: libinfo[x][i])
+    if new is not None:
+        df = pd.concat([df, new])
+    order = {k:i for i, k in enumerate(libinfo)}
+    return df.iloc[np.argsort(df.Library.map(order).to_numpy(), kind='stable')].reset_index(drop=True)
@@ -1,54 +1,147 @@
 #!/usr/bin/env python3
 
 import argparse
+import os
 import sys
 import pandas as pd
 from checkTimeInputs import *
 from checkTimeCalcs import *
+from renderUtils import write_table
+from profileUtils import Profiler, add_profile_args
+from countUtils import CountIndex
+from storeUtils import open_store
 
-def main():
+def main(argv=None):
 
     # argparse
     parser = argparse.ArgumentParser(description='check whether ARS firing time could affect the ribonucleotide incorporation')
-    parser.add_argument('ars', type=argparse.FileType('r'), help='Bed file for ars region with time')
+    parser.add_argument('ars', type=argparse.FileType('r'), nargs='+', help='Bed files for ars region with time, results of several files are tagged by file name')
     parser.add_argument('list', type=argparse.FileType('r'), help='List for bed file with genotype')
     parser.add_argument('-csv', help='Start from a generated dataframe csv file, skip data reading')
     parser.add_argument('-bed', default='.', help='Folder of bed file, default=\'.\'')
+    parser.add_argument('--update', action='store_true', help='Only count libraries that are new or changed since the last run with the same -o, and add them to its data csv')
+    parser.add_argument('--index', help='Count reads from a position index built by build_index.py instead of bed files')
+    parser.add_argument('--alias', type=argparse.FileType('r'), help='Chromosome alias table: alias and name used in output, tab separated')
+    parser.add_argument('--default_time', type=float, help='Firing time for ARS without time column, default=required')
     parser.add_argument('-l', type=int, default=15000, help='Length of flank region, default=15000')
     parser.add_argument('-o', default='Output', help='Output file basename')
     parser.add_argument('--block_ribosomal', action='store_false',  help='Do not block ribosomal DNA')
     parser.add_argument('--efficiency', action='store_true', help='Use efficiency instead of time')
-    args = parser.parse_args()
+    parser.add_argument('--store', help='Also write windows and counts to a SQLite store')
+    parser.add_argument('--analysis', default='check_time', help='Analysis name of the counts in the store, default=check_time')
+    parser.add_argument('--data-only', action='store_true', help='Only write summary and regression tables')
+    parser.add_argument('--format', default='tsv', choices=['tsv', 'parquet'], help='Table format for --data-only, default=tsv')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'check_time')
 
     # read lib info
     libinfo = read_libinfo(args.list)
     libs = list(libinfo.keys())
     print('Libraries:' + ','.join(libs))
 
+    # annotation sets, results are tagged by ARS file name when there are several
+    if args.csv and len(args.ars) > 1:
+        parser.error('-csv takes one ARS file')
+    alias = read_alias(args.alias) if args.alias else None
+    tags = [os.path.basename(fr.name).split('.')[0] for fr in args.ars] if len(args.ars) > 1 else [None]
+    if len(set(tags)) < len(tags):
+        parser.error('ARS files need different names')
+    basenames = [args.o if t is None else f'{args.o}_{t}' for t in tags]
+    analyses = [args.analysis if t is None else f'{args.analysis}_{t}' for t in tags]
+
     # read data
+    dfs = []
     if not args.csv:
-        # read ars
-        ars = read_ars(args.ars)
-        print('ARS information read!')
-        # extend position
-        windows = generate_windows(ars, args.l, args.block_ribosomal)
-        # add data
-        data = read_data(windows, libs, args.bed)
-        df = generate_df(data, libinfo)
-        df.to_csv(args.o + '_data.csv', index=False)
+        index = CountIndex(args.index) if args.index else None
+        sources = library_sources(libs, args.bed, index)
+        params = [run_params(fr.name, args.l, args.block_ribosomal, args.alias.name if args.alias else None, args.default_time) for fr in args.ars]
+        previous = [read_previous(o, p) if args.update else None for o, p in zip(basenames, params)]
+        if all(previous):
+            # count new or changed libraries in the windows of the previous run
+            window_sets = [windows_from_df(x[0]) for x in previous]
+            counted = [lib for lib in libs if any(lib in changed_libraries(libs, *x, sources) for x in previous)]
+            print(f'{len(counted)} new or changed libraries: ' + ','.join(counted))
+        else:
+            if args.update:
+                print('No previous data with the same ARS file and options, count all libraries')
+            previous = [None] * len(tags)
+            window_sets = []
+            for fr in args.ars:
+                # read ars
+                with prof.stage(f'read ARS {fr.name}') as st:
+                    ars = read_ars(fr, alias, args.default_time)
+                    st['ars'] = sum(len(v) for v in ars.values())
+                # extend position
+                with prof.stage(f'build windows {fr.name}') as st:
+                    window_sets.append(generate_windows(ars, args.l, args.block_ribosomal))
+                    st['windows'] = len(window_sets[-1])
+            print('ARS information read!')
+            counted = libs
+        # add data, one library at a time, all annotation sets in one pass
+        data_sets = [{} for x in window_sets]
+        for lib in counted:
+            with prof.stage(f'count {lib}') as st:
+                if index:
+                    ds = [read_index(windows, [lib], index, alias) for windows in window_sets]
+                else:
+                    ds = read_data_sets(window_sets, [lib], args.bed, alias)
+                st['reads_in_windows'] = sum(sum(c.values()) for d in ds for v in d.values() for c in v.values())
+            for data, d in zip(data_sets, ds):
+                for k, v in d.items():
+                    if k not in data:
+                        data[k] = v
+                    else:
+                        data[k]['leading'].update(v['leading'])
+                        data[k]['lagging'].update(v['lagging'])
+        for o, p, prev, data in zip(basenames, params, previous, data_sets):
+            with prof.stage('build DataFrame') as st:
+                # nothing to count when libraries are unchanged or only removed
+                new = generate_df(data, {k:libinfo[k] for k in counted}) if counted else None
+                df = update_df(prev[0], new, libinfo) if prev else new
+                st['rows'] = len(df)
+            with prof.stage('write data', rows=len(df)):
+                df.to_csv(o + '_data.csv', index=False)
+                write_sources(o, p, sources)
+            dfs.append(df)
     else:
-        df = pd.read_csv(args.csv)
+        with prof.stage('read csv') as st:
+            dfs.append(pd.read_csv(args.csv))
+            st['rows'] = len(dfs[0])
     print('Data read!')
 
-    # generate summary
-    df_summary = generate_summary(df)
-    genotypes=df_summary.Genotype.unique()
-    genotypes_possible = ['Rrnh201','EMrnh201','rnh201','WT']
-    genotypes_used = [x for x in genotypes_possible if x in genotypes]
-    # plot
-    draw_ratio_scatter(df_summary, genotypes_used, output=args.o+'_MLE_scatter.png', use_efficiency=args.efficiency)
-    draw_ratio_scatter(df_summary, genotypes_used, output=args.o+'_mean_scatter.png', use_MLE_ratio=False, use_efficiency=args.efficiency)
+    for o, analysis, df in zip(basenames, analyses, dfs):
+        # store
+        if args.store:
+            with prof.stage('store', rows=len(df)):
+                conn = open_store(args.store)
+                store_df(conn, analysis, df, args.l, libinfo, library_sources(libs, args.bed, index if not args.csv else None))
+                conn.close()
+
+        # generate summary
+        with prof.stage('summary'):
+            df_summary = generate_summary(df)
+        genotypes=df_summary.Genotype.unique()
+        genotypes_possible = ['Rrnh201','EMrnh201','rnh201','WT']
+        genotypes_used = [x for x in genotypes_possible if x in genotypes]
+        # no regression on one firing time, e.g. a set without time column read with --default_time
+        if df_summary.Firing_time.nunique() < 2:
+            print(f'{o}: fewer than two firing times, regression and scatter plots are skipped')
+            write_table(df_summary, o + '_summary', args.format)
+            continue
+        if args.data_only:
+            regr = pd.concat([ratio_regression(df_summary, genotypes_used, use_MLE_ratio=x) for x in [True, False]])
+            write_table(df_summary, o + '_summary', args.format)
+            write_table(regr, o + '_regression', args.format)
+            continue
+
+        # plot
+        with prof.stage(f'render {o}_MLE_scatter.png'):
+            draw_ratio_scatter(df_summary, genotypes_used, output=o+'_MLE_scatter.png', use_efficiency=args.efficiency)
+        with prof.stage(f'render {o}_mean_scatter.png'):
+            draw_ratio_scatter(df_summary, genotypes_used, output=o+'_mean_scatter.png', use_MLE_ratio=False, use_efficiency=args.efficiency)
 
+    prof.write()
     print('Done!')
 
 
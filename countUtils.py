@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+
+
+# read a 6 column rNMP bed file in chunks: chrom, rNMP position (start) and strand
+def read_bed_chunks(path, chunksize=1000000):
+    reader = pd.read_csv(path, sep='\t', header=None, usecols=[0, 1, 5], names=['chrom', 'pos', 'strand'], \
+            dtype={'chrom':'category', 'pos':np.int64, 'strand':'category'}, comment='#', chunksize=chunksize)
+    for chunk in reader:
+        yield chunk
+
+
+# count rNMPs on + and - strand at each base, one array of shape (2, size) for each chromosome
+# counts are added to an existing dict when given, so several libraries can be pooled
+# reads on unknown chromosomes or outside the chromosome are skipped
+def count_strands(path, chrom_sizes, counts=None, chunksize=1000000):
+    if counts is None:
+        counts = {c:np.zeros((2, s), dtype=np.int32) for c, s in chrom_sizes.items()}
+    total = 0
+    for chunk in read_bed_chunks(path, chunksize):
+        total += len(chunk)
+        strands = [(chunk.strand == x).to_numpy() for x in ['+', '-']]
+        pos = chunk.pos.to_numpy()
+        codes = chunk.chrom.cat.codes.to_numpy()
+        for i, chrom in enumerate(chunk.chrom.cat.categories):
+            if chrom not in counts:
+                continue
+            size = counts[chrom].shape[1]
+            sel = (codes == i) & (pos >= 0) & (pos < size)
+            for k, s in enumerate(strands):
+                p = pos[sel & s]
+                if len(p):
+                    counts[chrom][k] += np.bincount(p, minlength=size).astype(np.int32)
+    return counts, total
+
+
+# round to significant digits
+def round_sig(values, digits):
+    mag = np.floor(np.log10(np.abs(np.where(values == 0, 1, values))))
+    scale = 10.0 ** (digits - 1 - mag)
+    return np.round(values * scale) / scale
+
+
+# write values of consecutive steps as bedGraph, merging equal neighbours and skipping NaN
+def write_step_bedgraph(fw, chrom, values, step, length, digits=6):
+    nan = np.isnan(values)
+    values = np.where(nan, np.nan, round_sig(np.where(nan, 0, values), digits))
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    ends = np.r_[starts[1:], len(values)]
+    keep = ~nan[starts]
+    fw.write(''.join([f'{chrom}\t{s*step}\t{min(e*step, length)}\t{v:.{digits}g}\n' \
+            for s, e, v in zip(starts[keep], ends[keep], values[starts[keep]])]))
+
+
+# signature of a source file, to find out whether an index is outdated
+def file_signature(path):
+    st = os.stat(path)
+    return {'path':os.path.abspath(path), 'size':st.st_size, 'mtime':st.st_mtime}
+
+
+# build a position index of one library: sorted rNMP positions of each chromosome and strand
+# reads on strands other than + and - are not indexed, read_data skips them too
+# positions are stored in one .npy file, with offsets of each chromosome and strand in the manifest
+def index_library(path, folder, name, chunksize=1000000):
+    parts = defaultdict(list)
+    total = 0
+    for chunk in read_bed_chunks(path, chunksize):
+        total += len(chunk)
+        chunk = chunk[chunk.strand.isin(['+', '-'])]
+        for (chrom, strand), pos in chunk.groupby(['chrom', 'strand'], observed=True).pos:
+            parts[(chrom, strand)].append(pos.to_numpy())
+    dtype = np.int32
+    if parts and max(max(x.max() for x in v) for v in parts.values()) >= 2**31:
+        dtype = np.int64
+    offsets = defaultdict(dict)
+    arrays = []
+    start = 0
+    for chrom, strand in sorted(parts):
+        pos = np.sort(np.concatenate(parts[(chrom, strand)]).astype(dtype))
+        offsets[chrom][strand] = [start, start + len(pos)]
+        start += len(pos)
+        arrays.append(pos)
+    np.save(os.path.join(folder, f'{name}.npy'), np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype))
+    return {'file':f'{name}.npy', 'source':file_signature(path), 'reads':total, 'offsets':offsets}
+
+
+# build or update index of several libraries, library name is the bed file name without .bed
+def build_index(paths, folder, chunksize=1000000):
+    os.makedirs(folder, exist_ok=True)
+    manifest = os.path.join(folder, 'manifest.json')
+    libraries = {}
+    if os.path.exists(manifest):
+        with open(manifest) as fr:
+            libraries = json.load(fr)['libraries']
+    for path in paths:
+        name = os.path.basename(path).rsplit('.bed', 1)[0]
+        if name in libraries and libraries[name]['source'] == file_signature(path):
+            continue
+        libraries[name] = index_library(path, folder, name, chunksize)
+        print(f'{name} indexed', file=sys.stderr)
+    with open(manifest, 'w') as fw:
+        json.dump({'version':1, 'libraries':libraries}, fw, indent=1)
+    return libraries
+
+
+# count queries on an index, position arrays are memory-mapped when first used
+class CountIndex(object):
+    def __init__(self, folder):
+        self.folder = folder
+        with open(os.path.join(folder, 'manifest.json')) as fr:
+            self.libraries = json.load(fr)['libraries']
+        self.arrays = {}
+        for name, v in self.libraries.items():
+            path = v['source']['path']
+            if os.path.exists(path) and file_signature(path) != v['source']:
+                print(f'Warning: {path} changed after {name} was indexed', file=sys.stderr)
+
+    def chroms(self, lib):
+        if lib not in self.libraries:
+            raise KeyError(f'Library {lib} is not in index {self.folder}')
+        return list(self.libraries[lib]['offsets'])
+
+    def positions(self, lib, chrom, strand):
+        if lib not in self.libraries:
+            raise KeyError(f'Library {lib} is not in index {self.folder}')
+        if lib not in self.arrays:
+            self.arrays[lib] = np.load(os.path.join(self.folder, self.libraries[lib]['file']), mmap_mode='r')
+        start, end = self.libraries[lib]['offsets'].get(chrom, {}).get(strand, [0, 0])
+        return self.arrays[lib][start:end]
+
+    # number of rNMPs with position in [starts, ends) on a strand, starts and ends can be arrays
+    def count(self, lib, chrom, strand, starts, ends):
+        pos = self.positions(lib, chrom, strand)
+        return np.searchsorted(pos, ends, side='left') - np.searchsorted(pos, starts, side='left')
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+from collections import defaultdict
+import numpy as np
+from genomeUtils import pack_genome, PackedGenome, context_names
+from countUtils import CountIndex
+from profileUtils import Profiler, add_profile_args
+
+
+# read regions of a bed file: chrom, start, end and strand
+def read_regions(path):
+    regions = defaultdict(list)
+    with open(path) as fr:
+        for l in fr:
+            ws = l.rstrip('\n').split('\t')
+            if len(ws) < 6:
+                continue
+            regions[(ws[0], ws[5])].append((int(ws[1]), int(ws[2])))
+    return {k:np.array(v, dtype=np.int64).reshape(-1, 2) for k, v in regions.items()}
+
+
+# all positions in [starts, ends)
+def expand(starts, ends):
+    lengths = np.maximum(ends - starts, 0)
+    offsets = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+    return np.arange(lengths.sum()) + offsets
+
+
+# context counts of rNMPs on the strand of the regions
+def count_library(genome, index, lib, regions, mode, tri):
+    counts = np.zeros(len(context_names(mode, tri)), dtype=np.int64)
+    for (chrom, strand), r in regions.items():
+        if chrom not in genome.chroms:
+            continue
+        pos = index.positions(lib, chrom, strand)
+        lo = np.searchsorted(pos, r[:, 0], side='left')
+        hi = np.searchsorted(pos, r[:, 1], side='left')
+        p = np.asarray(pos)[expand(lo, hi)]
+        counts = counts + genome.count_contexts(chrom, p, np.full(len(p), strand == '-'), mode, tri)
+    return counts
+
+
+# context counts of all bases in the regions, on the strand of the regions
+def count_background(genome, regions, mode, tri):
+    counts = np.zeros(len(context_names(mode, tri)), dtype=np.int64)
+    for (chrom, strand), r in regions.items():
+        if chrom not in genome.chroms:
+            continue
+        p = expand(r[:, 0], r[:, 1])
+        counts = counts + genome.count_contexts(chrom, p, np.full(len(p), strand == '-'), mode, tri)
+    return counts
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = argparse.ArgumentParser(description='Count nucleotide context of rNMPs from a 2-bit packed genome')
+    subparsers = parser.add_subparsers(dest='command')
+    parser_pack = subparsers.add_parser('pack', help='Pack a fasta file into a 2-bit genome')
+    parser_pack.add_argument('fasta', help='Reference genome fasta file')
+    parser_pack.add_argument('--fai', help='Index of fasta file, default=<fasta>.fai')
+    parser_pack.add_argument('-o', default='genome_2bit', help='Output folder, default=genome_2bit')
+    parser_count = subparsers.add_parser('count', help='Count rNMP contexts in regions')
+    parser_count.add_argument('genome', help='Folder written by pack')
+    parser_count.add_argument('regions', nargs='+', help='Bed files of regions with strand, e.g. bins from get_flanks.py. Each file is one row, named by the file name without .bed')
+    parser_count.add_argument('--index', required=True, help='Position index of libraries built by build_index.py')
+    parser_count.add_argument('--libs', nargs='+', help='Libraries to count, default=all libraries in the index')
+    parser_count.add_argument('--mode', default='mono', choices=['mono', 'rn', 'nr', 'tri'], help='Context: rNMP only, rNMP and downstream base, upstream base and rNMP, or trinucleotide, default=mono')
+    parser_count.add_argument('--tri', type=int, default=2, choices=[1, 2, 3], help='rNMP position in trinucleotide, default=2')
+    parser_count.add_argument('--background', type=argparse.FileType('w'), help='Also write context counts of all bases in each region file')
+    parser_count.add_argument('-o', type=argparse.FileType('w'), default=sys.stdout, help='Output to file')
+    for p in [parser_pack, parser_count]:
+        add_profile_args(p)
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error('pack or count is needed')
+    prof = Profiler.from_args(args, f'count_context {args.command}')
+
+    if args.command == 'pack':
+        with prof.stage('pack') as st:
+            with open(args.fai or args.fasta + '.fai') as fai:
+                chroms = pack_genome(args.fasta, fai, args.o)
+            st['bases'] = sum(v['length'] for v in chroms.values())
+    else:
+        genome = PackedGenome(args.genome)
+        index = CountIndex(args.index)
+        libs = args.libs or list(index.libraries)
+        header = 'chrom\t' + '\t'.join(context_names(args.mode, args.tri)) + '\n'
+        args.o.write(header)
+        if args.background:
+            args.background.write(header)
+        for path in args.regions:
+            name = os.path.basename(path).rsplit('.bed', 1)[0]
+            regions = read_regions(path)
+            with prof.stage(f'count {name}', libraries=len(libs)):
+                for lib in libs:
+                    counts = count_library(genome, index, lib, regions, args.mode, args.tri)
+                    args.o.write('\t'.join([f'{lib}-{name}'] + [str(x) for x in counts]) + '\n')
+            if args.background:
+                with prof.stage(f'background {name}'):
+                    counts = count_background(genome, regions, args.mode, args.tri)
+                    args.background.write('\t'.join([name] + [str(x) for x in counts]) + '\n')
+
+    prof.write()
+    print('Done!', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
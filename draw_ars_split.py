@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 
 import argparse
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib.ticker import FuncFormatter, ScalarFormatter
 import sys
+from renderUtils import render_jobs, write_table
+from profileUtils import Profiler, add_profile_args
+from storeUtils import open_store, add_store_args, bin_table
 
 # turn off warning
 pd.options.mode.chained_assignment = None
@@ -55,7 +56,127 @@ def hide_label(fig, ax):
         tick.label.set_fontsize(36)
 
 
-def main():
+# formatter for scientific
+def my_scientific_format(y, pos=None):
+    a = f'{y:.1E}'
+    m, e = a.split('E')
+    e = e.replace('+0','')
+    e = e.replace('-0','-')
+    return f'{m}E{e}'
+
+
+# line chart for leading/lagging ratio of a genotype
+def draw_ratio(db, tr, r, colort, output, hy=False, no_label=False, same_scale=False):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.ticker import ScalarFormatter
+    sns.set(style='whitegrid')
+    fig, ax = plt.subplots(figsize=(9,9))
+    sns.lineplot(x='Position', y=r, hue='Time', data=db, palette=colort, linewidth=4)
+    # add std
+    facecolors = ['#cc99cc', '#99cc99']
+    c = 0
+    for t in db.Time.unique():
+        dc = db[db.Time == t].sort_values('Position')
+        ax.fill_between(dc.Position, dc[r] + dc.Std, dc[r] - dc.Std, facecolor = facecolors[c], alpha=0.4)
+        c += 1
+    if not hy:
+        plt.ylim((max(0, ax.get_ylim()[0]), min(ax.get_ylim()[1], 6)))
+    plt.suptitle('Leading/lagging ratio with increasing distance to ARS\n ({}, {})'.format(tr, r))
+    ax.set_ylabel('Leading/Lagging ratio')
+    ax.set_xlabel('Distance to ARS (kb)')
+    if no_label:
+        hide_label(fig, ax)
+    fig.subplots_adjust(top=0.99, left=0.15, right=0.99, bottom=0.08)
+    if same_scale:
+        plt.ylim([0.2,6])
+        plt.yscale('log')
+        ax.yaxis.set_major_formatter(ScalarFormatter())
+        ax.yaxis.set_ticks([0.2,0.5,1,2,5])
+    plt.savefig(output)
+    plt.close('all')
+
+
+# line chart for rNMP incorporation on leading or lagging strand of a genotype
+def draw_strand(dlela, ydata, slela, tr, colort, output, hy=False, no_label=False):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.ticker import FuncFormatter
+    sns.set(style='whitegrid')
+    fig, ax = plt.subplots(figsize=(9,9))
+    sns.lineplot(x='Position', y=ydata, hue='Time', data=dlela, palette=colort, linewidth=4)
+    ylims = ax.get_ylim()
+    # add std
+    facecolors = ['#cc99cc', '#99cc99']
+    c = 0
+    for t in dlela.Time.unique():
+        dc = dlela[dlela.Time == t].sort_values('Position')
+        ax.fill_between(dc.Position, dc[ydata] + dc[f'{ydata}_std'], dc[ydata] - dc[f'{ydata}_std'], facecolor = facecolors[c], alpha=0.4)
+        c += 1
+    if not hy:
+        plt.ylim((max(0, ax.get_ylim()[0]), min(ax.get_ylim()[1], 3)))
+    plt.suptitle(f'Ribonucleotides incorporation with increasing distance to ARS \n({slela} strand, {tr})')
+    # ax.ticklabel_format(useOffset=False)
+    if ydata in ['Total','RPB']:
+        ax.set_ylabel('Counts')
+    else:
+        ax.set_ylabel(ydata)
+#         ax.set_ylim([2.2e-8,7.8e-8])
+#         ax.yaxis.set_ticks([3e-8,5e-8,7e-8])
+        ax.yaxis.set_major_formatter(FuncFormatter(my_scientific_format))
+    ax.set_xlabel('Distance to ARS (kb)')
+    for tick in ax.yaxis.get_major_ticks():
+        tick.label.set_fontsize(24)
+    for tick in ax.xaxis.get_major_ticks():
+        tick.label.set_fontsize(24)
+    if no_label:
+        hide_label(fig, ax)
+    # plt.ylim((0.03, 0.082))
+    plt.savefig(output)
+    plt.close('all')
+
+
+# merge leading and lagging rows of each library and position
+# libraries with fewer than min_count rNMPs at a time are removed
+def merge_strands(df, min_count):
+    keys = ['Library','String','Genotype', 'Time', 'RE','Position']
+    da = df[df.Strand == 'leading']
+    db = df[df.Strand == 'lagging']
+    dmerge = da.merge(db, suffixes=['_leading','_lagging'], on=keys)
+    dmerge['Total'] = dmerge.Sum_lagging + dmerge.Sum_leading
+    total = dmerge.groupby(['Time', 'Library'], observed=True).Total.transform('sum')
+    return dmerge[total >= min_count].reset_index(drop=True)
+
+
+# ratio summary and leading, lagging averages for each genotype, time and position
+def summarize_strands(dmerge, features, ppb=False):
+    dmerge = dmerge.assign(Ratio=dmerge.Sum_leading / dmerge.Sum_lagging)
+    g = dmerge.groupby(['Genotype', 'Time', 'Position'], observed=True, sort=False)
+    sums = g[[f'{fe}_{s}' for s in ['leading', 'lagging'] for fe in features]].sum()
+    df_summary = pd.DataFrame({'Total':g.Total.sum(), 'Median':g.Ratio.median(), 'Std':g.Ratio.std()})
+    for fe in features:
+        df_summary[fe] = sums[f'{fe}_leading'] / sums[f'{fe}_lagging']
+    results = [df_summary]
+    for s in ['leading', 'lagging']:
+        dlela = pd.DataFrame({'Total':sums[f'Sum_{s}'], 'RPB':g[f'RPB_{s}'].mean(), 'RPB_std':g[f'RPB_{s}'].std()})
+        if ppb:
+            dlela['PPB'] = g[f'PPB_{s}'].mean()
+            dlela['PPB_std'] = g[f'PPB_{s}'].std()
+        means = g[[f'{fe}_{s}' for fe in features]].mean()
+        means.columns = features
+        results.append(pd.concat([dlela, means], axis=1))
+    return [x.reset_index().astype({'Genotype':object, 'Time':object}) for x in results]
+
+
+# sort summary rows by given genotype, time and position orders
+def sort_summary(df, genotypes, times, positions):
+    index = np.lexsort([df.Position.map({v:i for i, v in enumerate(positions)}), \
+            df.Time.map({v:i for i, v in enumerate(times)}), \
+            df.Genotype.map({v:i for i, v in enumerate(genotypes)})])
+    return df.iloc[index].reset_index(drop=True)
+
+
+def main(argv=None, data=None):
     # argparse
     parser = argparse.ArgumentParser(description='Draw box plot for ars comparison')
     parser.add_argument('ars', type=argparse.FileType('r'), help='Ars region frequency file')
@@ -68,15 +189,27 @@ def main():
     parser.add_argument('--no-label', action='store_true', help='Hide label, header and legend in the plot')
     parser.add_argument('--same_scale', action='store_true', help='Use same scale for all plots')
     parser.add_argument('--hy', action='store_true', help='HydEn-seq libraries')
-    args = parser.parse_args()
+    parser.add_argument('-p', type=int, default=1, help='Number of processes for rendering, default=1')
+    parser.add_argument('--force', action='store_true', help='Render all figures, even if their data and options are unchanged')
+    parser.add_argument('--data-only', action='store_true', help='Only write the ratio, leading and lagging tables behind the line charts, --line is not needed')
+    parser.add_argument('--format', default='tsv', choices=['tsv', 'parquet'], help='Table format for --data-only, default=tsv')
+    add_store_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'draw_ars_split')
     if not any([args.bar, args.box, args.line]):
         args.line = True
     if args.o == '':
-        args.o = args.ars.name.split('.')[0]
+        args.o = args.analysis if args.store else args.ars.name.split('.')[0]
 
 
     # get information for bed file
-    df = pd.read_csv(args.ars, sep='\t')
+    with prof.stage('read') as st:
+        if args.store:
+            df = bin_table(open_store(args.store), args.analysis, args.time_split, args.time_labels)
+        else:
+            df = data.copy() if data is not None else pd.read_csv(args.ars, sep='\t')
+        st['rows'] = len(df)
     # convert to kbp
     df.Position = df.Position / 1000
     # set Categorical data
@@ -94,15 +227,6 @@ def main():
     # column number for first rnmp column
     RNMP_COL_NUM = 9 if not args.ppb else 10
 
-    # formatter for scientific
-    def my_scientific_format(y):
-        a = f'{y:.1E}'
-        m, e = a.split('E')
-        e = e.replace('+0','')
-        e = e.replace('-0','-')
-        return f'{m}E{e}'
-    f_scientific = FuncFormatter(lambda y, _: my_scientific_format(y))
-
     # get available categories
     libs = df.Library.unique()
     times = df.Time.unique().sort_values()
@@ -117,42 +241,13 @@ def main():
             'Flank:{} - {}kbp, Part length: {}kbp\n'.format(flank_start, len_flank, len_part) + \
             'Libraries: {}.'.format(', '.join([str(x) for x in libs])))
 
-    # set color parameters
-    sns.set(style='whitegrid')
-    colorlist = sns.hls_palette(8, l=.5, s=1)
-    # color for bases
-    colorb = [colorlist[i] for i in [6,4,1,2]]
-    # barplot count
-    co = {'leading':colorlist[0], 'lagging':colorlist[1]}
-    # build color dict for time
-    # remove yellow color which is not print friendly
-    colorlist = ['#a570f3','#1bce77','#d95f02']
-    colort = {}
-    for i in range(len(times)):
-        colort[times[i]] = colorlist[i]
-
-    # draw barplot for libs
-    # array to store ratios:
-    ratios = []
-    # array to store percentage of leading and lagging
-    # lib_percentage = []
-    lib_needed = {}
-    for t in times:
-        lib_needed[t] = []
-        for l in libs:
-            da = df[(df.Time == t) & (df.Library == l) & (df.Strand == 'leading')].sort_values(by='Position')
-            db = df[(df.Time == t) & (df.Library == l) & (df.Strand == 'lagging')].sort_values(by='Position')
-            dc = da.merge(db, suffixes=['_leading','_lagging'],on=['Library','String','Genotype', 'Time', 'RE','Position'])
-            dc['Total'] = dc.Sum_lagging + dc.Sum_leading
-            # filter for threshold
-            total_ribo = dc.Total.sum()
-            if total_ribo >= args.m:
-                lib_needed[t].append(l)
-            ratios.append(dc)
-    # generate data frame
-    dmerge = pd.concat(ratios, sort=True)
-
-    if args.line:
+    # leading/lagging pairs of each library, keep libraries above threshold
+    with prof.stage('merge strands') as st:
+        dmerge = merge_strands(df, args.m)
+        st['pairs'] = len(dmerge)
+
+    # --data-only writes the line chart tables with or without --line
+    if args.line or args.data_only:
         # feature
         features= ['Sum']
         for i in df.columns[RNMP_COL_NUM:]:
@@ -160,35 +255,28 @@ def main():
                 features.append(i)
         # calculate the estimators for ratio
         flanks = df.Position.unique()
-        # store average
-        dsummary = []
-        dleading = []
-        dlagging = []
-        for tr in genotype_needed:
-            for t in times:
-                for f in flanks:
-                    db = dmerge[(dmerge.Genotype == tr) & (dmerge.Time == t) & (dmerge.Position == f) & (dmerge.Library.isin(lib_needed[t]))]
-                    if db.empty:
-                        continue
-                    db['Ratio'] = db['Sum_leading'] / db['Sum_lagging']
-                    db['Length'] = db['Sum_leading'] /db['RPB_leading']
-                    dsummary.append([tr,t,f, db.Total.sum(), db.Ratio.median(), db.Ratio.std()] + [db['{}_leading'.format(fe)].sum()/db['{}_lagging'.format(fe)].sum() for fe in features])
-                    if args.ppb:
-                        dleading.append([tr,t,f, db.Sum_leading.sum(), db.RPB_leading.mean(), db.RPB_leading.std(), db.PPB_leading.mean(), db.PPB_leading.std()] + [db['{}_leading'.format(fe)].mean() for fe in features])
-                        dlagging.append([tr,t,f, db.Sum_lagging.sum(), db.RPB_lagging.mean(), db.RPB_lagging.std(), db.PPB_lagging.mean(), db.PPB_lagging.std()] + [db['{}_lagging'.format(fe)].mean() for fe in features])
-                    else:
-                        dleading.append([tr,t,f, db.Sum_leading.sum(), db.RPB_leading.mean(), db.RPB_leading.std()] + [db['{}_leading'.format(fe)].mean() for fe in features])
-                        dlagging.append([tr,t,f, db.Sum_lagging.sum(), db.RPB_lagging.mean(), db.RPB_lagging.std()] + [db['{}_lagging'.format(fe)].mean() for fe in features])
-        df_summary = pd.DataFrame(dsummary, columns = ['Genotype', 'Time', 'Position', 'Total', 'Median', 'Std'] + ['{}'.format(fe) for fe in features])
-        if args.ppb:
-            df_leading = pd.DataFrame(dleading, columns = ['Genotype', 'Time', 'Position', 'Total', 'RPB', 'RPB_std', 'PPB', 'PPB_std'] + ['{}'.format(fe) for fe in features])
-            df_lagging = pd.DataFrame(dlagging, columns = ['Genotype', 'Time', 'Position', 'Total', 'RPB', 'RPB_std', 'PPB', 'PPB_std'] + ['{}'.format(fe) for fe in features])
-        else:
-            df_leading = pd.DataFrame(dleading, columns = ['Genotype', 'Time', 'Position', 'Total', 'RPB', 'RPB_std'] + ['{}'.format(fe) for fe in features])
-            df_lagging = pd.DataFrame(dlagging, columns = ['Genotype', 'Time', 'Position', 'Total', 'RPB', 'RPB_std'] + ['{}'.format(fe) for fe in features])
+        dmerge = dmerge[dmerge.Genotype.isin(genotype_needed)]
+        with prof.stage('summarize', pairs=len(dmerge)):
+            df_summary, df_leading, df_lagging = summarize_strands(dmerge, features, args.ppb)
+        # same order as genotype, time and flank lists
+        df_summary, df_leading, df_lagging = [sort_summary(x, genotype_needed, times, flanks) for x in [df_summary, df_leading, df_lagging]]
         df_summary = categorize_df(df_summary, lib_params)
         df_leading = categorize_df(df_leading, lib_params)
         df_lagging = categorize_df(df_lagging, lib_params)
+        if args.data_only:
+            for name, d in [['ratio', df_summary], ['leading', df_leading], ['lagging', df_lagging]]:
+                write_table(d, f'{args.o}_{name}', args.format)
+            prof.write()
+            print('Done!')
+            return
+
+        # build color dict for time
+        # remove yellow color which is not print friendly
+        colorlist = ['#a570f3','#1bce77','#d95f02']
+        colort = {}
+        for i in range(len(times)):
+            colort[times[i]] = colorlist[i]
+
         # draw line chart for small window summaries
         feature_groups = {'Raw':[],'Normalized':[]}
         columns = list(df_summary.columns)
@@ -198,36 +286,16 @@ def main():
             else:
                 feature_groups['Normalized'].append(i)
         # start plotting
+        jobs = []
         for tr in genotype_needed:
             db = df_summary[(df_summary.Genotype == tr)].sort_values(by='Time')
             if db.empty:
                 continue
             # Median, MLE_Sum
             for r in ['Sum']:
-                fig, ax = plt.subplots(figsize=(9,9))
-                sns.lineplot(x='Position', y=r, hue='Time', data=db, palette=colort, linewidth=4)
-                # add std
-                facecolors = ['#cc99cc', '#99cc99']
-                c = 0
-                for t in db.Time.unique():
-                    dc = db[db.Time == t].sort_values('Position')
-                    ax.fill_between(dc.Position, dc.Sum + dc.Std, dc.Sum - dc.Std, facecolor = facecolors[c], alpha=0.4)
-                    c += 1
-                if not args.hy:
-                    plt.ylim((max(0, ax.get_ylim()[0]), min(ax.get_ylim()[1], 6)))
-                plt.suptitle('Leading/lagging ratio with increasing distance to ARS\n ({}, {})'.format(tr, r))
-                ax.set_ylabel('Leading/Lagging ratio')
-                ax.set_xlabel('Distance to ARS (kb)')
-                if args.no_label:
-                    hide_label(fig, ax)
-                fig.subplots_adjust(top=0.99, left=0.15, right=0.99, bottom=0.08)
-                if args.same_scale:
-                    plt.ylim([0.2,6])
-                    plt.yscale('log')
-                    ax.yaxis.set_major_formatter(ScalarFormatter())
-                    ax.yaxis.set_ticks([0.2,0.5,1,2,5])
-                plt.savefig(args.o + '_ratio_{}_{}.png'.format(tr,r).lower())
-                plt.close('all')
+                jobs.append([draw_ratio, [db[['Time', 'Position', r, 'Std']], tr, r, colort], \
+                        {'output':args.o + '_ratio_{}_{}.png'.format(tr,r).lower(), \
+                        'hy':args.hy, 'no_label':args.no_label, 'same_scale':args.same_scale}])
             # Compositions for leading/lagging ratio
             # build dataframe
             for k,v in feature_groups.items():
@@ -248,40 +316,13 @@ def main():
                 if dlela.empty:
                     continue
                 # total
-                for ydata in ['RPB', 'PPB']:
-                    fig, ax = plt.subplots(figsize=(9,9))
-                    sns.lineplot(x='Position', y=ydata, hue='Time', data=dlela, palette=colort, linewidth=4)
-                    ylims = ax.get_ylim()
-                    # add std
-                    facecolors = ['#cc99cc', '#99cc99']
-                    c = 0
-                    for t in dlela.Time.unique():
-                        dc = dlela[dlela.Time == t].sort_values('Position')
-                        ax.fill_between(dc.Position, dc[ydata] + dc[f'{ydata}_std'], dc[ydata] - dc[f'{ydata}_std'], facecolor = facecolors[c], alpha=0.4)
-                        c += 1
-                    if not args.hy:
-                        plt.ylim((max(0, ax.get_ylim()[0]), min(ax.get_ylim()[1], 3)))
-                    plt.suptitle(f'Ribonucleotides incorporation with increasing distance to ARS \n({slela} strand, {tr})')
-                    # ax.ticklabel_format(useOffset=False)
-                    if ydata in ['Total','RPB']:
-                        ax.set_ylabel('Counts')
-                    else:
-                        ax.set_ylabel(ydata)
-#                         ax.set_ylim([2.2e-8,7.8e-8])
-#                         ax.yaxis.set_ticks([3e-8,5e-8,7e-8])
-                        ax.yaxis.set_major_formatter(f_scientific)
-                    ax.set_xlabel('Distance to ARS (kb)')
-                    for tick in ax.yaxis.get_major_ticks():
-                        tick.label.set_fontsize(24)
-                    for tick in ax.xaxis.get_major_ticks():
-                        tick.label.set_fontsize(24)
-                    if args.no_label:
-                        hide_label(fig, ax)
-                    # plt.ylim((0.03, 0.082))
-                    plt.savefig(args.o + f'_{ydata}_{slela}_{tr}.png'.lower())
-                    plt.close('all')
+                for ydata in (['RPB', 'PPB'] if args.ppb else ['RPB']):
+                    jobs.append([draw_strand, [dlela[['Time', 'Position', ydata, f'{ydata}_std']], ydata, slela, tr, colort], \
+                            {'output':args.o + f'_{ydata}_{slela}_{tr}.png'.lower(), 'hy':args.hy, 'no_label':args.no_label}])
+        render_jobs(jobs, args.p, args.force, prof)
         print('line chart generated!')
-        print('Done!')
+    prof.write()
+    print('Done!')
 
 if __name__ == '__main__':
     main()
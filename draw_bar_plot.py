@@ -3,10 +3,9 @@
 import argparse
 import sys
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn import linear_model
-from matplotlib.ticker import FuncFormatter
+from renderUtils import render_jobs, write_table
+from profileUtils import Profiler, add_profile_args
+from storeUtils import open_store, add_store_args, region_table
 
 # replace T to U
 def replace_columns(columns, FREQ_COL_NUM):
@@ -29,7 +28,62 @@ def replace_columns(columns, FREQ_COL_NUM):
     return columns
 
 
-def main():
+# read library information of a wide frequency file
+# only the columns before frequencies are loaded, one row per library, strand and flank
+def read_data(fr, FREQ_COL_NUM):
+    columns = fr.readline().rstrip('\n').split('\t')
+    columns = replace_columns(columns, FREQ_COL_NUM)
+    dtypes = {'Library':str, 'String':str, 'Genotype':str, 'RE':str, 'Time':str, 'Flank':'int64', 'Strand':str, 'Sum':'int64', 'RPB':'float64'}
+    return pd.read_csv(fr, sep='\t', header=None, names=columns, usecols=columns[:FREQ_COL_NUM], \
+            dtype={k:v for k, v in dtypes.items() if k in columns[:FREQ_COL_NUM]})
+
+
+# stacked bar plot for leading/lagging percentage of each library
+def draw_percent_bar(dc, output):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.ticker import FuncFormatter
+    # set percentage formatter
+    f_percentage = FuncFormatter(lambda y, _: '{:.0%}'.format(y))
+    # set color
+    clist = sns.hls_palette(50, l=0.5, s=1)
+    fig, ax = plt.subplots(figsize=(len(dc)*0.7+9,6))
+    sns.barplot(x=dc.Library, y=dc.Lagging + dc.Leading, color=clist[26], label='Lagging', ax=ax)
+    sns.barplot(x=dc.Library, y=dc.Leading, color=clist[48],label='Leading', ax=ax)
+    # legend
+    plt.legend(loc='upper left', bbox_to_anchor=(1,1), ncol=1,frameon=False, prop={'size': 24})
+    ax.set_ylim([0,1])
+    # xtick label
+    lib_full = dc.apply(lambda x: '-'.join([str(x.String), str(x.Genotype), str(x.RE), str(x.Library)]), axis=1)
+    ax.set_xticklabels(lib_full, rotation=90)
+    # add a line
+    plt.axhline(y=0.5, linewidth=2, color='black', linestyle='--')
+    # percentage y-axis
+    ax.yaxis.set_major_formatter(f_percentage)
+    # remove box
+    sns.despine()
+    # setting for publication
+    plt.subplots_adjust(left=0.036, bottom=0.28, right=0.935, top=0.97)
+    # tick label
+    for tick in ax.yaxis.get_major_ticks():
+        tick.label.set_fontsize(36)
+    label_texts = [tick.label.get_text().split('-')[-1] for tick in ax.xaxis.get_major_ticks()]
+    ax.set_xticklabels(label_texts, fontsize=36)
+    ax.set_xlabel('')
+    ax.set_ylabel('')
+    # add labels
+    for nle, nla, rect in zip(dc.Leading, dc.Lagging,ax.patches):
+        inte, deci = f'{nle*100:.1f}'.split('.')
+        nle_label = f'{inte}.\n{deci}%'
+        inte, deci = f'{nla*100:.1f}'.split('.')
+        nla_label = f'{inte}.\n{deci}%'
+        ax.text(rect.get_x() + rect.get_width()/2, 0.05, nle_label, ha='center', fontsize=28, fontweight='bold')
+        ax.text(rect.get_x() + rect.get_width()/2, 0.8, nla_label, ha='center', fontsize=28, fontweight='bold')
+    plt.savefig(output)
+    plt.close('all')
+
+
+def main(argv=None, data=None):
 
     # argparse
     parser = argparse.ArgumentParser(description='Draw box plot for ars comparison')
@@ -39,10 +93,18 @@ def main():
     parser.add_argument('--noflank', action='store_true', help='No flank information in input file')
     parser.add_argument('--ylim', type=float, default=0, help='Set y axis range of raw data, default = maximum')
     parser.add_argument('-o', default='', help='Output file basename')
-    args = parser.parse_args()
+    parser.add_argument('-p', type=int, default=1, help='Number of processes for rendering, default=1')
+    parser.add_argument('--force', action='store_true', help='Render all figures, even if their data and options are unchanged')
+    parser.add_argument('--data-only', action='store_true', help='Only write leading/lagging percentage table')
+    parser.add_argument('--format', default='tsv', choices=['tsv', 'parquet'], help='Table format for --data-only, default=tsv')
+    parser.add_argument('--flanks', type=int, nargs='+', default=[5000, 10000, 15000], help='Flank lengths of store counts, default=[5000, 10000, 15000]')
+    add_store_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'draw_bar_plot')
 
     if args.o == '':
-        args.o = args.ars.name.split('.')[0]
+        args.o = args.analysis if args.store else args.ars.name.split('.')[0]
 
     # parameters
     FREQ_COL_NUM = 9
@@ -52,15 +114,11 @@ def main():
         FREQ_COL_NUM -= 1
 
     # get information for bed file
-    data = []
-    columns = args.ars.readline().rstrip('\n').split('\t')
-    columns = replace_columns(columns, FREQ_COL_NUM)
-
-    for l in args.ars:
-        ws = l.rstrip('\n').split()
-        for i in range(FREQ_COL_NUM,len(ws)):
-            data.append(ws[:5] + [int(ws[5]), ws[6], int(ws[7]),float(ws[8]), columns[i],float(ws[i])])
-    df = pd.DataFrame(data, columns = columns[:FREQ_COL_NUM]+['Composition', 'Value'])
+    with prof.stage('read') as st:
+        if args.store:
+            data = region_table(open_store(args.store), args.analysis, args.flanks, args.time_split, args.time_labels)
+        df = data.iloc[:, :FREQ_COL_NUM].copy() if data is not None else read_data(args.ars, FREQ_COL_NUM)
+        st['rows'] = len(df)
 
     # set Categorical data
     lib_params = {'Genotype':['WT', 'pip', 'rnh1', 'rnh201', 'RED', 'PolWT','Pol2M644G','Pol3L612M', 'Pol3L612G','Pol1L868M','Pol1Y869A'],\
@@ -91,28 +149,14 @@ def main():
     # set genotype needed for plot
     genotype_needed =  list(df.Genotype.unique())
 
-    # set percentage formatter
-    f_percentage = FuncFormatter(lambda y, _: '{:.0%}'.format(y))
-    # formatter for scientific
-    def my_scientific_format(y):
-        a = f'{y:.1E}'
-        m, e = a.split('E')
-        e = e.replace('+0','')
-        e = e.replace('-0','-')
-        return f'{m}E{e}'
-    f_scientific = FuncFormatter(lambda y, _: my_scientific_format(y))
-
-    # set color
-    clist = sns.hls_palette(50, l=0.5, s=1)
-    clist3 = [clist[17], clist[33], clist[42]]
-    cpalette = [clist[48], clist[26]]
-
     # barplot percentage
+    jobs = []
+    percents = []
     for t in times:
         for f in flanks:
             # create data
-            da = df[(df.Time == t) & (df.Strand == le) & (df.Flank == f) & (df.Composition == 'A')]
-            db = df[(df.Time == t) & (df.Strand == la) & (df.Flank == f) & (df.Composition == 'A')]
+            da = df[(df.Time == t) & (df.Strand == le) & (df.Flank == f)]
+            db = df[(df.Time == t) & (df.Strand == la) & (df.Flank == f)]
             dc = da.merge(db, suffixes=['_leading','_lagging'],on=['Library','String','Genotype','RE','Time','Flank'])
             if len(dc) == 0:
                 continue
@@ -122,42 +166,22 @@ def main():
             dc['Lagging'] = dc.Sum_lagging/dc.total
             dc['Leading'] = dc.Sum_leading/dc.total
             dc['Ratio'] = dc.Sum_leading/dc.Sum_lagging
-            fig, ax = plt.subplots(figsize=(len(dc)*0.7+9,6))
-            sns.barplot(x=dc.Library, y=dc.Lagging + dc.Leading, color=clist[26], label='Lagging', ax=ax)
-            sns.barplot(x=dc.Library, y=dc.Leading, color=clist[48],label='Leading', ax=ax)
-            # legend
-            plt.legend(loc='upper left', bbox_to_anchor=(1,1), ncol=1,frameon=False, prop={'size': 24})
-            ax.set_ylim([0,1])
-            # xtick label
-            lib_full = dc.apply(lambda x: '-'.join([str(x.String), str(x.Genotype), str(x.RE), str(x.Library)]), axis=1)
-            ax.set_xticklabels(lib_full, rotation=90)
-            # add a line
-            plt.axhline(y=0.5, linewidth=2, color='black', linestyle='--')
-            # percentage y-axis
-            ax.yaxis.set_major_formatter(f_percentage)
-            # remove box
-            sns.despine()
-            # setting for publication
-            plt.subplots_adjust(left=0.036, bottom=0.28, right=0.935, top=0.97)
-            # tick label
-            for tick in ax.yaxis.get_major_ticks():
-                tick.label.set_fontsize(36)
-            label_texts = [tick.label.get_text().split('-')[-1] for tick in ax.xaxis.get_major_ticks()]
-            ax.set_xticklabels(label_texts, fontsize=36)
-            ax.set_xlabel('')
-            ax.set_ylabel('')
-            # add labels
-            for nle, nla, rect in zip(dc.Leading, dc.Lagging,ax.patches):
-                inte, deci = f'{nle*100:.1f}'.split('.')
-                nle_label = f'{inte}.\n{deci}%'
-                inte, deci = f'{nla*100:.1f}'.split('.')
-                nla_label = f'{inte}.\n{deci}%'
-                ax.text(rect.get_x() + rect.get_width()/2, 0.05, nle_label, ha='center', fontsize=28, fontweight='bold')
-                ax.text(rect.get_x() + rect.get_width()/2, 0.8, nla_label, ha='center', fontsize=28, fontweight='bold')
-            plt.savefig(args.o + '_strand_percent_{:d}_{}_bar.png'.format(f,t))
-            plt.close('all')
+            percents.append(dc)
+            jobs.append([draw_percent_bar, [dc[['Library', 'String', 'Genotype', 'RE', 'Leading', 'Lagging']]], \
+                    {'output':args.o + '_strand_percent_{:d}_{}_bar.png'.format(f,t)}])
+    if args.data_only:
+        if not percents:
+            print('No library has both leading and lagging rows for any time and flank, no table is written')
+            sys.exit(1)
+        columns = ['Library', 'String', 'Genotype', 'RE', 'Time', 'Flank', 'Sum_leading', 'Sum_lagging', 'Leading', 'Lagging', 'Ratio']
+        write_table(pd.concat(percents)[columns], f'{args.o}_strand_percent', args.format)
+        prof.write()
+        print('Done!')
+        return
+    render_jobs(jobs, args.p, args.force, prof)
     print('Percentage bar plots generated!')
 
+    prof.write()
     print('Done!')
 
 if __name__ == '__main__':
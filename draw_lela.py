@@ -2,36 +2,149 @@
 
 import argparse
 import sys
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn import linear_model
-from matplotlib.ticker import FuncFormatter
+from renderUtils import render_jobs, write_table
+from profileUtils import Profiler, add_profile_args
+from storeUtils import open_store, add_store_args, region_table
+
+
+# through-origin regression of leading on lagging counts for every (Genotype, Flank, Time)
+# slope = sum(xy)/sum(x^2), with standard error and bootstrap confidence interval
+def fit_slopes(dc, keys=None, n_boot=1000, seed=1919, ci=0.95):
+    keys = ['Genotype', 'Flank', 'Time'] if keys is None else list(keys)
+    x = dc.Sum_lagging.astype(float)
+    y = dc.Sum_leading.astype(float)
+    dc = dc.assign(xy=x*y, xx=x**2, yy=y**2)
+    slopes = dc.groupby(keys, observed=True).agg(N=('xy', 'size'), Sxy=('xy', 'sum'), Sxx=('xx', 'sum'), Syy=('yy', 'sum')).reset_index()
+    slopes['Slope'] = slopes.Sxy / slopes.Sxx
+    # residual sum of squares from sums: sum((y-bx)^2) = Syy - b*Sxy
+    rss = (slopes.Syy - slopes.Slope * slopes.Sxy).clip(lower=0)
+    slopes['SE'] = np.sqrt(rss / (slopes.N - 1) / slopes.Sxx)
+    # bootstrap libraries within each group, all resamples at once
+    rng = np.random.default_rng(seed)
+    lows, highs = [], []
+    for _, da in dc.groupby(keys, observed=True, sort=True):
+        idx = rng.integers(0, len(da), size=(n_boot, len(da)))
+        boots = da.xy.values[idx].sum(axis=1) / da.xx.values[idx].sum(axis=1)
+        lows.append(np.nanquantile(boots, (1-ci)/2))
+        highs.append(np.nanquantile(boots, (1+ci)/2))
+    slopes['CI_low'] = lows
+    slopes['CI_high'] = highs
+    return slopes.drop(columns=['Sxy', 'Sxx', 'Syy'])
+
+
+# formatter for scientific
+def my_scientific_format(y, pos=None):
+    a = f'{y:.1E}'
+    m, e = a.split('E')
+    e = e.replace('+0','')
+    e = e.replace('-0','-')
+    return f'{m}E{e}'
+
+
+# scatter plot of leading and lagging counts with regression line for each time
+def draw_time_scatter(dc, geno, f, times, regrs, color, output):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.ticker import FuncFormatter
+    fig, ax = plt.subplots(figsize=(8,7))
+    sns.scatterplot(x='Sum_lagging', y='Sum_leading', hue='Time', data=dc, palette=color, s=100)
+    # set same lim
+    lim_max = max(ax.get_xlim()[1], ax.get_ylim()[1])
+    ax.set_ylim([0,lim_max])
+    ax.set_xlim([0,lim_max])
+    # draw regr lines
+    for t in times:
+        plt.plot([0, lim_max], [0, regrs[t]*lim_max],color=color[t], linewidth=1.5)
+    # draw reference line
+    plt.plot([0, lim_max], [0,lim_max], linewidth='1.5', color='black', linestyle='--')
+    # set y tick lables
+    ax.yaxis.set_major_formatter(FuncFormatter(my_scientific_format))
+    ax.xaxis.set_major_formatter(FuncFormatter(my_scientific_format))
+    # remove right and top line
+    sns.despine()
+    # legend
+    ax.legend(frameon=False, prop={'size':15})
+    # fontsize
+    ax.set_ylabel('Counts of leading strand', fontsize=24)
+    ax.set_xlabel('Counts of lagging strand', fontsize=24)
+    for tick in ax.yaxis.get_major_ticks():
+        tick.label.set_fontsize(18)
+    for tick in ax.xaxis.get_major_ticks():
+        tick.label.set_fontsize(18)
+        tick.label.set_rotation(45)
+    plt.suptitle('Ribose incorporation in leading/lagging strand ({}, flank = {:d}bp, N={:d})\n'.format(geno, f, len(dc.Library.unique())) + \
+            ', '.join([' slope_{}={:.4f}'.format(t, regrs[t]) for t in times]))
+    # for publication
+    plt.subplots_adjust(left=0.11, right=0.98, bottom=0.11)
+    plt.xlabel('')
+    plt.ylabel('')
+    ax.get_legend().remove()
+    plt.savefig(output)
+    plt.close('all')
+
+# bar plot of leading/lagging ratio for each genotype and time
+def draw_ratio_bar(dc, clist2, output):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set(style='ticks', font_scale=3)
+    fig, ax = plt.subplots(figsize=(10,6))
+    plt.subplots_adjust(left=0.1, top=0.98, right=0.95, bottom=0.1)
+    sns.barplot(x='Genotype', y='Ratio', hue='Time', data=dc, ci='sd', palette=clist2,\
+             errwidth=3, capsize=0.18, edgecolor="white", ax=ax)
+    # add data points
+    sns.swarmplot(x='Genotype', y='Ratio', hue='Time', data=dc, dodge=True, color='black', size=7, ax=ax)
+    # formatting
+    labels = ax.get_xticklabels()
+    ax.set_xticklabels(['WT','R','EM','HY'])
+    sns.despine()
+    plt.xlabel('')
+    plt.ylabel('')
+    ax.get_legend().remove()
+    fig.savefig(output)
+    plt.close('all')
 
 
-def main():
+def main(argv=None, data=None):
 
     # argparse
     parser = argparse.ArgumentParser(description='Draw leading/lagging comparison plot for ars comparison')
     parser.add_argument('ars', type=argparse.FileType('r'), help='Ars region frequency file')
     parser.add_argument('-m', type=int, default=100, help='Minimum number of ribose as threshold, default=100')
     parser.add_argument('-o', default='', help='Output file basename')
-    args = parser.parse_args()
+    parser.add_argument('--bootstrap', type=int, default=1000, help='Number of bootstrap resamples for slope confidence interval, default=1000')
+    parser.add_argument('--seed', type=int, default=1919, help='Random seed for bootstrap, default=1919')
+    parser.add_argument('-p', type=int, default=1, help='Number of processes for rendering, default=1')
+    parser.add_argument('--force', action='store_true', help='Render all figures, even if their data and options are unchanged')
+    parser.add_argument('--data-only', action='store_true', help='Only write slope and leading/lagging ratio tables')
+    parser.add_argument('--format', default='tsv', choices=['tsv', 'parquet'], help='Table format of slope and ratio tables, default=tsv')
+    parser.add_argument('--flanks', type=int, nargs='+', default=[5000, 10000, 15000], help='Flank lengths of store counts, default=[5000, 10000, 15000]')
+    add_store_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'draw_lela')
 
     if args.o == '':
-        args.o = args.ars.name.split('.')[0]
+        args.o = args.analysis if args.store else args.ars.name.split('.')[0]
 
     # parameters
     FREQ_COL_NUM = 9
 
     # get information for bed file
-    data = []
-    columns = args.ars.readline().rstrip('\n').split('\t')
-
-    for l in args.ars:
-        ws = l.rstrip('\n').split()
-        data.append(ws[:5] + [int(ws[5]), ws[6], int(ws[7]),float(ws[8])])
-    df = pd.DataFrame(data, columns = columns[:FREQ_COL_NUM])
+    with prof.stage('read') as st:
+        if args.store:
+            data = region_table(open_store(args.store), args.analysis, args.flanks, args.time_split, args.time_labels)
+        if data is not None:
+            df = data.iloc[:, :FREQ_COL_NUM].copy()
+        else:
+            rows = []
+            columns = args.ars.readline().rstrip('\n').split('\t')
+            for l in args.ars:
+                ws = l.rstrip('\n').split()
+                rows.append(ws[:5] + [int(ws[5]), ws[6], int(ws[7]),float(ws[8])])
+            df = pd.DataFrame(rows, columns = columns[:FREQ_COL_NUM])
+        st['rows'] = len(df)
 
     # set Categorical data
     lib_params = {'Genotype':['WT','Rrnh201','EMrnh201','HYrnh201'],\
@@ -59,21 +172,32 @@ def main():
     genotype_needed =  ['WT','Rrnh201','EMrnh201','HYrnh201']
     flanks_needed = [15000]
 
-    # set percentage formatter
-    f_percentage = FuncFormatter(lambda y, _: '{:.0%}'.format(y))
-    # formatter for scientific
-    def my_scientific_format(y):
-        a = f'{y:.1E}'
-        m, e = a.split('E')
-        e = e.replace('+0','')
-        e = e.replace('-0','-')
-        return f'{m}E{e}'
-    f_scientific = FuncFormatter(lambda y, _: my_scientific_format(y))
-
     # set color
-    clist = sns.hls_palette(8, l=0.5, s=1)
     clist2 = ['#a570f3','#1bce77']
 
+    # slopes for all genotypes, flanks and times
+    da = df[df.Strand == le]
+    db = df[df.Strand == la]
+    dc = da.merge(db, suffixes=['_leading','_lagging'],on=['Library','String','Genotype','RE','Time','Flank'])
+    with prof.stage('fit slopes', pairs=len(dc), bootstrap=args.bootstrap):
+        slopes = fit_slopes(dc, n_boot=args.bootstrap, seed=args.seed)
+    write_table(slopes, f'{args.o}_slopes', args.format)
+
+    # leading/lagging ratio of each library
+    da = df[(df.Genotype.isin(genotype_needed)) & (df.Flank.isin(flanks_needed)) & (df.Strand == le)]
+    db = df[(df.Genotype.isin(genotype_needed)) & (df.Flank.isin(flanks_needed)) & (df.Strand == la)]
+    ratios = da.merge(db, suffixes=['_leading','_lagging'],on=['Library','String','Genotype','RE','Time','Flank'])
+    ratios['Ratio'] = ratios['Sum_leading']/ratios['Sum_lagging']
+    if args.data_only:
+        write_table(ratios[['Library', 'String', 'Genotype', 'RE', 'Time', 'Flank', 'Sum_leading', 'Sum_lagging', 'Ratio']], \
+                f'{args.o}_ratio', args.format)
+        prof.write()
+        print('Done!')
+        return
+
+    slopes = slopes.set_index(['Genotype', 'Flank', 'Time']).Slope
+
+    jobs = []
     for geno in genotype_needed:
         # scatter plot for time
         for f in flanks_needed:
@@ -88,75 +212,22 @@ def main():
             for i in range(len(times)):
                 color[times[i]] = clist2[i]
 
-            ds = {}
+            # linear regression
             regrs = {}
             for t in times:
-                ds[t]=dc[dc.Time==t]
-                # linear regression
-                regrs[t]=linear_model.LinearRegression(fit_intercept=False)
-                regrs[t].fit(ds[t].Sum_lagging.values.reshape(-1,1), ds[t].Sum_leading.values)
-
-            fig, ax = plt.subplots(figsize=(8,7))
-            sns.scatterplot(x='Sum_lagging', y='Sum_leading', hue='Time', data=dc, palette=color, s=100)
-            # set same lim
-            lim_max = max(ax.get_xlim()[1], ax.get_ylim()[1])
-            ax.set_ylim([0,lim_max])
-            ax.set_xlim([0,lim_max])
-            # draw regr lines
-            for t in times:
-                plt.plot([0, lim_max], regrs[t].predict([[0], [lim_max]]),color=color[t], linewidth=1.5)
-            # draw reference line
-            plt.plot([0, lim_max], [0,lim_max], linewidth='1.5', color='black', linestyle='--')
-            # set y tick lables
-            ax.yaxis.set_major_formatter(f_scientific)
-            ax.xaxis.set_major_formatter(f_scientific)
-            # remove right and top line
-            sns.despine()
-            # legend
-            ax.legend(frameon=False, prop={'size':15})
-            # fontsize
-            ax.set_ylabel('Counts of leading strand', fontsize=24)
-            ax.set_xlabel('Counts of lagging strand', fontsize=24)
-            for tick in ax.yaxis.get_major_ticks():
-                tick.label.set_fontsize(18)
-            for tick in ax.xaxis.get_major_ticks():
-                tick.label.set_fontsize(18)
-                tick.label.set_rotation(45)
-            plt.suptitle('Ribose incorporation in leading/lagging strand ({}, flank = {:d}bp, N={:d})\n'.format(geno, f, len(dc.Library.unique())) + \
-                    ', '.join([' slope_{}={:.4f}'.format(t, regrs[t].coef_[0]) for t in times]))
-            # for publication
-            plt.subplots_adjust(left=0.11, right=0.98, bottom=0.11)
-            plt.xlabel('')
-            plt.ylabel('')
-            ax.get_legend().remove()
-            plt.savefig(args.o + '_time_{}_{}_scatter.png'.format(geno, f))
-            plt.close('all')
+                regrs[t] = slopes.get((geno, f, t), np.nan)
+
+            jobs.append([draw_time_scatter, [dc[['Library', 'Time', 'Sum_leading', 'Sum_lagging']], geno, f, times, regrs, color], \
+                    {'output':args.o + '_time_{}_{}_scatter.png'.format(geno, f)}])
+    render_jobs(jobs, args.p, args.force, prof)
     print('Scatter plots for time generated!')
 
     # bar plot for average
-    sns.set(style='ticks', font_scale=3)
-    da = df[(df.Genotype.isin(genotype_needed)) & (df.Flank.isin(flanks_needed)) & (df.Strand == le)]
-    db = df[(df.Genotype.isin(genotype_needed)) & (df.Flank.isin(flanks_needed)) & (df.Strand == la)]
-    dc = da.merge(db, suffixes=['_leading','_lagging'],on=['Library','String','Genotype','RE','Time','Flank'])
-    dc['Ratio'] = dc['Sum_leading']/dc['Sum_lagging']
-    fig, ax = plt.subplots(figsize=(10,6))
-    plt.subplots_adjust(left=0.1, top=0.98, right=0.95, bottom=0.1)
-    sns.barplot(x='Genotype', y='Ratio', hue='Time', data=dc, ci='sd', palette=clist2,\
-             errwidth=3, capsize=0.18, edgecolor="white", ax=ax)
-    # add data points
-    sns.swarmplot(x='Genotype', y='Ratio', hue='Time', data=dc, dodge=True, color='black', size=7, ax=ax)
-    # formatting
-    labels = ax.get_xticklabels()
-    ax.set_xticklabels(['WT','R','EM','HY'])
-    sns.despine()
-    plt.xlabel('')
-    plt.ylabel('')
-    ax.get_legend().remove()
-    fig.savefig(f'{args.o}_bar_15000.png')
-    plt.close('all')
+    render_jobs([[draw_ratio_bar, [ratios[['Genotype', 'Time', 'Ratio']], clist2], {'output':f'{args.o}_bar_15000.png'}]], args.p, args.force, prof)
     print('Bar plot generated!')
 
 
+    prof.write()
     print('Done!')
 
 if __name__ == '__main__':
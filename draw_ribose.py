@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 
 import numpy as np
+import pandas as pd
 import argparse
 import sys
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy.cluster import hierarchy
 from collections import defaultdict
+from profileUtils import Profiler, add_profile_args
+
+# maximum width of heatmap in inches, before margins
+MAX_WIDTH = 40
 
 def multicolor_ylabel(ax,list_of_strings,list_of_colors,axis='y',anchorpad=0,**kw):
     """this function creates axes labels with multiple colors
@@ -34,7 +39,32 @@ def multicolor_ylabel(ax,list_of_strings,list_of_colors,axis='y',anchorpad=0,**k
                                           bbox_transform=ax.transAxes, borderpad=0.)
         ax.add_artist(anchored_ybox)
 
-def main():
+# read sample by feature matrix, stop at the first incomplete line
+def read_matrix(fr):
+    df = pd.read_csv(fr, sep='\t', index_col=0)
+    incomplete = df.isna().any(axis=1).to_numpy()
+    if incomplete.any():
+        df = df.iloc[:incomplete.argmax()]
+    try:
+        mat = df.to_numpy(dtype=float)
+    except ValueError:
+        sys.exit('Cannot convert to float')
+    return mat, [str(x) for x in df.index], list(df.columns)
+
+
+# order samples by hierarchical clustering, fastcluster is used if installed
+def cluster_order(mat, method='average', metric='euclidean'):
+    if mat.shape[0] < 3:
+        return np.arange(mat.shape[0])
+    try:
+        import fastcluster
+        link = fastcluster.linkage(mat, method=method, metric=metric)
+    except ImportError:
+        link = hierarchy.linkage(mat, method=method, metric=metric)
+    return hierarchy.leaves_list(link)
+
+
+def main(argv=None):
     # argparse
     parser = argparse.ArgumentParser(description='PCA for dinucleotide data')
     parser_io = parser.add_argument_group('I/O')
@@ -50,7 +80,13 @@ def main():
     parser_h.add_argument('--legend_group', default=0, choices=[0,4,16], type=int, help='Number of lables of which the sum is 1. If 0 is selected, the sum of all labels will be 1. default = 0.')
     parser_h.add_argument('--no_annot', action='store_true', help='Hide percentage annotation in each cell')
     parser_h.add_argument('--cmax', type=float, default=0.5, help='Maximum value in color scale. Any preferency beyond that will show as the maximum color.')
-    args = parser.parse_args()
+    parser_h.add_argument('--cluster', action='store_true', help='Reorder samples by hierarchical clustering')
+    parser_h.add_argument('--cluster_method', default='average', choices=['single', 'complete', 'average', 'weighted', 'centroid', 'median', 'ward'], help='Linkage method for clustering, default=average')
+    parser_h.add_argument('--cluster_metric', default='euclidean', help='Distance metric for clustering, default=euclidean')
+    parser_h.add_argument('--raster', type=int, default=100, help='Above this number of samples, draw rasterized heatmap without annotation and label part of samples, default=100')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'draw_ribose')
 
     # argument relations
     if sum([args.nr, args.mono, args.tri!=0]) > 1:
@@ -62,38 +98,41 @@ def main():
 
 
     # build ndarray
-    sample_raw = []
-    da = []
-    di = args.DATA.readline().rstrip('\n').split('\t')[1:]
-    for l in args.DATA:
-        ws = l.rstrip('\n').split('\t')
-        if len(ws) < len(di):
-            break
-        try:
-            da.append([float(i) for i in ws[1:]])
-        except ValueError:
-            print(ws)
-            sys.exit('Cannot convert to float')
-        sample_raw.append(ws[0])
-    mat = np.asarray(da)
+    with prof.stage('read') as st:
+        mat, sample_raw, di = read_matrix(args.DATA)
+        st['samples'] = mat.shape[0]
     sample = [i.split('/')[-1] for i in sample_raw]
 
+    # cluster samples
+    if args.cluster:
+        with prof.stage('cluster', samples=mat.shape[0]):
+            order = cluster_order(mat, args.cluster_method, args.cluster_metric)
+        mat = mat[order]
+        sample = [sample[i] for i in order]
+
+    # large panels are rasterized without annotation, with part of samples labeled
+    large = mat.shape[0] > args.raster
+    annot = not args.no_annot and not large
+    step = int(np.ceil(mat.shape[0] / args.raster)) if large else 1
+    width = min(mat.shape[0]*0.45, MAX_WIDTH)
+
     # set color settings for graph
     sns.set(palette='muted', style='white')
 
     # heatmap
-    if args.mono:
-        fig, ax = plt.subplots(figsize=(mat.shape[0]*0.45+6,5))
-        plt.subplots_adjust(left=0.02, right=1.24, bottom=0.3, top=1)
-        sns.heatmap(mat.T, vmin=0, vmax=args.cmax,center=args.cmax*0.45, ax=ax, annot=(not args.no_annot), annot_kws={"size":12})
-    elif args.tri:
-        fig, ax = plt.subplots(figsize=(mat.shape[0]*0.45+8,16))
-        plt.subplots_adjust(left=0.03, right=1, bottom=0.15, top=0.98)
-        sns.heatmap(mat.T, vmin=0, vmax=args.cmax,center=args.cmax*0.45, ax=ax, yticklabels=1, annot=(not args.no_annot), annot_kws={"size":12})
-    else:
-        fig, ax = plt.subplots(figsize=(mat.shape[0]*0.45+6,10))
-        plt.subplots_adjust(left=0.03, right=1.24, bottom=0.15, top=1)
-        sns.heatmap(mat.T, vmin=0, vmax=args.cmax,center=args.cmax*0.45, ax=ax, annot=(not args.no_annot), annot_kws={"size":12})
+    with prof.stage('heatmap', samples=mat.shape[0], rasterized=large):
+        if args.mono:
+            fig, ax = plt.subplots(figsize=(width+6,5))
+            plt.subplots_adjust(left=0.02, right=1.24, bottom=0.3, top=1)
+            sns.heatmap(mat.T, vmin=0, vmax=args.cmax,center=args.cmax*0.45, ax=ax, xticklabels=step, annot=annot, annot_kws={"size":12}, rasterized=large)
+        elif args.tri:
+            fig, ax = plt.subplots(figsize=(width+8,16))
+            plt.subplots_adjust(left=0.03, right=1, bottom=0.15, top=0.98)
+            sns.heatmap(mat.T, vmin=0, vmax=args.cmax,center=args.cmax*0.45, ax=ax, xticklabels=step, yticklabels=1, annot=annot, annot_kws={"size":12}, rasterized=large)
+        else:
+            fig, ax = plt.subplots(figsize=(width+6,10))
+            plt.subplots_adjust(left=0.03, right=1.24, bottom=0.15, top=1)
+            sns.heatmap(mat.T, vmin=0, vmax=args.cmax,center=args.cmax*0.45, ax=ax, xticklabels=step, annot=annot, annot_kws={"size":12}, rasterized=large)
 
     # set labels
     # get percentage from background
@@ -158,7 +197,7 @@ def main():
             label_texts.append(i[0])
 
 
-    ax.set_xticklabels(sample, rotation='vertical')
+    ax.set_xticklabels(sample[::step], rotation='vertical')
     ax.set_yticklabels(label_texts,rotation='horizontal')
 
     # change top of colorbar to '0.5-1'
@@ -183,8 +222,10 @@ def main():
     if args.o == '':
         plt.show()
     else:
-        ax.get_figure().savefig(args.o + '_heatmap.png')
+        with prof.stage(f'render {args.o}_heatmap.png'):
+            ax.get_figure().savefig(args.o + '_heatmap.png')
         print('Heatmap is saved to {}_heatmap.png'.format(args.o))
+    prof.write()
 
 if __name__ == '__main__':
     main()
@@ -2,11 +2,15 @@
 
 import argparse
 import sys
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from statannot import add_stat_annotation
 from scipy.stats import mannwhitneyu
+from permutationUtils import unpaired_permutation_test
+from renderUtils import render_jobs
+from profileUtils import Profiler, add_profile_args
 
 # read data
 def read_data(leading_file, lagging_file):
@@ -26,8 +30,38 @@ def read_data(leading_file, lagging_file):
     return df
 
 
+# compute one-sided test for every feature of every genotype group
+def calc_stats(df, groups, test='mannwhitney', perm_params=None):
+    if perm_params is None:
+        perm_params = {}
+    features = df.Feature.unique()
+    # one pivot for all groups: (library, strand) x feature
+    wide = df.pivot_table(index=['Genotype', 'Library', 'Strand'], columns='Feature', values='Value', observed=True)[features]
+    wide = wide.reset_index()
+    columns = ['Group', 'Feature', 'N_leading', 'N_lagging', 'Median_leading', 'Median_lagging', 'Alternative', 'Test', 'P']
+    d = [pd.DataFrame(columns=columns)]
+    for name, genotypes in groups.items():
+        subset = wide[wide.Genotype.isin(genotypes)]
+        if len(subset) == 0:
+            continue
+        data1 = subset[subset.Strand == 'Leading'][features].values
+        data2 = subset[subset.Strand == 'Lagging'][features].values
+        med1 = np.median(data1, axis=0)
+        med2 = np.median(data2, axis=0)
+        alts = np.where(med1 < med2, 'less', 'greater')
+        # One-sided test, direction follows medians
+        if test == 'permutation':
+            p = unpaired_permutation_test(data1, data2, alternative=alts, **perm_params)
+        else:
+            p_less = mannwhitneyu(data1, data2, alternative='less', use_continuity=False, axis=0)[1]
+            p_greater = mannwhitneyu(data1, data2, alternative='greater', use_continuity=False, axis=0)[1]
+            p = np.where(alts == 'less', p_less, p_greater)
+        d.append(pd.DataFrame(dict(zip(columns, [name, features, len(data1), len(data2), med1, med2, alts, test, p]))))
+    return pd.concat(d, ignore_index=True)
+
+
 # draw box plot
-def draw(name, plotname, df):
+def draw(name, df, stats, output):
     sns.set(style='ticks')
     clist = sns.hls_palette(50, l=0.5, s=1)
     cpalette = [clist[48], clist[26]]
@@ -59,17 +93,9 @@ def draw(name, plotname, df):
                     [((x, 'Leading'), (x, 'Lagging')) for x in df.Feature.unique()[1::4]]
     else:
         box_pairs = [((x, 'Leading'), (x, 'Lagging')) for x in df.Feature.unique()]
-    # One-sided MWW
-    pvalues = []
-    for pair in box_pairs:
-        data1 = df[df.Feature == pair[0][0]].groupby('Strand')['Value'].get_group(pair[0][1])
-        data2 = df[df.Feature == pair[0][0]].groupby('Strand')['Value'].get_group(pair[1][1])
-        if data1.median() < data2.median():
-            alt = 'less'
-        else:
-            alt = 'greater'
-        stats, p = mannwhitneyu(data1, data2, alternative=alt, use_continuity=False)
-        pvalues.append(p)
+    # precomputed p values
+    pvalues = stats[stats.Group == name].set_index('Feature').P
+    pvalues = [pvalues[pair[0][0]] for pair in box_pairs]
     ax, results = add_stat_annotation(ax, data=df, x='Feature', y='Value', hue='Strand',\
             box_pairs=box_pairs, perform_stat_test=False, pvalues=pvalues, loc='outside',\
             fontsize='xx-large', linewidth=2, verbose=2)
@@ -89,23 +115,35 @@ def draw(name, plotname, df):
     plt.ylabel('')
     ax.set_xticklabels(labels, fontsize=24)
     plt.yticks(fontsize=24)
-    plt.savefig(plotname)
+    plt.savefig(output)
     plt.close('all')
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate boxplot for heatmap')
     parser.add_argument('leading', type=argparse.FileType('r'), help='Normalized leading file')
     parser.add_argument('lagging', type=argparse.FileType('r'), help='Normalized lagging file')
     parser.add_argument('-e', nargs='+', default=[], help='Libraries to be excluded')
     parser.add_argument('-o', help='Output basename')
-    args = parser.parse_args()
+    parser.add_argument('--test', default='mannwhitney', choices=['mannwhitney', 'permutation'], help='One-sided test for leading/lagging comparison, default=mannwhitney')
+    parser.add_argument('--permutations', type=int, default=100000, help='Number of permutations for permutation test, exact test is used if all label splits are fewer, default=100000')
+    parser.add_argument('--seed', type=int, default=1919, help='Random seed for permutation test, default=1919')
+    parser.add_argument('--threads', type=int, default=1, help='Number of processes for permutation test, default=1')
+    parser.add_argument('--stats', type=argparse.FileType('r'), help='Use precomputed statistics table instead of running tests')
+    parser.add_argument('-p', type=int, default=1, help='Number of processes for rendering, default=1')
+    parser.add_argument('--force', action='store_true', help='Render all figures, even if their data and options are unchanged')
+    parser.add_argument('--stats_only', action='store_true', help='Only write statistics table, do not draw plots')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'generate_box_plot')
 
     if not args.o:
         args.o = 'box_plot'
 
     # read leading and lagging
-    df = read_data(args.leading, args.lagging)
+    with prof.stage('read') as st:
+        df = read_data(args.leading, args.lagging)
+        st['rows'] = len(df)
 
     # groups
     groups = {'WT':['WT'],
@@ -114,14 +152,33 @@ def main():
             'pol2': ['Pol2M644G'],
             'pol3':['Pol3L612M', 'Pol3L612G']}
 
+    # statistics
+    df = df[~df.Library.isin(args.e)]
+    if args.stats:
+        stats = pd.read_csv(args.stats, sep='\t')
+    else:
+        with prof.stage(f'{args.test} tests') as st:
+            stats = calc_stats(df, groups, test=args.test, \
+                    perm_params={'n_perm':args.permutations, 'seed':args.seed, 'threads':args.threads})
+            st['tests'] = len(stats)
+        stats.to_csv(f'{args.o}_stats.tsv', sep='\t', index=False)
+        print(f'Statistics are saved to {args.o}_stats.tsv')
+    if args.stats_only:
+        prof.write()
+        print('Done!')
+        return
+
     # plot
+    jobs = []
     for name, genotypes in groups.items():
-        subset = df[df.Genotype.isin(genotypes) & ~df.Library.isin(args.e)]
+        subset = df[df.Genotype.isin(genotypes)]
         if len(subset) == 0:
             continue
         plot_name = f'{args.o}_{name}.png'
-        draw(name, plot_name, subset)
+        jobs.append([draw, [name, subset, stats[stats.Group == name]], {'output':plot_name}])
+    render_jobs(jobs, args.p, args.force, prof)
 
+    prof.write()
     print('Done!')
 
 
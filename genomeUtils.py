@@ -0,0 +1,128 @@
+import os
+import json
+import numpy as np
+
+BASES = 'ACGT'
+
+# base code of each byte, -1 for N and other characters
+CODES = np.full(256, -1, dtype=np.int8)
+for i, b in enumerate(BASES):
+    CODES[ord(b)] = i
+    CODES[ord(b.lower())] = i
+
+
+# read one sequence of a fasta file with its .fai entry: length, offset, bases and bytes per line
+def read_sequence(mm, length, offset, linebases, linewidth):
+    nbytes = (length // linebases) * linewidth + length % linebases
+    raw = np.asarray(mm[offset:offset + nbytes])
+    return raw[np.arange(nbytes) % linewidth < linebases]
+
+
+# 4 bases per byte, first base in the highest bits
+def pack_codes(codes):
+    codes = np.r_[codes, np.zeros(-len(codes) % 4, dtype=codes.dtype)].astype(np.uint8).reshape(-1, 4)
+    return (codes[:, 0] << 6) | (codes[:, 1] << 4) | (codes[:, 2] << 2) | codes[:, 3]
+
+
+# runs of True as [start, end) intervals
+def runs(mask):
+    d = np.diff(np.r_[0, mask.view(np.int8), 0])
+    return np.flatnonzero(d == 1), np.flatnonzero(d == -1)
+
+
+# pack a fasta file into a 2-bit genome folder: packed bases in genome.npy, N runs in n_runs.npy
+def pack_genome(fasta, fai, folder):
+    os.makedirs(folder, exist_ok=True)
+    mm = np.memmap(fasta, dtype=np.uint8, mode='r')
+    chroms = {}
+    packed = []
+    nruns = []
+    start = 0
+    nstart = 0
+    for l in fai:
+        ws = l.rstrip('\n').split('\t')
+        if len(ws) < 5:
+            continue
+        chrom, length, offset, linebases, linewidth = ws[0], int(ws[1]), int(ws[2]), int(ws[3]), int(ws[4])
+        codes = CODES[read_sequence(mm, length, offset, linebases, linewidth)]
+        n = codes < 0
+        ns, ne = runs(n)
+        codes[n] = 0
+        p = pack_codes(codes)
+        chroms[chrom] = {'length':length, 'offset':start, 'n_offset':nstart, 'n_runs':len(ns)}
+        packed.append(p)
+        nruns.append(np.c_[ns, ne])
+        start += len(p)
+        nstart += len(ns)
+    np.save(os.path.join(folder, 'genome.npy'), np.concatenate(packed) if packed else np.zeros(0, dtype=np.uint8))
+    np.save(os.path.join(folder, 'n_runs.npy'), np.concatenate(nruns).astype(np.int64) if nruns else np.zeros((0, 2), dtype=np.int64))
+    with open(os.path.join(folder, 'manifest.json'), 'w') as fw:
+        json.dump({'version':1, 'chroms':chroms}, fw, indent=1)
+    return chroms
+
+
+# upstream and downstream bases around rNMP for each context mode, on the rNMP strand
+def context_shape(mode, tri=2):
+    return {'mono':(0, 0), 'rn':(0, 1), 'nr':(1, 0), 'tri':(tri - 1, 3 - tri)}[mode]
+
+
+# column names in the order used by draw_ribose.py and draw_bar_plot.replace_columns
+# rn: lexicographic, nr: by the second base then the first, tri: by rNMP, then the other bases
+def context_names(mode, tri=2):
+    u, d = context_shape(mode, tri)
+    n = u + d + 1
+    names = [''.join(BASES[(i >> (2 * (n - 1 - k))) & 3] for k in range(n)) for i in range(4 ** n)]
+    if mode == 'nr':
+        names.sort(key=lambda x:(x[1], x[0]))
+    elif mode == 'tri':
+        order = [[0, 1, 2], [1, 0, 2], [2, 1, 0]][tri - 1]
+        names.sort(key=lambda x:[x[i] for i in order])
+    return names
+
+
+# 2-bit genome from pack_genome, bases are memory-mapped
+class PackedGenome(object):
+    def __init__(self, folder):
+        with open(os.path.join(folder, 'manifest.json')) as fr:
+            self.chroms = json.load(fr)['chroms']
+        self.packed = np.load(os.path.join(folder, 'genome.npy'), mmap_mode='r')
+        self.n_runs = np.load(os.path.join(folder, 'n_runs.npy'), mmap_mode='r')
+
+    # base codes at positions, -1 for N and positions outside the chromosome
+    def bases(self, chrom, positions):
+        c = self.chroms[chrom]
+        positions = np.asarray(positions, dtype=np.int64)
+        valid = (positions >= 0) & (positions < c['length'])
+        p = np.where(valid, positions, 0)
+        codes = ((self.packed[c['offset'] + (p >> 2)] >> (6 - 2 * (p & 3))) & 3).astype(np.int8)
+        if c['n_runs']:
+            runs = self.n_runs[c['n_offset']:c['n_offset'] + c['n_runs']]
+            i = np.searchsorted(runs[:, 0], p, side='right') - 1
+            valid &= ~((i >= 0) & (p < runs[np.maximum(i, 0), 1]))
+        return np.where(valid, codes, -1)
+
+    # context code of each rNMP, read 5' to 3' on its strand, -1 if any base is N or outside the chromosome
+    # code is the lexicographic index of the context, e.g. for rn: 4 * rNMP + downstream base
+    def contexts(self, chrom, positions, minus, upstream=0, downstream=0):
+        positions = np.asarray(positions, dtype=np.int64)
+        sign = np.where(minus, -1, 1)
+        codes = np.zeros(len(positions), dtype=np.int64)
+        valid = np.ones(len(positions), dtype=bool)
+        for j in range(-upstream, downstream + 1):
+            b = self.bases(chrom, positions + sign * j)
+            valid &= b >= 0
+            codes = codes * 4 + np.where(minus, 3 - b, b)
+        return np.where(valid, codes, -1)
+
+    # context counts of rNMPs, columns in the order of context_names
+    def count_contexts(self, chrom, positions, minus, mode, tri=2):
+        u, d = context_shape(mode, tri)
+        codes = self.contexts(chrom, positions, minus, u, d)
+        counts = np.bincount(codes[codes >= 0], minlength=4 ** (u + d + 1))
+        return counts[context_order(mode, tri)]
+
+
+# lexicographic code of each column in context_names
+def context_order(mode, tri=2):
+    n = sum(context_shape(mode, tri)) + 1
+    return np.array([sum(BASES.index(x) * 4 ** (n - 1 - k) for k, x in enumerate(name)) for name in context_names(mode, tri)])
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import numpy as np
+from getFlankUtils import read_ars, read_faidx, calc_boundary, find_territory
+from rate_simulation import PARAMS, add_param_args, sample_ars, leading_fractions, lagging_fractions, get_rates
+from profileUtils import Profiler, add_profile_args
+from countUtils import round_sig
+
+
+# (pola, pold, pole) fractions by distance to ARS on leading and lagging strand
+# beyond the kernel, leading keeps the last value and lagging uses the mean of the last period
+def distance_kernels(params, max_dist):
+    devs, pold_lengths = sample_ars(params)
+    length = params['length_max']
+    offset = params['offset']
+    leading = leading_fractions(length, devs, pold_lengths, params['length_pola'])[offset:]
+    lagging = lagging_fractions(length, devs, params['length_pola'], params['length_pold'])[offset:]
+    period = params['length_pola'] + params['length_pold']
+    extra = max(0, max_dist + 1 - len(leading))
+    leading = np.vstack([leading, np.repeat(leading[-1:], extra, axis=0)])
+    lagging = np.vstack([lagging, np.repeat(lagging[-period:].mean(axis=0, keepdims=True), extra, axis=0)])
+    return leading, lagging
+
+
+# per base tracks for one chromosome
+def simulate_chrom(arss, names, size, kernels, rates, speed):
+    leading, lagging = kernels
+    idx, dist = find_territory(arss, names, np.arange(size))
+    d = np.abs(dist)
+    right = (dist >= 0)[:, None]
+    lead = leading[d]
+    lag = lagging[d]
+    # forks moving right use plus strand as leading strand
+    tracks = {}
+    for strand, frac in [['plus', np.where(right, lead, lag)], ['minus', np.where(right, lag, lead)]]:
+        for i, pol in enumerate(['pola', 'pold', 'pole']):
+            tracks[f'{strand}_{pol}'] = frac[:, i]
+        tracks[f'{strand}_rate'] = frac @ rates
+    times = np.array([arss[n].firing_time for n in names])
+    tracks['time'] = times[idx] + d / speed
+    return tracks
+
+
+# write an array as bedGraph, averaging bins and merging equal neighbours
+def write_bedgraph(fw, chrom, values, binsize=1, digits=6):
+    length = len(values)
+    if binsize > 1:
+        bins = np.arange(length) // binsize
+        values = np.bincount(bins, weights=values) / np.bincount(bins)
+    values = round_sig(values, digits)
+    breaks = np.flatnonzero(np.diff(values)) + 1
+    starts = np.r_[0, breaks] * binsize
+    ends = np.minimum(np.r_[breaks, len(values)] * binsize, length)
+    fw.write(''.join([f'{chrom}\t{s}\t{e}\t{v:.{digits}g}\n' for s, e, v in zip(starts, ends, values[np.r_[0, breaks]])]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate expected polymerase usage and rNMP incorporation genome-wide from ARS firing times')
+    parser.add_argument('ars', type=argparse.FileType('r'), help='Bed file for ars region with time')
+    parser.add_argument('index', type=argparse.FileType('r'), help='index file for background genome')
+    parser.add_argument('-v', type=int, default=1600, help='Fork speed, base per minute')
+    parser.add_argument('--default_time', type=float, help='Firing time for ARS without time column, default=required')
+    parser.add_argument('-b', type=int, default=1, help='Bin size of output tracks, default=1')
+    parser.add_argument('--digits', type=int, default=6, help='Significant digits kept in output, default=6')
+    parser.add_argument('--time', action='store_true', help='Also output replication time of each base')
+    parser.add_argument('-o', default='genome', help='Output file basename')
+    add_param_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    params = {k:getattr(args, k) for k in PARAMS}
+    prof = Profiler.from_args(args, 'genome_simulation')
+
+    # ARS and boundaries
+    with prof.stage('read ARS') as st:
+        arss, ars_orders = read_ars(args.ars, args.default_time)
+        chrom_sizes = read_faidx(args.index)
+        ars_orders = {k:v for k, v in ars_orders.items() if k in chrom_sizes}
+        calc_boundary(arss, ars_orders, chrom_sizes, args.v, False)
+        st['ars'] = len(arss)
+    print('ARS information read!')
+
+    # kernels long enough for the largest territory
+    with prof.stage('kernels', nars=params['nars']):
+        kernels = distance_kernels(params, max(chrom_sizes[c] for c in ars_orders))
+    rates = np.asarray(get_rates(params)[0])
+
+    names = [f'{s}_{p}' for s in ['plus', 'minus'] for p in ['pola', 'pold', 'pole', 'rate']]
+    if args.time:
+        names.append('time')
+    fws = {n:open(f'{args.o}_{n}.bedGraph', 'w') for n in names}
+    for chrom, order in ars_orders.items():
+        with prof.stage(f'simulate {chrom}', bases=chrom_sizes[chrom]):
+            tracks = simulate_chrom(arss, order, chrom_sizes[chrom], kernels, rates, args.v)
+        with prof.stage(f'write {chrom}', tracks=len(names)):
+            for n in names:
+                write_bedgraph(fws[n], chrom, tracks[n], args.b, args.digits)
+    for fw in fws.values():
+        fw.close()
+
+    prof.write()
+    print('Done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,36 @@
+import sys
 import numpy as np
 from collections import defaultdict
+from storeUtils import add_windows, add_counts
 
 # read ars
 
 
-def read_ars(fr):
+def read_ars(fr, default_time=None, alias=None):
     ars_orders = defaultdict(list)
     arss = {}
     for l in fr:
         ws = l.rstrip().split('\t')
-        arss[ws[3]] = ARS(ws[3], ws[0], float(ws[4]), int(ws[1]), int(ws[2]))
+        # use default firing time for ARS without time column
+        if len(ws) > 4:
+            t = float(ws[4])
+        elif default_time is not None:
+            t = default_time
+        else:
+            sys.exit(f'{fr.name}: ARS {ws[3]} has no firing time (column 5), use --default_time')
+        if alias:
+            ws[0] = alias.get(ws[0], ws[0])
+        arss[ws[3]] = ARS(ws[3], ws[0], t, int(ws[1]), int(ws[2]))
         ars_orders[ws[0]].append(ws[3])
     return arss, ars_orders
 
 
 # read chrom size
-def read_faidx(fr):
+def read_faidx(fr, alias=None):
     chrom_sizes = {}
     for l in fr:
         ws = l.rstrip().split('\t')
-        chrom_sizes[ws[0]] = int(ws[1])
+        chrom_sizes[alias.get(ws[0], ws[0]) if alias else ws[0]] = int(ws[1])
     return chrom_sizes
 
 
@@ -62,6 +73,14 @@ def split_interval(ars1, ars2, speed, max_len):
     ars1.right_boundary = min(ep, ars1.pos + max_len)
     ars2.left_boundary = max(ep, ars2.pos - max_len)
 
+# find ARS territory for positions on one chromosome after calc_boundary
+# return index in names and signed distance to the ARS
+def find_territory(arss, names, positions):
+    pos = np.array([arss[n].pos for n in names])
+    ends = np.array([arss[n].right_end_point for n in names])
+    idx = np.minimum(np.searchsorted(ends, positions, side='right'), len(names) - 1)
+    return idx, positions - pos[idx]
+
 # separate ars
 
 
@@ -103,6 +122,50 @@ def output_timed_bins(bins, basename):
                     fw.write('\t'.join([str(x) for x in l]) + '\n')
 
 
+# count rNMPs on the strand of each region from a position index (countUtils.CountIndex)
+# regions: [chrom, start, end, name, position, strand]
+def region_counts(regions, index, lib, other_strand=False):
+    groups = defaultdict(list)
+    for i, l in enumerate(regions):
+        groups[(l[0], l[5])].append(i)
+    counts = np.zeros(len(regions), dtype=np.int64)
+    for (chrom, strand), v in groups.items():
+        if other_strand:
+            strand = '-' if strand == '+' else '+'
+        counts[v] = index.count(lib, chrom, strand, np.array([regions[i][1] for i in v]), np.array([regions[i][2] for i in v]))
+    return counts
+
+
+def count_regions(regions, index, lib):
+    return int(region_counts(regions, index, lib).sum())
+
+
+# windows and leading/lagging counts of leading bins for a count store (storeUtils)
+def store_bins(conn, analysis, bins, arss, index, libs):
+    regions = [l for v in bins.values() for v1 in v['leading'].values() for l in v1]
+    add_windows(conn, analysis, ([l[0], l[1], l[2], l[3], arss[l[3]].firing_time, l[4], l[5]] for l in regions))
+    add_counts(conn, analysis, {lib:(region_counts(regions, index, lib), region_counts(regions, index, lib, True)) for lib in libs})
+
+
+# count bins of each library, return rows of library, time, position, strand and count
+def count_bins(bins, index, libs):
+    rows = []
+    for t, v in bins.items():
+        for s, v1 in v.items():
+            for pos, v2 in v1.items():
+                for lib in libs:
+                    rows.append([lib, t, pos, s, count_regions(v2, index, lib)])
+    return rows
+
+
+# output bin counts to file
+def output_bin_counts(rows, basename):
+    with open(f'{basename}_counts.tsv', 'w') as fw:
+        fw.write('Library\tTime\tPosition\tStrand\tSum\n')
+        for l in rows:
+            fw.write('\t'.join([str(x) for x in l]) + '\n')
+
+
 class ARS(object):
     def __init__(self, name, chrom, t, left, right):
         self.name = name
@@ -136,6 +199,17 @@ class ARS(object):
             bins['leading'][l].append([self.chrom, s, e, self.name, l, '+'])
             bins['lagging'][l].append([self.chrom, s, e, self.name, l, '-'])
 
+    # regions between distance start and end on both sides
+    def add_region(self, regions, start, end):
+        if self.pos - start > self.left_boundary:
+            s = max(self.left_boundary, self.pos - end)
+            regions['leading'].append([self.chrom, s, self.pos - start, self.name, -end, '-'])
+            regions['lagging'].append([self.chrom, s, self.pos - start, self.name, -end, '+'])
+        if self.pos + start < self.right_boundary:
+            e = min(self.right_boundary, self.pos + end)
+            regions['leading'].append([self.chrom, self.pos + start, e, self.name, end, '+'])
+            regions['lagging'].append([self.chrom, self.pos + start, e, self.name, end, '-'])
+
     # split into bins according to replication time
     def add_bins_time(self, bins, min_time, max_time, binsize, speed):
         left_boundary_time = (self.pos - self.left_boundary) / \
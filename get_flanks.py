@@ -4,9 +4,13 @@ import argparse
 from collections import defaultdict
 import numpy as np
 from getFlankUtils import *
+from profileUtils import Profiler, add_profile_args
+from countUtils import CountIndex
+from storeUtils import open_store, add_libraries
+from checkTimeInputs import read_libinfo, read_alias
 
 
-def main():
+def main(argv=None):
      # argparse
      # "help" parameter is used to specify more details about the argument
      parser = argparse.ArgumentParser(description='Generate ARS flanks')
@@ -16,35 +20,74 @@ def main():
      parser.add_argument('-b', type=int, default=0, help='Bin size, default = flank length.')
      parser.add_argument('-t', type=float, default=None, nargs='+', help='separator of firing time')
      parser.add_argument('-v', type=int, default=1600, help='Fork speed, base per minute')
+     parser.add_argument('--default_time', type=float, help='Firing time for ARS without time column, default=required')
+     parser.add_argument('--alias', type=argparse.FileType('r'), help='Chromosome alias table for ARS and index file: alias and name used in output, tab separated')
      parser.add_argument('-r', action='store_true',  help='Input is ribosomal DNA, only generate the left half.')
      parser.add_argument('-o', default='ars', help='Output file basename')
-     args = parser.parse_args()
+     parser.add_argument('--count_index', help='Also count rNMPs in each bin from a position index built by build_index.py')
+     parser.add_argument('--libs', nargs='+', help='Libraries to count, default=all libraries in the index')
+     parser.add_argument('--store', help='Also write bins and their counts to a SQLite store, needs --count_index')
+     parser.add_argument('--analysis', default='flanks', help='Analysis name of the bins in the store, default=flanks')
+     parser.add_argument('--list', type=argparse.FileType('r'), help='Library information for the store: library, strain, genotype and RE set')
+     add_profile_args(parser)
+     args = parser.parse_args(argv)
+     if args.store and not args.count_index:
+          parser.error('--store needs --count_index')
+     prof = Profiler.from_args(args, 'get_flanks')
 
      if args.b == 0:
          args.b = args.l
 
      # get ars
-     arss, ars_orders = read_ars(args.ars)
+     alias = read_alias(args.alias) if args.alias else None
+     with prof.stage('read ARS') as st:
+          arss, ars_orders = read_ars(args.ars, args.default_time, alias)
+          st['ars'] = len(arss)
 
      # read chrom size
-     chrom_sizes = read_faidx(args.index)
+     chrom_sizes = read_faidx(args.index, alias)
 
      # calculate ars boundaries
-     calc_boundary(arss, ars_orders, chrom_sizes, args.v, args.r, args.l)
+     with prof.stage('boundaries', ars=len(arss)):
+          calc_boundary(arss, ars_orders, chrom_sizes, args.v, args.r, args.l)
 
      # output with collected desired ARS
      arss_sep = sep_ars(arss, args.t)
 
      # generate bins
      bins = defaultdict(lambda : defaultdict(lambda : defaultdict(list)))
-     for t, v in arss_sep.items():
-          for name in v:
-               arss[name].add_bins(bins[t], args.b)
+     with prof.stage('generate bins') as st:
+          for t, v in arss_sep.items():
+               for name in v:
+                    arss[name].add_bins(bins[t], args.b)
+          st['bins'] = sum(len(x) for v in bins.values() for v1 in v.values() for x in v1.values())
 
      # output
-     output_bins(bins, args.o)
-
-print('Done!')
+     with prof.stage('write bins', files=sum(len(v1) for v in bins.values() for v1 in v.values())):
+          output_bins(bins, args.o)
+
+     # count from index
+     if args.count_index:
+          index = CountIndex(args.count_index)
+          with prof.stage('count bins') as st:
+               rows = count_bins(bins, index, args.libs or list(index.libraries))
+               st['rows'] = len(rows)
+          output_bin_counts(rows, args.o)
+
+     # store
+     if args.store:
+          with prof.stage('store') as st:
+               conn = open_store(args.store)
+               libs = args.libs or list(index.libraries)
+               if args.list:
+                    libinfo = read_libinfo(args.list)
+                    add_libraries(conn, {k:v for k, v in libinfo.items() if k in libs}, {k:index.libraries[k]['source'] for k in libs if k in libinfo})
+               store_bins(conn, args.analysis, bins, arss, index, libs)
+               st['libraries'] = len(libs)
+               conn.close()
+
+     prof.write()
+     print('Done!')
 
 
 if __name__ == '__main__':
@@ -2,15 +2,59 @@
 import argparse
 import sys
 from collections import OrderedDict
+from collections import defaultdict
+from profileUtils import Profiler, add_profile_args
 
-def main():
+
+# count rNMPs with distance to ARS in [s, e) directly from a position index
+def index_region(args, prof):
+    from getFlankUtils import read_ars, read_faidx, calc_boundary, sep_ars, count_regions
+    from countUtils import CountIndex
+    with prof.stage('read ARS') as st:
+        arss, ars_orders = read_ars(args.ars)
+        chrom_sizes = read_faidx(args.genome)
+        calc_boundary(arss, ars_orders, chrom_sizes, args.v, False, args.e)
+        st['ars'] = len(arss)
+    index = CountIndex(args.count_index)
+    libs = args.libs or list(index.libraries)
+    args.o.write('chrom\tSum\n')
+    with prof.stage('count regions', libraries=len(libs)):
+        for t, names in sep_ars(arss, args.t).items():
+            regions = defaultdict(list)
+            for name in names:
+                arss[name].add_region(regions, args.s, args.e)
+            for lib in libs:
+                for strand in ['leading', 'lagging']:
+                    args.o.write(f'{lib}-{t}-{strand}\t{count_regions(regions[strand], index, lib)}\n')
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Get a paticular range from an ARS info file')
-    parser.add_argument('info', type=argparse.FileType('r'), help='ARS info file')
+    parser.add_argument('info', type=argparse.FileType('r'), nargs='?', help='ARS info file, not needed with --count_index')
     parser.add_argument('-s', type=int, default=0, help='Start postion, exclude. (0)')
     parser.add_argument('-e', type=int, default=2**32, help='End position, include. (2**32)')
     parser.add_argument('-o', type=argparse.FileType('w'), default=sys.stdout, help='Output to file')
     parser.add_argument('--col_num', type=int, default=5, help='Column number for the postion, start with 0. (5)')
-    args = parser.parse_args()
+    parser_index = parser.add_argument_group('Count from index', 'Count rNMPs with distance to ARS in [s, e) from a position index built by build_index.py instead of an ARS info file')
+    parser_index.add_argument('--count_index', help='Position index folder')
+    parser_index.add_argument('--ars', type=argparse.FileType('r'), help='Bed file for ars region with time')
+    parser_index.add_argument('--genome', type=argparse.FileType('r'), help='index file for background genome')
+    parser_index.add_argument('--libs', nargs='+', help='Libraries to count, default=all libraries in the index')
+    parser_index.add_argument('-t', type=float, default=None, nargs='+', help='separator of firing time')
+    parser_index.add_argument('-v', type=int, default=1600, help='Fork speed, base per minute')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'get_region')
+
+    if args.count_index:
+        if not args.ars or not args.genome:
+            parser.error('--count_index needs --ars and --genome')
+        index_region(args, prof)
+        prof.write()
+        print('Done!')
+        return
+    if not args.info:
+        parser.error('ARS info file is needed without --count_index')
 
     # header
     header = args.info.readline().rstrip('\n').split('\t')
@@ -18,24 +62,29 @@ def main():
 
     # get data
     data = OrderedDict()
-    for l in args.info:
-        ws = l.rstrip('\n').split('\t')
-        # skip unselected entries
-        pos = float(ws[args.col_num])
-        if pos <= args.s or pos > args.e:
-            continue
-        # sum up all selected entries
-        name = '-'.join(ws[:args.col_num] + [ws[args.col_num+1]])
-        if name not in data:
-            data[name] = [float(x) for x in ws[args.col_num + 3:]]
-        else:
-            for i in range(len(ws[args.col_num+3:])):
-                data[name][i] += float(ws[args.col_num+3+i])
+    with prof.stage('sum entries') as st:
+        st['rows'] = 0
+        for l in args.info:
+            st['rows'] += 1
+            ws = l.rstrip('\n').split('\t')
+            # skip unselected entries
+            pos = float(ws[args.col_num])
+            if pos <= args.s or pos > args.e:
+                continue
+            # sum up all selected entries
+            name = '-'.join(ws[:args.col_num] + [ws[args.col_num+1]])
+            if name not in data:
+                data[name] = [float(x) for x in ws[args.col_num + 3:]]
+            else:
+                for i in range(len(ws[args.col_num+3:])):
+                    data[name][i] += float(ws[args.col_num+3+i])
 
     # output
-    for k,v in data.items():
-        args.o.write('\t'.join([k] + [str(x) for x in v]) + '\n')
+    with prof.stage('write', rows=len(data)):
+        for k,v in data.items():
+            args.o.write('\t'.join([k] + [str(x) for x in v]) + '\n')
 
+    prof.write()
     print('Done!')
 
 
@@ -3,6 +3,7 @@
 import pandas as pd
 import argparse
 import sys
+from profileUtils import Profiler, add_profile_args
 
 
 # read files
@@ -26,12 +27,14 @@ def read_files(frs, lib_info):
     return df
 
 
-def main():
+def main(argv=None, write=True):
     parser = argparse.ArgumentParser(description='Sort data for figure 1')
     parser.add_argument('info', type=argparse.FileType('r'), help='Information of libraries')
     parser.add_argument('tsv', nargs='+', type=argparse.FileType('r'), help='Input files')
     parser.add_argument('-o', type=argparse.FileType('w'), default=sys.stdout, help='Output to file')
-    args = parser.parse_args()
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'merge')
 
     # read informations
     lib_info = {}
@@ -42,7 +45,9 @@ def main():
         lib_info[ws[0]] = ws[1:]
 
     # read csv
-    df = read_files(args.tsv, lib_info)
+    with prof.stage('read files', files=len(args.tsv)) as st:
+        df = read_files(args.tsv, lib_info)
+        st['rows'] = len(df)
 
     # set Categorical data
     lib_params = {'Genotype':['WT', 'pip', 'rnh1', 'rnh201', 'RED', 'PolWT','Pol2M644G','Pol3L612M', 'Pol3L612G','Pol1L868M','Pol1Y869A'],\
@@ -68,7 +73,11 @@ def main():
     df = df[['chrom'] + df.columns[4:-1].tolist()]
 
     # out
-    df.to_csv(args.o, sep='\t', index=False)
+    if write or args.o is not sys.stdout:
+        with prof.stage('write', rows=len(df)):
+            df.to_csv(args.o, sep='\t', index=False)
+    prof.write()
+    return df
 
 if __name__ == '__main__':
     main()
@@ -3,9 +3,61 @@
 import argparse
 import sys
 import numpy as np
-from collections import defaultdict
+import pandas as pd
+from profileUtils import Profiler, add_profile_args
 
-def main():
+
+# row sums added column by column, same order as python sum
+def row_sum(values):
+    total = np.zeros(values.shape[0])
+    for i in range(values.shape[1]):
+        total = total + values[:, i]
+    return total
+
+
+# normalize an ARS frequency table with background frequency
+# raw: library information, Sum at freq_start - 1 and frequencies from freq_start
+# bg: background frequency indexed by name
+def normalize(raw, bg, name, freq_start=8, norm='zscore'):
+    di = list(raw.columns)
+    # row major arrays, so that row means sum in the same order as numpy on each row
+    freq = np.ascontiguousarray(raw.iloc[:, freq_start:].to_numpy(dtype=float))
+
+    # get background name
+    keys = pd.Series(name, index=raw.index)
+    for c in di[4:freq_start-1]:
+        keys = keys + '_' + raw[c].astype(str)
+    missing = ~keys.isin(bg.index)
+    if missing.any():
+        sys.exit(f'Cannot find background information for {keys[missing].iloc[0]}')
+    bgs = np.ascontiguousarray(bg.loc[keys, di[freq_start:]].to_numpy(dtype=float))
+
+    # Probability for ribos incor = count/divided by length
+    rpb = raw.iloc[:, freq_start-1].to_numpy(dtype=float) / row_sum(bg.to_numpy(dtype=float))[bg.index.get_indexer(keys)]
+
+    # deal with freq
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent = freq / row_sum(freq)[:, None]
+
+        # calc norm freq
+        freq_norm = freq / bgs
+        if norm == 'sum1':
+            total = row_sum(freq_norm)[:, None]
+            freq_norm = np.where(total == 0, 0.0, freq_norm / total)
+        elif norm == 'zscore':
+            freq_mean = freq_norm.mean(axis=1, keepdims=True)
+            freq_std = freq_norm.std(axis=1, keepdims=True)
+            freq_norm = np.where(freq_mean == 0, 0.0, (freq_norm - freq_mean) / freq_std)
+
+    df = raw.iloc[:, :freq_start].copy()
+    df['RPB'] = rpb
+    df = pd.concat([df, raw.iloc[:, freq_start:], \
+            pd.DataFrame(percent, index=raw.index, columns=[i+'%' for i in di[freq_start:]]), \
+            pd.DataFrame(freq_norm, index=raw.index, columns=[i+'n' for i in di[freq_start:]])], axis=1)
+    return df
+
+
+def main(argv=None, data=None, write=True):
     # argparse
     parser = argparse.ArgumentParser(description='Normalize the ars region ')
     parser.add_argument('raw', type=argparse.FileType('r'), help='ARS ribos frequency file needed to be normalized, library information should be add so that frequency start at 9th column')
@@ -15,19 +67,19 @@ def main():
     parser.add_argument('--name', default='', help='Prefix of the input file, default = prefix of input')
     parser.add_argument('--notime', action='store_true', help='No time information in input file')
     parser.add_argument('--nopos', action='store_true', help='No pos information in input file')
+    add_profile_args(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'normalize_ars')
 
     if args.name == '':
         args.name = args.raw.name.split('/')[-1].split('_')[0]
 
     # load bg frequency
-    bg = defaultdict(dict)
-    wsh = args.bg.readline().rstrip('\n').split('\t')
-    for l in args.bg:
-        ws = l.split('\t')
-        for i in range(1,len(ws)):
-            bg[ws[0]][wsh[i]] = float(ws[i])
+    with prof.stage('read background') as st:
+        bg = pd.read_csv(args.bg, sep='\t', index_col=0)
+        bg.index = bg.index.astype(str)
+        st['rows'] = len(bg)
 
     # load freqs
     freq_start = 8
@@ -36,47 +88,18 @@ def main():
     if args.nopos:
         freq_start -= 1
 
-    di = args.raw.readline().rstrip('\n').split('\t')
-    args.o.write('\t'.join(di[:freq_start] + ['RPB'] + di[freq_start:] + [i+'%' for i in di[freq_start:]]) + '\t')
-    args.o.write('\t'.join([i+'n' for i in di[freq_start:]]) + '\n')
-    for l in args.raw:
-        ws = l.rstrip('\n').split('\t')
-
-        # get background name
-        norm = '_'.join([args.name] + ws[4:freq_start-1])
-        if norm not in bg:
-            sys.exit(f'Cannot find background information for {norm}')
-
-        args.o.write('\t'.join(ws[:freq_start]))
-        # Probability for ribos incor = count/divided by length
-        p = float(ws[freq_start-1])/sum(list(bg[norm].values()))
-        args.o.write(f'\t{p}\t')
-        args.o.write('\t'.join(ws[freq_start:]))
-
-        # deal with freq
-        freq = list(map(float, ws[freq_start:]))
-        args.o.write('\t' + '\t'.join([str(i/sum(freq)) for i in freq]))
-
-        # calc norm freq
-        freq_norm = [float(ws[i])/bg[norm][di[i]] for i in range(freq_start,len(ws))]
-        if args.norm == 'prob':
-            args.o.write('\t' + '\t'.join([str(i) for i in freq_norm]))
-        elif args.norm == 'sum1':
-            try:
-                args.o.write('\t' + '\t'.join([str(i/sum(freq_norm)) for i in freq_norm]))
-            except ZeroDivisionError:
-                args.o.write('\t' + '\t'.join(['0.0' for i in freq_norm]))
-        elif args.norm == 'zscore':
-            freq_mean = np.mean(freq_norm)
-            if freq_mean == 0:
-                args.o.write('\t' + '\t'.join(['0.0' for i in freq_norm]))
-            else:
-                freq_std = np.std(freq_norm)
-                args.o.write('\t' + '\t'.join([str((i-freq_mean)/freq_std) for i in freq_norm]))
-        args.o.write('\n')
-
+    with prof.stage('read frequency') as st:
+        raw = data if data is not None else pd.read_csv(args.raw, sep='\t')
+        st['rows'] = len(raw)
+    with prof.stage('normalize', rows=len(raw)):
+        df = normalize(raw, bg, args.name, freq_start, args.norm)
+    if write or args.o is not sys.stdout:
+        with prof.stage('write', rows=len(df)):
+            df.to_csv(args.o, sep='\t', index=False)
 
+    prof.write()
     print('Done!')
+    return df
 
 
 if __name__ == '__main__':
@@ -0,0 +1,114 @@
+import numpy as np
+from itertools import combinations
+from math import comb
+from multiprocessing import Pool
+
+
+# all 2^n sign flips for exact paired test
+def all_sign_flips(n):
+    codes = np.arange(2**n)[:, None] >> np.arange(n)[None, :]
+    return (codes & 1) * 2.0 - 1
+
+
+# label weights, mean(group1) - mean(group2) = W @ X
+def label_weights(n1, n2):
+    return np.r_[np.full(n1, 1.0/n1), np.full(n2, -1.0/n2)]
+
+
+# all label splits for exact two-sample test
+def all_label_splits(n1, n2):
+    n = n1 + n2
+    w = np.full((comb(n, n1), n), -1.0/n2)
+    for i, idx in enumerate(combinations(range(n), n1)):
+        w[i, list(idx)] = 1.0/n1
+    return w
+
+
+# count permuted statistics at least as extreme as observed
+# direction: 0 two-sided, 1 greater, -1 less, per feature
+def count_extreme(stats, obs, direction):
+    # relative tolerance so that ties from float rounding are counted
+    tol = 1e-12 * np.abs(obs)
+    sign = np.where(direction == 0, 1, direction)
+    two = np.abs(stats) >= np.abs(obs) - tol
+    one = stats * sign >= obs * sign - tol
+    return np.where(direction == 0, two, one).sum(axis=0)
+
+
+# evaluate one block of Monte-Carlo sign flips
+def _paired_block(job):
+    d, obs, direction, size, seed = job
+    rng = np.random.default_rng(seed)
+    signs = rng.choice([-1.0, 1.0], size=(size, d.shape[0]))
+    return count_extreme(signs @ d / d.shape[0], obs, direction)
+
+
+# evaluate one block of Monte-Carlo label permutations
+def _unpaired_block(job):
+    x, n1, obs, direction, size, seed = job
+    rng = np.random.default_rng(seed)
+    w = np.tile(label_weights(n1, x.shape[0] - n1), (size, 1))
+    return count_extreme(rng.permuted(w, axis=1) @ x, obs, direction)
+
+
+# split Monte-Carlo permutations into seeded blocks and run them in a pool
+def run_blocks(func, make_job, n_perm, seed, threads, block):
+    sizes = [block] * (n_perm // block)
+    if n_perm % block:
+        sizes.append(n_perm % block)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [make_job(size, s) for size, s in zip(sizes, seeds)]
+    if threads > 1 and len(jobs) > 1:
+        with Pool(min(threads, len(jobs))) as pool:
+            counts = pool.map(func, jobs)
+    else:
+        counts = [func(job) for job in jobs]
+    return np.sum(counts, axis=0)
+
+
+# convert alternative to direction array
+def get_direction(alternative, nfeature):
+    codes = {'two-sided': 0, 'greater': 1, 'less': -1}
+    if isinstance(alternative, str):
+        return np.full(nfeature, codes[alternative])
+    return np.array([codes[x] for x in alternative])
+
+
+# paired permutation test on mean difference, x and y are (samples, features)
+def paired_permutation_test(x, y, n_perm=100000, alternative='two-sided', seed=None, threads=1, block=10000):
+    d = np.asarray(x, dtype=float) - np.asarray(y, dtype=float)
+    single = d.ndim == 1
+    if single:
+        d = d[:, None]
+    obs = d.mean(axis=0)
+    direction = get_direction(alternative, d.shape[1])
+    # exact test if all sign flips could be enumerated
+    if 2**d.shape[0] <= n_perm:
+        signs = all_sign_flips(d.shape[0])
+        p = count_extreme(signs @ d / d.shape[0], obs, direction) / signs.shape[0]
+    else:
+        counts = run_blocks(_paired_block, lambda size, s: (d, obs, direction, size, s), n_perm, seed, threads, block)
+        p = (counts + 1) / (n_perm + 1)
+    return p[0] if single else p
+
+
+# two-sample label permutation test on mean difference, x and y are (samples, features)
+def unpaired_permutation_test(x, y, n_perm=100000, alternative='two-sided', seed=None, threads=1, block=10000):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    single = x.ndim == 1
+    if single:
+        x = x[:, None]
+        y = y[:, None]
+    n1 = x.shape[0]
+    data = np.concatenate([x, y])
+    obs = x.mean(axis=0) - y.mean(axis=0)
+    direction = get_direction(alternative, data.shape[1])
+    # exact test if all label splits could be enumerated
+    if comb(data.shape[0], n1) <= n_perm:
+        w = all_label_splits(n1, y.shape[0])
+        p = count_extreme(w @ data, obs, direction) / w.shape[0]
+    else:
+        counts = run_blocks(_unpaired_block, lambda size, s: (data, n1, obs, direction, size, s), n_perm, seed, threads, block)
+        p = (counts + 1) / (n_perm + 1)
+    return p[0] if single else p
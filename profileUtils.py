@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+import resource
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+# command line options shared by all scripts
+def add_profile_args(parser):
+    parser.add_argument('--profile', help='Write wall time, CPU time, peak memory and counts of each stage to a JSON file')
+    parser.add_argument('--cprofile', help='Write a cProfile dump of the whole run to this file')
+    parser.add_argument('--flamegraph', help='Write stage timings as collapsed stacks for flamegraph.pl or speedscope')
+
+
+# peak resident memory in MB of this process and of finished child processes
+# ru_maxrss is in KB on Linux and bytes on macOS
+def max_rss():
+    scale = 2**20 if sys.platform == 'darwin' else 2**10
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, \
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+
+
+# timer for named stages of a script, does nothing unless a report file is given
+# stages can be nested, counts are added to the dict yielded by stage()
+class Profiler(object):
+    def __init__(self, name, output=None, cprofile=None, flamegraph=None):
+        self.name = name
+        self.output = output
+        self.cprofile = cprofile
+        self.flamegraph = flamegraph
+        self.enabled = any([output, cprofile, flamegraph])
+        self.stages = []
+        self.stack = []
+        self.start = time.perf_counter()
+        self.cpu = time.process_time()
+        self.prof = None
+        if cprofile:
+            import cProfile
+            self.prof = cProfile.Profile()
+            self.prof.enable()
+
+    @classmethod
+    def from_args(cls, args, name):
+        return cls(name, args.profile, args.cprofile, args.flamegraph)
+
+    @contextmanager
+    def stage(self, name, **counts):
+        record = dict(counts)
+        if not self.enabled:
+            yield record
+            return
+        self.stack.append(name)
+        path = ';'.join(self.stack)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            rss, children = max_rss()
+            self.stages.append({'stage':path, 'wall':wall, 'cpu':cpu, 'max_rss_mb':rss, \
+                    'children_max_rss_mb':children, 'counts':record})
+            self.stack.pop()
+
+    # collapsed stacks with self time in microseconds
+    def collapsed(self):
+        total = defaultdict(float)
+        for x in self.stages:
+            total[x['stage']] += x['wall']
+        own = dict(total)
+        for k, v in total.items():
+            if ';' in k:
+                parent = k.rsplit(';', 1)[0]
+                if parent in own:
+                    own[parent] -= v
+        root = time.perf_counter() - self.start - sum(v for k, v in total.items() if ';' not in k)
+        own = {f'{self.name};{k}':v for k, v in own.items()}
+        own[self.name] = root
+        return ''.join([f'{k} {int(max(v, 0)*1e6)}\n' for k, v in own.items()])
+
+    # stop timers and write reports
+    def write(self):
+        if not self.enabled:
+            return
+        if self.prof:
+            self.prof.disable()
+            self.prof.dump_stats(self.cprofile)
+            print(f'cProfile dump is saved to {self.cprofile}', file=sys.stderr)
+        if self.flamegraph:
+            with open(self.flamegraph, 'w') as fw:
+                fw.write(self.collapsed())
+            print(f'Collapsed stacks are saved to {self.flamegraph}', file=sys.stderr)
+        if self.output:
+            rss, children = max_rss()
+            report = {'script':self.name, 'argv':sys.argv[1:], 'pid':os.getpid(), \
+                    'wall':time.perf_counter() - self.start, 'cpu':time.process_time() - self.cpu, \
+                    'max_rss_mb':rss, 'children_max_rss_mb':children, 'stages':self.stages}
+            with open(self.output, 'w') as fw:
+                json.dump(report, fw, indent=2)
+            print(f'Profile is saved to {self.output}', file=sys.stderr)
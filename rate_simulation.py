@@ -1,25 +1,41 @@
 #!/usr/bin/env python3
 
+import argparse
 import sys
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
+import pandas as pd
+from itertools import product
+from multiprocessing import Pool
+from scipy.optimize import least_squares
+from profileUtils import Profiler, add_profile_args
+
+# default parameters
+PARAMS = {'length_pola':20, 'length_pold':180, 'length_max':1100, 'offset':100,
+          'rate_pola':1/625, 'rate_pold':1/5000, 'rate_pole':1/1250,
+          'mrate_pold':1/5000*10, 'mrate_pole':1/1250*5,
+          'nars':400, 'stdev':100, 'min_pold':100, 'max_pold':500,
+          'dev_dist':'normal', 'pold_dist':'uniform', 'seed':1919}
+
 
 # draw plot
-def draw(slwt, slpd, slpe, out):
+def draw(slwt, slpd, slpe, out, length_max=PARAMS['length_max'], offset=PARAMS['offset'], ylim=0.0045):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set(font_scale=2, style='ticks')
     fig, ax = plt.subplots(figsize=(7,6))
     plt.subplots_adjust(top=1, right=0.95, bottom=0.1, left=0.15)
-    ax.plot(np.arange(-100, length_max-100), slpe, color='#FF5555', linewidth=5, alpha=0.7)
-    ax.plot(np.arange(-100, length_max-100), slpd, color='#5555FF', linewidth=5, alpha=0.7)
-    ax.plot(np.arange(-100, length_max-100), slwt,'k--',linewidth=5, alpha=0.7)
-    plt.xlim([-100, length_max - 100])
-    plt.ylim([0, 0.0045])
+    ax.plot(np.arange(-offset, length_max-offset), slpe, color='#FF5555', linewidth=5, alpha=0.7)
+    ax.plot(np.arange(-offset, length_max-offset), slpd, color='#5555FF', linewidth=5, alpha=0.7)
+    ax.plot(np.arange(-offset, length_max-offset), slwt,'k--',linewidth=5, alpha=0.7)
+    plt.xlim([-offset, length_max - offset])
+    plt.ylim([0, ylim])
     ax.plot([0,0],[0,1], 'k:', linewidth=3)
     sns.despine()
     plt.savefig(out)
+    plt.close('all')
 
 # get value from a random ars
-def get_rand_leading(pos, dev, pold, base):
+def get_rand_leading(pos, dev, pold, base, length_pola=PARAMS['length_pola']):
     if pos - dev < 0:
         return base[21]
     elif pos - dev < length_pola:
@@ -30,7 +46,7 @@ def get_rand_leading(pos, dev, pold, base):
         return base[-1]
 
 # get value from a random ars
-def get_rand_lagging(pos, dev, base, pole):
+def get_rand_lagging(pos, dev, base, pole, length_pola=PARAMS['length_pola'], length_pold=PARAMS['length_pold']):
     if pos - dev < 0:
         return pole
     elif (pos - dev)%(length_pola + length_pold) < length_pola:
@@ -38,70 +54,366 @@ def get_rand_lagging(pos, dev, base, pole):
     else:
         return base[21]
 
-# parameters
-length_pola = 20
-length_pold = 180
-length_max = 1100
-rate_pola = 1/625
-rate_pold = 1/5000
-rate_pole = 1/1250
-mrate_pold = 1/5000*10
-mrate_pole = 1/1250*5
-sns.set(font_scale=2, style='ticks')
-np.random.seed(1919)
-
-# single leading
-slwt = [rate_pola]*length_pola + [rate_pold]*length_pold\
-        + [rate_pole]*(length_max-length_pold-length_pola)
-slpd = [rate_pola]*length_pola + [mrate_pold]*length_pold\
-        + [rate_pole]*(length_max-length_pold-length_pola)
-slpe = [rate_pola]*length_pola + [rate_pold]*length_pold\
-        + [mrate_pole]*(length_max-length_pold-length_pola)
-draw(slwt, slpd, slpe, 'single_leading.png')
-
-# single lagging
-slwt = ([rate_pola]*length_pola + [rate_pold]*length_pold) * 10
-slpd = ([rate_pola]*length_pola + [mrate_pold]*length_pold) * 10
-draw(slwt[:length_max], slpd[:length_max], slwt[:length_max], 'single_lagging.png')
-
-# combined random
-nars = 400
-stdev = 100
-min_pold = 100
-max_pold = 500
-devs = np.random.randn(nars)*stdev
-pold_lengths = np.random.rand(nars)*(max_pold-min_pold) + min_pold
-
-# combined leading
-base = [rate_pola]*length_pola + [rate_pold]*length_pold\
-        + [rate_pole]*(length_max-length_pold-length_pola)
-slwt = []
-for i in range(length_max):
-    slwt.append(np.mean([get_rand_leading(i, x[0], x[1], base) for x in zip(devs, pold_lengths)]))
-base= [rate_pola]*length_pola + [mrate_pold]*length_pold\
-        + [rate_pole]*(length_max-length_pold-length_pola)
-slpd = []
-for i in range(length_max):
-    slpd.append(np.mean([get_rand_leading(i, x[0], x[1], base) for x in zip(devs, pold_lengths)]))
-base = [rate_pola]*length_pola + [rate_pold]*length_pold\
-        + [mrate_pole]*(length_max-length_pold-length_pola)
-slpe = []
-for i in range(length_max):
-    slpe.append(np.mean([get_rand_leading(i, x[0], x[1], base) for x in zip(devs, pold_lengths)]))
-draw(slwt, slpd, slpe, 'combined_leading.png')
-
-# combined lagging
-base = ([rate_pola]*length_pola + [rate_pold]*length_pold) * 10
-slwt = []
-for i in range(length_max):
-    slwt.append(np.mean([get_rand_lagging(i, x, base, rate_pole) for x in devs]))
-base = ([rate_pola]*length_pola + [rate_pold]*length_pold) * 10
-slpe = []
-for i in range(length_max):
-    slpe.append(np.mean([get_rand_lagging(i, x, base, mrate_pole) for x in devs]))
-base = ([rate_pola]*length_pola + [mrate_pold]*length_pold) * 10
-slpd = []
-for i in range(length_max):
-    slpd.append(np.mean([get_rand_lagging(i, x, base, rate_pole) for x in devs]))
-draw(slwt, slpd, slpe, 'combined_lagging.png')
+# number of ARS with value larger than each position
+def count_above(values, pos):
+    return len(values) - np.searchsorted(np.sort(values), pos, side='right')
+
+
+# fraction of ARS synthesized by (pola, pold, pole) at each position on leading strand
+# vectorized version of get_rand_leading for all positions and ARS
+def leading_fractions(length_max, devs, pold_lengths, length_pola):
+    pos = np.arange(length_max)
+    before = count_above(devs, pos)
+    pola = count_above(devs + length_pola, pos)
+    # pola has priority over short pold segments
+    pold = count_above(devs + np.maximum(pold_lengths, length_pola), pos)
+    return np.stack([pola - before, before + pold - pola, len(devs) - pold], axis=1) / len(devs)
+
+
+# fraction of ARS synthesized by (pola, pold, pole) at each position on lagging strand
+# vectorized version of get_rand_lagging for all positions and ARS
+def lagging_fractions(length_max, devs, length_pola, length_pold):
+    period = length_pola + length_pold
+    # first position after each ARS, shifted so that all are non-negative
+    start = np.ceil(devs).astype(int)
+    offset = max(0, -start.min())
+    nrow = -(-(length_max + offset) // period)
+    # pola begins at start and ends length_pola later in every period
+    events = np.bincount(start + offset, minlength=nrow*period).astype(float)[:nrow*period]
+    ends = start + offset + length_pola
+    events -= np.bincount(ends[ends < nrow*period], minlength=nrow*period)
+    # repeat events for all following periods, then sum up
+    events = events.reshape(nrow, period).cumsum(axis=0).ravel()
+    pola = events.cumsum()[offset:offset+length_max]
+    before = count_above(devs, np.arange(length_max))
+    return np.stack([pola, len(devs) - before - pola, before], axis=1) / len(devs)
+
+
+# combined rate curves for wild type, pold mutant and pole mutant
+def combined_curves(fractions, rates, mrates):
+    rates = np.asarray(rates)
+    curves = {'wt':fractions @ rates}
+    for i, name in [[1, 'pold'], [2, 'pole']]:
+        r = rates.copy()
+        r[i] = mrates[i]
+        curves[name] = fractions @ r
+    return curves
+
+
+# random ARS offsets and Pol delta segment lengths
+def sample_ars(params, n=None, rng=None):
+    if rng is None:
+        rng = np.random.RandomState(params['seed'])
+    if n is None:
+        n = params['nars']
+    stdev = params['stdev']
+    lo, hi = params['min_pold'], params['max_pold']
+    if params['dev_dist'] == 'normal':
+        devs = rng.standard_normal(n)*stdev
+    else:
+        devs = (rng.random(n)*2 - 1)*stdev
+    if params['pold_dist'] == 'uniform':
+        pold_lengths = rng.random(n)*(hi-lo) + lo
+    else:
+        pold_lengths = np.clip(rng.standard_normal(n)*(hi-lo)/4 + (hi+lo)/2, lo, hi)
+    return devs, pold_lengths
+
+
+# rate curves of a single ARS, (pola, pold, pole) fractions on each strand
+def single_fractions(params):
+    la, ld, lm = params['length_pola'], params['length_pold'], params['length_max']
+    leading = np.zeros((lm, 3))
+    leading[:la, 0] = 1
+    leading[la:la+ld, 1] = 1
+    leading[la+ld:, 2] = 1
+    lagging = np.resize(np.repeat(np.eye(3)[:2], [la, ld], axis=0), (lm, 3))
+    return leading, lagging
+
+
+# wild type and mutant rates
+def get_rates(params):
+    rates = [params['rate_pola'], params['rate_pold'], params['rate_pole']]
+    mrates = [params['rate_pola'], params['mrate_pold'], params['mrate_pole']]
+    return rates, mrates
+
+
+# simulate all rate curves for one parameter set
+def simulate(params):
+    rates, mrates = get_rates(params)
+    devs, pold_lengths = sample_ars(params)
+    single_leading, single_lagging = single_fractions(params)
+    curves = {}
+    curves['single_leading'] = combined_curves(single_leading, rates, mrates)
+    curves['single_lagging'] = combined_curves(single_lagging, rates, mrates)
+    curves['combined_leading'] = combined_curves(leading_fractions(params['length_max'], \
+            devs, pold_lengths, params['length_pola']), rates, mrates)
+    curves['combined_lagging'] = combined_curves(lagging_fractions(params['length_max'], \
+            devs, params['length_pola'], params['length_pold']), rates, mrates)
+    return curves
+
+
+# evaluate all rate multipliers for one ARS parameter set
+# fractions do not depend on rates, so all multipliers are one matrix product
+def sweep_one(job):
+    params, mults = job
+    devs, pold_lengths = sample_ars(params)
+    fractions = {'leading':leading_fractions(params['length_max'], devs, pold_lengths, params['length_pola']),
+                 'lagging':lagging_fractions(params['length_max'], devs, params['length_pola'], params['length_pold'])}
+    rates = np.asarray(get_rates(params)[0])
+    mults = np.asarray(mults)
+    pos = np.arange(params['length_max']) - params['offset']
+    d = []
+    for strand, frac in fractions.items():
+        values = frac @ (mults * rates).T
+        df = pd.DataFrame({'Pola_mult':np.repeat(mults[:,0], len(pos)), 'Pold_mult':np.repeat(mults[:,1], len(pos)),
+                           'Pole_mult':np.repeat(mults[:,2], len(pos)), 'Stdev':params['stdev'],
+                           'Length_pold':params['length_pold'], 'Strand':strand,
+                           'Position':np.tile(pos, len(mults)), 'Rate':values.T.ravel()})
+        d.append(df)
+    return pd.concat(d)
+
+
+# sweep rate multipliers and ARS parameters in a process pool
+def sweep(params, pola_mults, pold_mults, pole_mults, stdevs, pold_lengths, threads=1):
+    mults = list(product(pola_mults, pold_mults, pole_mults))
+    jobs = [[dict(params, stdev=s, length_pold=l), mults] for s, l in product(stdevs, pold_lengths)]
+    if threads > 1 and len(jobs) > 1:
+        with Pool(min(threads, len(jobs))) as pool:
+            d = pool.map(sweep_one, jobs)
+    else:
+        d = [sweep_one(job) for job in jobs]
+    return pd.concat(d, ignore_index=True)
+
+
+# Okazaki fragment start positions for each fork, sd=0 gives fixed length fragments
+def okazaki_starts(devs, params, okazaki_sd, rng):
+    period = params['length_pola'] + params['length_pold']
+    span = params['length_max'] - np.floor(devs.min())
+    nfrag = int(np.ceil(span / period)) + 1
+    lengths = np.empty((len(devs), 0), dtype=int)
+    # add fragments until all forks pass the end
+    while lengths.shape[1] == 0 or lengths.sum(axis=1).min() < span:
+        new = np.rint(rng.normal(period, okazaki_sd, size=(len(devs), nfrag))) if okazaki_sd > 0 \
+                else np.full((len(devs), nfrag), period)
+        lengths = np.hstack([lengths, np.maximum(new, params['length_pola'] + 1).astype(int)])
+    starts = np.hstack([np.zeros((len(devs), 1), dtype=int), lengths[:, :-1].cumsum(axis=1)])
+    return np.ceil(devs).astype(int)[:, None] + starts
+
+
+# number of bases made by (pola, pold, pole) at each position for a chunk of forks
+def fork_coverage(job):
+    params, nforks, okazaki_sd, seed = job
+    rng = np.random.default_rng(seed)
+    lm = params['length_max']
+    devs, pold_lengths = sample_ars(params, nforks, rng)
+    # fractions times forks are whole fork counts up to rounding error
+    leading = np.rint(leading_fractions(lm, devs, pold_lengths, params['length_pola']) * nforks).astype(np.int64)
+    # pola segments at the start of every Okazaki fragment
+    starts = okazaki_starts(devs, params, okazaki_sd, rng).ravel()
+    events = np.bincount(np.clip(starts, 0, lm), minlength=lm+1)
+    events -= np.bincount(np.clip(starts + params['length_pola'], 0, lm), minlength=lm+1)
+    pola = events.cumsum()[:lm]
+    before = count_above(devs, np.arange(lm))
+    lagging = np.stack([pola, nforks - before - pola, before], axis=1)
+    return leading, lagging
+
+
+# label positions with bins around offset, same as flank bins: (i+1)*binsize
+def bin_labels(params, binsize):
+    d = np.arange(params['length_max']) - params['offset']
+    return np.where(d >= 0, (d // binsize + 1) * binsize, -((-d - 1) // binsize + 1) * binsize)
+
+
+# Monte Carlo simulation of rNMP counts for several libraries
+# forks of each library are split into chunks with independent random streams
+def monte_carlo(params, nlibs, nforks, binsize, okazaki_sd=0, chunk=100000, sampling='binomial', \
+        genotype='SIM', time='early', threads=1):
+    rates = np.asarray(get_rates(params)[0])
+    seeds = np.random.SeedSequence(params['seed']).spawn(nlibs)
+    sizes = [chunk] * (nforks // chunk) + ([nforks % chunk] if nforks % chunk else [])
+    jobs = []
+    for lib_seed in seeds:
+        jobs += [[params, size, okazaki_sd, s] for size, s in zip(sizes, lib_seed.spawn(len(sizes)))]
+    if threads > 1 and len(jobs) > 1:
+        with Pool(min(threads, len(jobs))) as pool:
+            coverages = pool.map(fork_coverage, jobs)
+    else:
+        coverages = [fork_coverage(job) for job in jobs]
+    labels = bin_labels(params, binsize)
+    positions, index = np.unique(labels, return_inverse=True)
+    bases = np.bincount(index) * nforks
+    d = []
+    for i in range(nlibs):
+        rng = np.random.default_rng(seeds[i].spawn(1)[0])
+        libcov = coverages[i*len(sizes):(i+1)*len(sizes)]
+        for k, strand in enumerate(['leading', 'lagging']):
+            coverage = np.sum([c[k] for c in libcov], axis=0)
+            # incorporation events for each polymerase at each base
+            if sampling == 'poisson':
+                counts = rng.poisson(coverage * rates).sum(axis=1)
+            else:
+                counts = rng.binomial(coverage, rates).sum(axis=1)
+            sums = np.bincount(index, weights=counts).astype(int)
+            d.append(pd.DataFrame({'Library':f'sim{i+1}', 'String':'SIM', 'Genotype':genotype, 'RE':f'RE{i+1}', \
+                    'Time':time, 'Position':positions, 'Strand':strand, 'Sum':sums, 'RPB':sums/bases}))
+    return pd.concat(d, ignore_index=True)
+
+
+# mean (pola, pold, pole) fractions in each distance bin [d-binsize, d)
+# computed once and reused by every objective evaluation
+def bin_fractions(params, distances, binsize):
+    params = dict(params, length_max=int(max(distances)) + params['offset'])
+    devs, pold_lengths = sample_ars(params)
+    d = {}
+    fractions = {'leading':leading_fractions(params['length_max'], devs, pold_lengths, params['length_pola']),
+                 'lagging':lagging_fractions(params['length_max'], devs, params['length_pola'], params['length_pold'])}
+    for strand, frac in fractions.items():
+        cum = np.vstack([np.zeros((1, 3)), frac.cumsum(axis=0)])
+        e = np.asarray(distances, dtype=int) + params['offset']
+        s = np.maximum(e - binsize, 0)
+        d[strand] = (cum[e] - cum[s]) / (e - s)[:, None]
+    return np.vstack([d['leading'], d['lagging']])
+
+
+# observed RPB of each library, left and right flanks are folded by distance
+def observed_profiles(df, genotype, times=None):
+    df = df[df.Genotype == genotype]
+    if times:
+        df = df[df.Time.isin(times)]
+    df = df.assign(Distance=df.Position.abs())
+    wide = df.pivot_table(index='Library', columns=['Strand', 'Distance'], values='RPB', aggfunc='mean')
+    distances = sorted(df.Distance.unique())
+    wide = wide.reindex(columns=pd.MultiIndex.from_product([['leading', 'lagging'], distances]))
+    return wide.dropna(), distances
+
+
+# least squares fit of (pola, pold, pole) rates, optimized on log scale
+def fit_rates(design, obs, r0):
+    scale = 1 / np.mean(np.abs(obs))
+    def residual(theta):
+        return (design @ np.exp(theta) - obs) * scale
+    def jacobian(theta):
+        return design * np.exp(theta) * scale
+    res = least_squares(residual, np.log(r0), jac=jacobian, method='trf')
+    return np.exp(res.x), res.cost / scale**2
+
+
+# fit rates to observed profiles with bootstrap over libraries
+def fit(params, df, genotype, times=None, binsize=None, n_boot=200, seed=1919):
+    wide, distances = observed_profiles(df, genotype, times)
+    if wide.empty:
+        raise ValueError(f'No complete profile for genotype {genotype}')
+    if binsize is None:
+        binsize = int(distances[1] - distances[0]) if len(distances) > 1 else int(distances[0])
+    design = bin_fractions(params, distances, binsize)
+    r0 = np.asarray(get_rates(params)[0])
+    obs = wide.values.mean(axis=0)
+    # start from default rates scaled to observed level
+    r0 = r0 * obs.mean() / (design @ r0).mean()
+    rates, cost = fit_rates(design, obs, r0)
+    # all bootstrap profiles at once: resampling counts @ library profiles
+    rng = np.random.default_rng(seed)
+    counts = rng.multinomial(len(wide), [1/len(wide)]*len(wide), size=n_boot)
+    boots = np.array([fit_rates(design, o, rates)[0] for o in counts @ wide.values / len(wide)])
+    result = pd.DataFrame({'Genotype':genotype, 'Polymerase':['pola', 'pold', 'pole'], 'Rate':rates,
+                           'SE':boots.std(axis=0, ddof=1) if n_boot > 1 else np.nan,
+                           'CI_low':np.quantile(boots, 0.025, axis=0) if n_boot else np.nan,
+                           'CI_high':np.quantile(boots, 0.975, axis=0) if n_boot else np.nan,
+                           'Libraries':len(wide), 'Cost':cost})
+    return result
+
+
+# arguments for simulation parameters
+def add_param_args(parser):
+    for k in ['length_pola', 'length_pold', 'length_max', 'offset', 'nars', 'min_pold', 'max_pold', 'seed']:
+        parser.add_argument(f'--{k}', type=int, default=PARAMS[k], help=f'default={PARAMS[k]}')
+    for k in ['rate_pola', 'rate_pold', 'rate_pole', 'mrate_pold', 'mrate_pole', 'stdev']:
+        parser.add_argument(f'--{k}', type=float, default=PARAMS[k], help=f'default={PARAMS[k]:.6g}')
+    parser.add_argument('--dev_dist', default=PARAMS['dev_dist'], choices=['normal', 'uniform'], \
+            help='Distribution of ARS position deviation, normal(0, stdev) or uniform(-stdev, stdev), default=normal')
+    parser.add_argument('--pold_dist', default=PARAMS['pold_dist'], choices=['uniform', 'normal'], \
+            help='Distribution of Pol delta length on leading strand between min_pold and max_pold, default=uniform')
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # plot is the default command
+    if not argv or argv[0] not in ['plot', 'sweep', 'mc', 'fit', '-h', '--help']:
+        argv = ['plot'] + argv
+    parser = argparse.ArgumentParser(description='Simulate rNMP incorporation rate change around ARS')
+    subparsers = parser.add_subparsers(dest='command')
+    parser_plot = subparsers.add_parser('plot', help='Draw single and combined rate curves (default)')
+    add_param_args(parser_plot)
+    parser_plot.add_argument('--ylim', type=float, default=0.0045, help='Maximum of y axis, default=0.0045')
+    parser_plot.add_argument('-o', default='', help='Output file basename')
+    parser_sweep = subparsers.add_parser('sweep', help='Evaluate a grid of mutant rate multipliers')
+    add_param_args(parser_sweep)
+    parser_sweep.add_argument('--pola_mult', type=float, nargs='+', default=[1], help='Multipliers for Pol alpha rate, default=[1]')
+    parser_sweep.add_argument('--pold_mult', type=float, nargs='+', default=[1], help='Multipliers for Pol delta rate, default=[1]')
+    parser_sweep.add_argument('--pole_mult', type=float, nargs='+', default=[1], help='Multipliers for Pol epsilon rate, default=[1]')
+    parser_sweep.add_argument('--stdevs', type=float, nargs='+', help='ARS deviations to sweep, default=stdev')
+    parser_sweep.add_argument('--pold_lengths', type=int, nargs='+', help='Lagging Pol delta lengths to sweep, default=length_pold')
+    parser_sweep.add_argument('-p', type=int, default=1, help='Number of processes, default=1')
+    parser_sweep.add_argument('-o', type=argparse.FileType('w'), default=sys.stdout, help='Output to file')
+    parser_mc = subparsers.add_parser('mc', help='Monte Carlo simulation of rNMP counts for each library')
+    add_param_args(parser_mc)
+    parser_mc.add_argument('--libraries', type=int, default=3, help='Number of simulated libraries, default=3')
+    parser_mc.add_argument('--forks', type=int, default=1000000, help='Number of forks for each library, default=1000000')
+    parser_mc.add_argument('--okazaki_sd', type=float, default=20, help='Standard deviation of Okazaki fragment length, default=20')
+    parser_mc.add_argument('--sampling', default='binomial', choices=['binomial', 'poisson'], help='Distribution of incorporation events, default=binomial')
+    parser_mc.add_argument('--chunk', type=int, default=100000, help='Number of forks simulated at once, default=100000')
+    parser_mc.add_argument('-b', type=int, default=100, help='Bin size, default=100')
+    parser_mc.add_argument('--genotype', default='SIM', help='Genotype label in output, default=SIM')
+    parser_mc.add_argument('--time', default='early', help='Time label in output, default=early')
+    parser_mc.add_argument('-p', type=int, default=1, help='Number of processes, default=1')
+    parser_mc.add_argument('-o', type=argparse.FileType('w'), default=sys.stdout, help='Output to file')
+    parser_fit = subparsers.add_parser('fit', help='Fit polymerase incorporation rates to observed ARS profiles')
+    parser_fit.add_argument('ars', type=argparse.FileType('r'), help='Normalized ARS region frequency file')
+    add_param_args(parser_fit)
+    parser_fit.add_argument('-g', nargs='+', default=['WT'], help='Genotypes to fit, default=[WT]')
+    parser_fit.add_argument('-t', nargs='*', help='Replication times to use, default=all')
+    parser_fit.add_argument('-b', type=int, help='Bin size, default=distance between positions')
+    parser_fit.add_argument('--bootstrap', type=int, default=200, help='Number of bootstrap resamples of libraries, default=200')
+    parser_fit.add_argument('-o', type=argparse.FileType('w'), default=sys.stdout, help='Output to file')
+    for p in [parser_plot, parser_sweep, parser_mc, parser_fit]:
+        add_profile_args(p)
+    args = parser.parse_args(argv)
+    params = {k:getattr(args, k) for k in PARAMS}
+    prof = Profiler.from_args(args, f'rate_simulation {args.command}')
+
+    if args.command == 'sweep':
+        with prof.stage('sweep') as st:
+            df = sweep(params, args.pola_mult, args.pold_mult, args.pole_mult, \
+                    args.stdevs or [args.stdev], args.pold_lengths or [args.length_pold], args.p)
+            st['rows'] = len(df)
+        with prof.stage('write', rows=len(df)):
+            df.to_csv(args.o, sep='\t', index=False)
+    elif args.command == 'fit':
+        with prof.stage('read') as st:
+            data = pd.read_csv(args.ars, sep='\t')
+            st['rows'] = len(data)
+        dfs = []
+        for g in args.g:
+            with prof.stage(f'fit {g}', bootstrap=args.bootstrap):
+                dfs.append(fit(params, data, g, args.t, args.b, args.bootstrap, args.seed))
+        df = pd.concat(dfs)
+        df.to_csv(args.o, sep='\t', index=False)
+    elif args.command == 'mc':
+        with prof.stage('monte carlo', libraries=args.libraries, forks=args.libraries * args.forks):
+            df = monte_carlo(params, args.libraries, args.forks, args.b, args.okazaki_sd, args.chunk, \
+                    args.sampling, args.genotype, args.time, args.p)
+        with prof.stage('write', rows=len(df)):
+            df.to_csv(args.o, sep='\t', index=False)
+    else:
+        with prof.stage('simulate', nars=params['nars']):
+            curves = simulate(params)
+        prefix = args.o + '_' if args.o else ''
+        for name, c in curves.items():
+            with prof.stage(f'render {prefix}{name}.png'):
+                draw(c['wt'], c['pold'], c['pole'], f'{prefix}{name}.png', params['length_max'], params['offset'], args.ylim)
+    prof.write()
+    print('Done!', file=sys.stderr)
+
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import numpy as np
+from getFlankUtils import read_ars, read_faidx, calc_boundary, find_territory
+from countUtils import count_strands, write_step_bedgraph
+from profileUtils import Profiler, add_profile_args
+
+
+# leading and lagging counts at each base, forks moving right use plus strand as leading strand
+def split_leading(counts, arss, names):
+    _, dist = find_territory(arss, names, np.arange(counts.shape[1]))
+    right = dist >= 0
+    leading = np.where(right, counts[0], counts[1])
+    lagging = np.where(right, counts[1], counts[0])
+    return leading, lagging
+
+
+# sums in sliding windows centered at each step, from cumulative sums
+def window_sums(cs, length, window, step):
+    centers = np.arange(0, length, step) + step // 2
+    lo = np.clip(centers - window // 2, 0, length)
+    hi = np.clip(centers - window // 2 + window, 0, length)
+    return cs[hi] - cs[lo], hi - lo
+
+
+# leading RPB, lagging RPB and leading/lagging ratio for one chromosome and one zoom level
+def ratio_track(cs_leading, cs_lagging, length, window, step, min_count):
+    le, bases = window_sums(cs_leading, length, window, step)
+    la, _ = window_sums(cs_lagging, length, window, step)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where((la > 0) & (le + la >= min_count), le / la, np.nan)
+    return {'leading_rpb':le / bases, 'lagging_rpb':la / bases, 'ratio':ratio}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genome-wide sliding window leading/lagging rNMP ratio and RPB tracks')
+    parser.add_argument('ars', type=argparse.FileType('r'), help='Bed file for ars region with time')
+    parser.add_argument('index', type=argparse.FileType('r'), help='index file for background genome')
+    parser.add_argument('bed', nargs='+', help='rNMP bed files of libraries')
+    parser.add_argument('-w', type=int, default=1000, help='Window size of the finest zoom level, default=1000')
+    parser.add_argument('-s', type=int, default=100, help='Step of the finest zoom level, default=100')
+    parser.add_argument('-z', type=int, nargs='*', default=[10, 100], help='Coarser zoom levels as multiples of window and step, default=[10, 100]')
+    parser.add_argument('-m', type=int, default=10, help='Minimum number of rNMPs in a window to report its ratio, default=10')
+    parser.add_argument('-v', type=int, default=1600, help='Fork speed, base per minute')
+    parser.add_argument('--default_time', type=float, help='Firing time for ARS without time column, default=required')
+    parser.add_argument('--pool', action='store_true', help='Sum all libraries into one set of tracks')
+    parser.add_argument('--digits', type=int, default=6, help='Significant digits kept in output, default=6')
+    parser.add_argument('--chunksize', type=int, default=1000000, help='Number of reads loaded at once, default=1000000')
+    parser.add_argument('-o', default='tracks', help='Output file basename')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'ratio_tracks')
+
+    # ARS and territories
+    with prof.stage('read ARS') as st:
+        arss, ars_orders = read_ars(args.ars, args.default_time)
+        chrom_sizes = read_faidx(args.index)
+        ars_orders = {k:v for k, v in ars_orders.items() if k in chrom_sizes}
+        calc_boundary(arss, ars_orders, chrom_sizes, args.v, False)
+        st['ars'] = len(arss)
+    print('ARS information read!')
+    # chromosomes without ARS have no fork direction
+    chrom_sizes = {k:chrom_sizes[k] for k in ars_orders}
+
+    # count each library once
+    libraries = {}
+    for path in args.bed:
+        name = os.path.basename(path).rsplit('.bed', 1)[0]
+        with prof.stage(f'count {name}') as st:
+            if args.pool and libraries:
+                _, st['reads'] = count_strands(path, chrom_sizes, libraries['pooled'], args.chunksize)
+            else:
+                libraries['pooled' if args.pool else name], st['reads'] = count_strands(path, chrom_sizes, chunksize=args.chunksize)
+    print('Libraries counted!')
+
+    levels = [1] + args.z
+    tracks = ['leading_rpb', 'lagging_rpb', 'ratio']
+    for name, counts in libraries.items():
+        fws = {(z, t):open(f'{args.o}_{name}_{t}_{args.w*z}.bedGraph', 'w') for z in levels for t in tracks}
+        with prof.stage(f'tracks {name}', levels=len(levels)):
+            for chrom, order in ars_orders.items():
+                leading, lagging = split_leading(counts[chrom], arss, order)
+                cs_leading = np.r_[0, np.cumsum(leading, dtype=np.int64)]
+                cs_lagging = np.r_[0, np.cumsum(lagging, dtype=np.int64)]
+                for z in levels:
+                    values = ratio_track(cs_leading, cs_lagging, chrom_sizes[chrom], args.w*z, args.s*z, args.m)
+                    for t in tracks:
+                        write_step_bedgraph(fws[(z, t)], chrom, values[t], args.s*z, chrom_sizes[chrom], args.digits)
+        for fw in fws.values():
+            fw.close()
+
+    prof.write()
+    print('Done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import json
+import time
+import hashlib
+import tempfile
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+import syntheticUtils as su
+
+ARS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ARS_bed')
+
+
+# reference: row by row normalization, as normalize_ars.py did before it was vectorized
+def reference_normalize(raw, bg, name, freq_start=8, norm='zscore'):
+    di = list(raw.columns)
+    bgd = {k:v for k, v in zip(bg.index, bg.to_dict('records'))}
+    rows = []
+    for ws in raw.astype(str).values.tolist():
+        key = '_'.join([name] + ws[4:freq_start-1])
+        p = float(ws[freq_start-1])/sum(list(bgd[key].values()))
+        freq = list(map(float, ws[freq_start:]))
+        percent = [i/sum(freq) for i in freq]
+        freq_norm = [float(ws[i])/bgd[key][di[i]] for i in range(freq_start, len(ws))]
+        if norm == 'sum1':
+            total = sum(freq_norm)
+            freq_norm = [i/total for i in freq_norm] if total != 0 else [0.0]*len(freq_norm)
+        elif norm == 'zscore':
+            freq_mean = np.mean(freq_norm)
+            if freq_mean == 0:
+                freq_norm = [0.0]*len(freq_norm)
+            else:
+                freq_std = np.std(freq_norm)
+                freq_norm = [(i-freq_mean)/freq_std for i in freq_norm]
+        rows.append([p] + freq + percent + freq_norm)
+    columns = ['RPB'] + di[freq_start:] + [i+'%' for i in di[freq_start:]] + [i+'n' for i in di[freq_start:]]
+    return pd.DataFrame(rows, columns=columns)
+
+
+# reference: average over ARS of get_rand_leading and get_rand_lagging at each position
+def reference_simulate(params):
+    from rate_simulation import sample_ars, get_rand_leading, get_rand_lagging
+    la, ld, lm = params['length_pola'], params['length_pold'], params['length_max']
+    devs, pold_lengths = sample_ars(params)
+    curves = {'combined_leading':{}, 'combined_lagging':{}}
+    for name, pold, pole in [['wt', params['rate_pold'], params['rate_pole']], \
+            ['pold', params['mrate_pold'], params['rate_pole']], ['pole', params['rate_pold'], params['mrate_pole']]]:
+        base = [params['rate_pola']]*la + [pold]*ld + [pole]*(lm-ld-la)
+        curves['combined_leading'][name] = np.array([np.mean([get_rand_leading(i, x, y, base, la) \
+                for x, y in zip(devs, pold_lengths)]) for i in range(lm)])
+        base = ([params['rate_pola']]*la + [pold]*ld) * (lm // (la + ld) + 1)
+        curves['combined_lagging'][name] = np.array([np.mean([get_rand_lagging(i, x, base, pole, la, ld) \
+                for x in devs]) for i in range(lm)])
+    return curves
+
+
+# flatten read_data result into a sorted table
+def count_table(data):
+    d = []
+    for w, v in data.items():
+        for strand in ['leading', 'lagging']:
+            for lib, c in v[strand].items():
+                d.append(list(w) + [strand, lib, c])
+    df = pd.DataFrame(d, columns=['chrom', 'start', 'end', 'time', 'side', 'direction', 'strand', 'lib', 'count'])
+    return df.sort_values(['chrom', 'start', 'strand', 'lib']).reset_index(drop=True)
+
+
+# flatten flank bins into a sorted table
+def bin_table(bins):
+    d = []
+    for t, v in bins.items():
+        for s, v1 in v.items():
+            for l, v2 in v1.items():
+                d += [[t, s, l] + x for x in v2]
+    df = pd.DataFrame(d, columns=['group', 'type', 'length', 'chrom', 'start', 'end', 'name', 'distance', 'strand'])
+    return df.sort_values(['group', 'type', 'length', 'chrom', 'start', 'strand']).reset_index(drop=True)
+
+
+# digest of a table, independent of float formatting
+def digest(df):
+    h = hashlib.sha256()
+    h.update(repr(list(df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+# compare two tables or dicts of arrays with numeric tolerance, return a list of problems
+def compare(ref, new, rtol, atol, label=''):
+    if isinstance(ref, dict):
+        problems = []
+        for k in ref:
+            if k not in new:
+                problems.append(f'{label}{k}: missing')
+            else:
+                problems += compare(ref[k], new[k], rtol, atol, f'{label}{k}.')
+        return problems
+    if isinstance(ref, pd.DataFrame):
+        if list(ref.columns) != list(new.columns) or ref.shape != new.shape:
+            return [f'{label} columns or shape differ: {ref.shape} vs {new.shape}']
+        problems = []
+        for c in ref.columns:
+            problems += compare(ref[c].to_numpy(), new[c].to_numpy(), rtol, atol, f'{label}{c}')
+        return problems
+    ref, new = np.asarray(ref), np.asarray(new)
+    if ref.shape != new.shape:
+        return [f'{label}: shape {ref.shape} vs {new.shape}']
+    if ref.dtype.kind not in 'fc':
+        bad = ref != new
+        return [f'{label}: {bad.sum()} values differ'] if bad.any() else []
+    bad = ~np.isclose(new, ref, rtol=rtol, atol=atol, equal_nan=True)
+    if bad.any():
+        err = np.nanmax(np.abs(new - ref))
+        return [f'{label}: {bad.sum()} values differ, max abs error {err:.3g}']
+    return []
+
+
+# best wall time of several runs and the last result
+# fast engines are repeated for at least min_time seconds to reduce timer noise
+def timed(func, repeat, min_time=0.5):
+    best = None
+    total = 0
+    n = 0
+    while n < repeat or (repeat > 1 and total < min_time):
+        start = time.perf_counter()
+        result = func()
+        wall = time.perf_counter() - start
+        best = wall if best is None else min(best, wall)
+        total += wall
+        n += 1
+    return result, best
+
+
+# fixed mix of python loops and numpy sorting and counting, items/s of this host
+# throughput is compared relative to it, so a baseline from another machine still applies
+def calibrate():
+    rng = np.random.default_rng(0)
+    x = rng.integers(0, 1000, 200000)
+    def kernel():
+        counts = defaultdict(int)
+        for v in x[:50000].tolist():
+            counts[v % 97] += 1
+        return np.bincount(np.sort(x), minlength=1000).sum() + len(counts)
+    _, wall = timed(kernel, 5)
+    return len(x) / wall
+
+
+# input files: synthetic data and bundled ARS_bed
+def make_inputs(d, args):
+    rng = np.random.default_rng(args.seed)
+    su.write_faidx(f'{d}/genome.fa.fai')
+    su.write_ars(f'{d}/synthetic.bed', su.make_ars(args.ars, rng))
+    libinfo = su.make_libinfo(args.libs)
+    os.makedirs(f'{d}/libs')
+    for lib in libinfo:
+        su.write_reads(f'{d}/libs/{lib[0]}.bed', args.reads, rng)
+    positions = list(range(1000, 15001, 1000))
+    freq = su.make_freq_table(libinfo, positions, rng)
+    # rows without counts cannot be normalized by the reference
+    freq = freq[freq.Sum > 0].reset_index(drop=True)
+    return {'libs':[x[0] for x in libinfo], 'freq':freq, 'bg':su.make_bg_table('check', positions, rng)}
+
+
+# each check returns (items, {case: {engine: function}}, reference engine name)
+# engines other than the reference are compared with it, items=None counts output rows
+def check_read_data(d, inputs, args):
+    from checkTimeInputs import read_ars, generate_windows, read_data, read_index
+    from countUtils import build_index, CountIndex
+    build_index([f'{d}/libs/{lib}.bed' for lib in inputs['libs']], f'{d}/index')
+    index = CountIndex(f'{d}/index')
+    results = {}
+    for bed in [f'{d}/synthetic.bed', f'{ARS_DIR}/ars_timing.bed']:
+        with open(bed) as fr:
+            windows = generate_windows(read_ars(fr), args.flank, True)
+        results[os.path.basename(bed)] = {'read_data':lambda w=windows: count_table(read_data(w, inputs['libs'], f'{d}/libs')), \
+                'read_index':lambda w=windows: count_table(read_index(w, inputs['libs'], index))}
+    return args.reads * len(inputs['libs']) * len(results), results, 'read_data'
+
+
+def check_bins(d, inputs, args):
+    from getFlankUtils import read_ars, read_faidx, calc_boundary, sep_ars
+    def add_bins(bed, default_time):
+        with open(bed) as fr:
+            arss, ars_orders = read_ars(fr, default_time)
+        with open(f'{d}/genome.fa.fai') as fr:
+            chrom_sizes = read_faidx(fr)
+        calc_boundary(arss, ars_orders, chrom_sizes, 1600, False, args.flank)
+        bins = defaultdict(lambda : defaultdict(lambda : defaultdict(list)))
+        for t, v in sep_ars(arss, [25, 30]).items():
+            for name in v:
+                arss[name].add_bins(bins[t], args.binsize)
+        return bin_table(bins)
+    results = {}
+    for bed, default_time in [[f'{d}/synthetic.bed', None], [f'{ARS_DIR}/ars_timing.bed', None], [f'{ARS_DIR}/ars_confirmed.bed', 0]]:
+        results[os.path.basename(bed)] = {'add_bins':lambda b=bed, t=default_time: add_bins(b, t)}
+    return None, results, 'add_bins'
+
+
+def check_normalize(d, inputs, args):
+    from normalize_ars import normalize
+    columns = ['RPB', 'A', 'C', 'G', 'T', 'A%', 'C%', 'G%', 'T%', 'An', 'Cn', 'Gn', 'Tn']
+    results = {}
+    for norm in ['zscore', 'sum1', 'prob']:
+        results[norm] = {'reference':lambda n=norm: reference_normalize(inputs['freq'], inputs['bg'], 'check', 8, n), \
+                'normalize':lambda n=norm: normalize(inputs['freq'], inputs['bg'], 'check', 8, n)[columns].astype(float)}
+    return len(inputs['freq']) * len(results), results, 'reference'
+
+
+def check_rate_simulation(d, inputs, args):
+    from rate_simulation import PARAMS, simulate
+    params = dict(PARAMS)
+    params['nars'] = args.nars
+    def fast():
+        curves = simulate(params)
+        return {k:curves[k] for k in ['combined_leading', 'combined_lagging']}
+    return params['nars'] * params['length_max'], {'default':{'reference':lambda: reference_simulate(params), 'simulate':fast}}, 'reference'
+
+
+CHECKS = {'read_data':check_read_data, 'bins':check_bins, 'normalize':check_normalize, 'rate_simulation':check_rate_simulation}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that optimized engines give the same results as reference implementations and keep their speed')
+    parser.add_argument('-c', nargs='+', default=list(CHECKS), choices=list(CHECKS), help=f'Checks to run, default={list(CHECKS)}')
+    parser.add_argument('--baseline', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'regression_baseline.json'), \
+            help='Baseline with output digests and throughput, default=regression_baseline.json next to this script')
+    parser.add_argument('--update', action='store_true', help='Write current digests and throughput to the baseline instead of checking them')
+    parser.add_argument('--rtol', type=float, default=1e-9, help='Relative tolerance for floating point outputs, default=1e-9')
+    parser.add_argument('--atol', type=float, default=1e-12, help='Absolute tolerance for floating point outputs, default=1e-12')
+    parser.add_argument('--slowdown', type=float, default=0.7, help='Warn if throughput relative to this host is below this fraction of the baseline, default=0.7')
+    parser.add_argument('--strict-perf', action='store_true', help='Fail instead of warn if throughput is below --slowdown of the baseline')
+    parser.add_argument('--no-perf', action='store_true', help='Only check outputs, do not report throughput')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of each engine, best is used for throughput, default=3')
+    parser.add_argument('--reads', type=int, default=100000, help='Number of synthetic reads in each library, default=100000')
+    parser.add_argument('--libs', type=int, default=4, help='Number of synthetic libraries, default=4')
+    parser.add_argument('--ars', type=int, default=300, help='Approximate number of synthetic ARS, default=300')
+    parser.add_argument('--flank', type=int, default=15000, help='Flank length, default=15000')
+    parser.add_argument('--binsize', type=int, default=100, help='Bin size for flank bins, default=100')
+    parser.add_argument('--nars', type=int, default=400, help='Number of simulated ARS for rate_simulation, default=400')
+    parser.add_argument('--seed', type=int, default=1919, help='Random seed for synthetic data, default=1919')
+    args = parser.parse_args(argv)
+
+    baseline = {'digests':{}, 'throughput':{}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fr:
+            baseline = json.load(fr)
+    params = {k:getattr(args, k) for k in ['reads', 'libs', 'ars', 'flank', 'binsize', 'nars', 'seed']}
+    if not args.update and baseline.get('params', params) != params:
+        print('Input parameters differ from the baseline, output digests are not checked', file=sys.stderr)
+        baseline['digests'] = {}
+
+    failures = []
+    warnings = []
+    # host speed, throughput is scaled to the host speed of the baseline
+    scale = 1
+    if not args.no_perf or args.update:
+        host = calibrate()
+        if args.update:
+            baseline['calibration'] = host
+        elif 'calibration' in baseline:
+            scale = baseline['calibration'] / host
+        print(f'{"calibration":<28}{host:25.1f} items/s {scale:6.2f}x host scale', file=sys.stderr)
+    with tempfile.TemporaryDirectory() as d:
+        inputs = make_inputs(d, args)
+        for name in args.c:
+            items, results, ref = CHECKS[name](d, inputs, args)
+            walls = defaultdict(float)
+            rows = 0
+            for case, engines in results.items():
+                outputs = {}
+                for engine, func in engines.items():
+                    outputs[engine], wall = timed(func, args.repeat if engine != 'reference' else 1)
+                    walls[engine] += wall
+                if isinstance(outputs[ref], pd.DataFrame):
+                    rows += len(outputs[ref])
+                # all engines agree with the reference
+                for engine, out in outputs.items():
+                    if engine != ref:
+                        failures += [f'{name} {case} {engine}: {x}' for x in compare(outputs[ref], out, args.rtol, args.atol)]
+                # integer outputs are also pinned to the baseline
+                if isinstance(outputs[ref], pd.DataFrame):
+                    key = f'{name} {case}'
+                    h = digest(outputs[ref])
+                    if args.update:
+                        baseline['digests'][key] = h
+                    elif key in baseline['digests'] and baseline['digests'][key] != h:
+                        failures.append(f'{key}: output differs from baseline')
+            for engine, wall in walls.items():
+                if engine == 'reference' or (args.no_perf and not args.update):
+                    continue
+                speed = (items or rows) / wall * scale
+                key = f'{name} {engine}'
+                old = baseline['throughput'].get(key)
+                status = '' if old is None else f'{speed / old:6.2f}x baseline'
+                print(f'{key:<28}{wall:10.3f}s {speed:14.1f} items/s {status}', file=sys.stderr)
+                if args.update:
+                    baseline['throughput'][key] = speed
+                elif old is not None and speed < old * args.slowdown:
+                    message = f'{key}: throughput {speed:.1f} is below {args.slowdown} of baseline {old:.1f}'
+                    (failures if args.strict_perf else warnings).append(message)
+
+    if args.update:
+        baseline['params'] = params
+        with open(args.baseline, 'w') as fw:
+            json.dump(baseline, fw, indent=2, sort_keys=True)
+        print(f'Baseline is saved to {args.baseline}', file=sys.stderr)
+    if warnings:
+        print('\n'.join(['SLOWER ' + x for x in warnings]), file=sys.stderr)
+    if failures:
+        print('\n'.join(['FAILED ' + x for x in failures]), file=sys.stderr)
+        sys.exit(1)
+    print('Done!', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import hashlib
+import inspect
+from multiprocessing import Pool
+
+
+# write a summary table as tsv or parquet, basename without extension
+def write_table(df, basename, fmt='tsv'):
+    if fmt == 'parquet':
+        df.to_parquet(f'{basename}.parquet', index=False)
+    else:
+        df.to_csv(f'{basename}.tsv', sep='\t', index=False)
+    print(f'Table is saved to {basename}.{fmt}')
+
+
+# use non-interactive backend for rendering to files
+def use_agg():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+# add one job argument to hash
+def update_hash(h, x):
+    import numpy as np
+    import pandas as pd
+    if isinstance(x, pd.Series):
+        x = x.to_frame()
+    if isinstance(x, pd.DataFrame):
+        h.update(repr([x.shape, list(x.columns), [str(t) for t in x.dtypes]]).encode())
+        h.update(pd.util.hash_pandas_object(x, index=False).values.tobytes())
+    elif isinstance(x, np.ndarray):
+        h.update(repr(x.tolist()).encode())
+    else:
+        h.update(repr(x).encode())
+
+
+# add bytecode, constants and names of a function and its nested functions to hash
+# constants such as figure size or labels do not change the bytecode
+def update_code_hash(h, code):
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode())
+    for c in code.co_consts:
+        if inspect.iscode(c):
+            update_code_hash(h, c)
+        else:
+            h.update(repr(c).encode())
+
+
+# fingerprint of a figure job: drawing function, its module source, data slices and plot options
+# the module source covers helper functions and module constants used by the drawing function
+def fingerprint(job):
+    func, args, kwargs = job
+    h = hashlib.sha256()
+    h.update(f'{func.__module__}.{func.__qualname__}'.encode())
+    update_code_hash(h, func.__code__)
+    try:
+        h.update(inspect.getsource(sys.modules[func.__module__]).encode())
+    except (KeyError, OSError, TypeError):
+        pass
+    for x in args:
+        update_hash(h, x)
+    for k in sorted(kwargs):
+        h.update(k.encode())
+        update_hash(h, kwargs[k])
+    return h.hexdigest()
+
+
+# check whether the output of a job is rendered with the same fingerprint
+def is_cached(output, key):
+    if not os.path.exists(output) or not os.path.exists(output + '.hash'):
+        return False
+    with open(output + '.hash') as fr:
+        return fr.read().strip() == key
+
+
+# run a figure job: (function, args, kwargs), and store its fingerprint with the output
+def render(job):
+    use_agg()
+    job, key = job
+    func, args, kwargs = job
+    func(*args, **kwargs)
+    if key:
+        with open(kwargs['output'] + '.hash', 'w') as fw:
+            fw.write(key + '\n')
+
+
+# render figure jobs, in a process pool if threads > 1
+# each job should carry only the data slice it draws, and output in kwargs
+# figures with unchanged fingerprint are skipped unless force is set
+# prof: profileUtils.Profiler, each figure is a stage when rendered in this process
+def render_jobs(jobs, threads=1, force=False, prof=None):
+    use_agg()
+    todo = []
+    for job in jobs:
+        key = fingerprint(job) if 'output' in job[2] else None
+        if key and not force and is_cached(job[2]['output'], key):
+            continue
+        todo.append([job, key])
+    if len(todo) < len(jobs):
+        print(f'{len(jobs) - len(todo)} of {len(jobs)} figures unchanged, skipped')
+    if threads > 1 and len(todo) > 1 and prof is not None:
+        with prof.stage(f'render {len(todo)} figures', processes=min(threads, len(todo))):
+            with Pool(min(threads, len(todo))) as pool:
+                pool.map(render, todo, chunksize=1)
+    elif threads > 1 and len(todo) > 1:
+        with Pool(min(threads, len(todo))) as pool:
+            pool.map(render, todo, chunksize=1)
+    elif prof is not None:
+        for job in todo:
+            with prof.stage('render ' + os.path.basename(job[0][2].get('output', job[0][0].__name__))):
+                render(job)
+    else:
+        for job in todo:
+            render(job)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import sys
+import importlib
+
+# subcommand: (module, description)
+# modules are only imported when their subcommand runs
+COMMANDS = {
+        'flanks': ('get_flanks', 'Generate ARS flanks'),
+        'index': ('build_index', 'Build a position index of rNMP bed files'),
+        'annotate': ('annotate_reads', 'Annotate rNMPs with distance to ARS and count them in any bins'),
+        'context': ('count_context', 'Count nucleotide context of rNMPs from a 2-bit packed genome'),
+        'region': ('get_region', 'Get a particular range from an ARS info file'),
+        'bg-region': ('get_bg_region', 'Sum up background file for a particular range'),
+        'normalize': ('normalize_ars', 'Normalize ARS region frequency with background'),
+        'merge': ('merge', 'Merge frequency files of libraries'),
+        'sort': ('sort', 'Sort libraries by genotype and strain'),
+        'pvalues': ('calc_p_ars', 'Paired tests for leading/lagging comparison'),
+        'check-time': ('check_time', 'Check whether ARS firing time affects rNMP incorporation'),
+        'simulate': ('rate_simulation', 'Simulate rNMP incorporation rate change around ARS'),
+        'genome-sim': ('genome_simulation', 'Simulate polymerase usage and rNMP incorporation genome-wide'),
+        'ratio-tracks': ('ratio_tracks', 'Genome-wide leading/lagging ratio and RPB tracks'),
+        'plot-bar': ('draw_bar_plot', 'Bar charts for leading/lagging percentage'),
+        'plot-lela': ('draw_lela', 'Scatter plots and bar charts for leading/lagging ratio'),
+        'plot-ars-split': ('draw_ars_split', 'Line charts for rNMP incorporation and leading/lagging ratio'),
+        'plot-box': ('generate_box_plot', 'Box plots for dinucleotide frequency on leading/lagging strand'),
+        'plot-ribose': ('draw_ribose', 'Heatmaps for rNMP incorporation preference'),
+        }
+
+# stages that take the table of the previous stage in a chain
+CHAIN_INPUT = ['normalize', 'sort', 'pvalues', 'plot-bar', 'plot-lela', 'plot-ars-split']
+
+# stages that pass a table to the next stage in a chain
+CHAIN_OUTPUT = ['normalize', 'merge', 'sort']
+
+
+def usage():
+    lines = ['usage: rnmp.py <command> [options]', \
+            '       rnmp.py chain <command> [options] then <command> - [options] ...', '', 'commands:']
+    lines += [f'  {k:<16}{v[1]}' for k, v in COMMANDS.items()]
+    lines += ['', 'In a chain, use - as the input file of a stage to take the table of the previous stage.', \
+            'Intermediate tables are only written when -o is given.']
+    return '\n'.join(lines)
+
+
+# run a single subcommand
+def run(command, argv, **kwargs):
+    if command not in COMMANDS:
+        sys.exit(f'Unknown command: {command}\n\n{usage()}')
+    module = importlib.import_module(COMMANDS[command][0])
+    return module.main(argv, **kwargs)
+
+
+# split chain arguments into stages
+def split_stages(argv, sep='then'):
+    stages = [[]]
+    for w in argv:
+        if w == sep:
+            stages.append([])
+        else:
+            stages[-1].append(w)
+    if any(len(x) == 0 for x in stages):
+        sys.exit(f'Empty stage in chain\n\n{usage()}')
+    return stages
+
+
+# run stages in one process, passing tables in memory
+def chain(argv):
+    stages = split_stages(argv)
+    for i, stage in enumerate(stages):
+        command = stage[0]
+        if i < len(stages) - 1 and command not in CHAIN_OUTPUT:
+            sys.exit(f'{command} cannot pass a table to the next stage, chainable: {", ".join(CHAIN_OUTPUT)}')
+        if i > 0 and command not in CHAIN_INPUT:
+            sys.exit(f'{command} cannot take a table from the previous stage, chainable: {", ".join(CHAIN_INPUT)}')
+    data = None
+    for i, stage in enumerate(stages):
+        command, argv = stage[0], stage[1:]
+        kwargs = {}
+        if i > 0:
+            kwargs['data'] = data
+        if command in CHAIN_OUTPUT:
+            kwargs['write'] = i == len(stages) - 1
+        data = run(command, argv, **kwargs)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ['-h', '--help']:
+        print(usage())
+        return
+    if argv[0] == 'chain':
+        chain(argv[1:])
+    else:
+        run(argv[0], argv[1:])
+
+
+if __name__ == '__main__':
+    main()
@@ -3,16 +3,11 @@
 import pandas as pd
 import argparse
 import sys
+from profileUtils import Profiler, add_profile_args
 
-def main():
-    parser = argparse.ArgumentParser(description='Sort data for figure 1')
-    parser.add_argument('tsv', type=argparse.FileType('r'), help='Input file')
-    parser.add_argument('-o', type=argparse.FileType('w'), default=sys.stdout, help='Output to file')
-    args = parser.parse_args()
-
-    # read csv
-    df = pd.read_csv(args.tsv, sep='\t')
-
+# sort libraries by genotype and strain orders
+def sort_frame(df):
+    df = df.copy()
     # change orders
     orders = {'Genotype': ['WT','rnh201', 'PolWT','Pol2M644G','Pol3L612M','Pol3L612G', 'Pol1L868M', 'Pol1Y869A'],\
               'String': ['RS','EM', 'HY']}
@@ -23,10 +18,30 @@ def main():
         df[k] = pd.Categorical(df[k], v)
 
     # sort
-    df = df.sort_values(list(orders.keys()) + ['Library'])
+    return df.sort_values(list(orders.keys()) + ['Library'])
+
+
+def main(argv=None, data=None, write=True):
+    parser = argparse.ArgumentParser(description='Sort data for figure 1')
+    parser.add_argument('tsv', type=argparse.FileType('r'), help='Input file')
+    parser.add_argument('-o', type=argparse.FileType('w'), default=sys.stdout, help='Output to file')
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    prof = Profiler.from_args(args, 'sort')
+
+    # read csv
+    with prof.stage('read') as st:
+        df = data if data is not None else pd.read_csv(args.tsv, sep='\t')
+        st['rows'] = len(df)
+    with prof.stage('sort', rows=len(df)):
+        df = sort_frame(df)
 
     # out
-    df.to_csv(args.o, sep='\t', index=False)
+    if write or args.o is not sys.stdout:
+        with prof.stage('write', rows=len(df)):
+            df.to_csv(args.o, sep='\t', index=False)
+    prof.write()
+    return df
 
 if __name__ == '__main__':
     main()
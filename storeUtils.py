@@ -0,0 +1,175 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+
+
+# genotype, time and flank are copied into counts so they can be indexed together
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS libraries (
+    name TEXT PRIMARY KEY,
+    string TEXT,
+    genotype TEXT,
+    reset TEXT,
+    source TEXT,
+    size INTEGER,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS windows (
+    id INTEGER PRIMARY KEY,
+    analysis TEXT NOT NULL,
+    chrom TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    ars TEXT,
+    time REAL,
+    flank INTEGER,
+    strand TEXT
+);
+CREATE TABLE IF NOT EXISTS counts (
+    window INTEGER NOT NULL REFERENCES windows(id),
+    library TEXT NOT NULL,
+    genotype TEXT,
+    time REAL,
+    flank INTEGER,
+    leading INTEGER NOT NULL,
+    lagging INTEGER NOT NULL,
+    PRIMARY KEY (window, library)
+);
+CREATE INDEX IF NOT EXISTS windows_position ON windows (chrom, start);
+CREATE INDEX IF NOT EXISTS windows_analysis ON windows (analysis);
+CREATE INDEX IF NOT EXISTS counts_library ON counts (library);
+CREATE INDEX IF NOT EXISTS counts_group ON counts (genotype, time, flank);
+'''
+
+
+def open_store(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# bulk insert, one transaction per batch
+def insert_rows(conn, sql, rows, batch=50000):
+    buf = []
+    for r in rows:
+        buf.append(r)
+        if len(buf) == batch:
+            with conn:
+                conn.executemany(sql, buf)
+            buf = []
+    if buf:
+        with conn:
+            conn.executemany(sql, buf)
+
+
+# libinfo: {name: (string, genotype, RE)}, sources: {name: countUtils.file_signature}
+def add_libraries(conn, libinfo, sources=None):
+    sources = sources or {}
+    rows = []
+    for name, info in libinfo.items():
+        sig = sources.get(name, {})
+        rows.append([name] + list(info) + [sig.get('path'), sig.get('size'), sig.get('mtime')])
+    insert_rows(conn, 'INSERT OR REPLACE INTO libraries VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+
+# replace windows of an analysis, windows: (chrom, start, end, ars, time, flank, leading strand)
+# return window ids in the same order
+def add_windows(conn, analysis, windows):
+    with conn:
+        conn.execute('DELETE FROM counts WHERE window IN (SELECT id FROM windows WHERE analysis = ?)', (analysis,))
+        conn.execute('DELETE FROM windows WHERE analysis = ?', (analysis,))
+    insert_rows(conn, 'INSERT INTO windows (analysis, chrom, start, end, ars, time, flank, strand) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', \
+            ([analysis] + [x.item() if isinstance(x, np.generic) else x for x in w] for w in windows))
+    return window_ids(conn, analysis)
+
+
+def window_ids(conn, analysis):
+    return [x[0] for x in conn.execute('SELECT id FROM windows WHERE analysis = ? ORDER BY id', (analysis,))]
+
+
+# replace counts of libraries in an analysis
+# counts: {library: (leading, lagging)}, each a sequence in the order of window ids
+def add_counts(conn, analysis, counts):
+    ids = window_ids(conn, analysis)
+    groups = dict(conn.execute('SELECT name, genotype FROM libraries'))
+    windows = list(conn.execute('SELECT time, flank FROM windows WHERE analysis = ? ORDER BY id', (analysis,)))
+    for lib, (leading, lagging) in counts.items():
+        with conn:
+            conn.execute('DELETE FROM counts WHERE library = ? AND window IN (SELECT id FROM windows WHERE analysis = ?)', (lib, analysis))
+        insert_rows(conn, 'INSERT INTO counts VALUES (?, ?, ?, ?, ?, ?, ?)', \
+                ([i, lib, groups.get(lib), t, f, int(le), int(la)] for i, (t, f), le, la in zip(ids, windows, leading, lagging)))
+
+
+# counts of every window and library, joined with library information
+def read_counts(conn, analysis):
+    return pd.read_sql_query('''SELECT c.library AS Library, l.string AS String, c.genotype AS Genotype, l.reset AS RE,
+            w.chrom, w.start, w.end, w.ars, w.time, w.flank, w.strand, c.leading, c.lagging
+            FROM counts c JOIN windows w ON c.window = w.id LEFT JOIN libraries l ON c.library = l.name
+            WHERE w.analysis = ? ORDER BY w.id, c.library''', conn, params=(analysis,))
+
+
+# time group label of each firing time, same groups as getFlankUtils.sep_ars
+def time_labels(times, ts, labels=None):
+    ts = [0] + (ts or [])
+    labels = labels or ['%g' % t for t in ts]
+    if len(labels) != len(ts):
+        raise ValueError(f'{len(ts)} time labels are needed, {len(labels)} given')
+    idx = np.clip(np.searchsorted(ts, times, side='left') - 1, 0, None)
+    return np.array(labels)[idx]
+
+
+# sums of windows in each library, time group, distance to ARS (flank) and strand
+def _group_sums(conn, analysis, ts, labels):
+    df = pd.read_sql_query('''SELECT c.library AS Library, l.string AS String, c.genotype AS Genotype, l.reset AS RE,
+            c.time, abs(c.flank) AS flank, sum(c.leading) AS leading, sum(c.lagging) AS lagging, sum(w.end - w.start) AS bases
+            FROM counts c JOIN windows w ON c.window = w.id LEFT JOIN libraries l ON c.library = l.name
+            WHERE w.analysis = ? GROUP BY c.library, c.time, abs(c.flank)''', conn, params=(analysis,))
+    if len(df) == 0:
+        raise ValueError(f'No counts of analysis {analysis} in store')
+    df['Time'] = time_labels(df.time.to_numpy(), ts, labels)
+    keys = ['Library', 'String', 'Genotype', 'RE', 'Time', 'flank']
+    return df.groupby(keys, sort=False, dropna=False)[['leading', 'lagging', 'bases']].sum().reset_index()
+
+
+# one row per strand, in the column order of normalized frequency files
+def _strand_rows(df, column):
+    d = []
+    for s in ['leading', 'lagging']:
+        ds = df[['Library', 'String', 'Genotype', 'RE', 'Time', column]].copy()
+        ds['Strand'] = s
+        ds['Sum'] = df[s].to_numpy()
+        ds['RPB'] = df[s].to_numpy() / df.bases.to_numpy()
+        d.append(ds)
+    return pd.concat(d).sort_values(['Library', 'Time', column, 'Strand'], ascending=[True, True, True, False]).reset_index(drop=True)
+
+
+# counts within each flank length from ARS: Library, String, Genotype, RE, Time, Flank, Strand, Sum, RPB
+def region_table(conn, analysis, flanks, ts=None, labels=None, pool_time=False):
+    df = _group_sums(conn, analysis, ts, labels)
+    if pool_time:
+        da = df.copy()
+        da['Time'] = 'all'
+        df = pd.concat([df, da])
+    keys = ['Library', 'String', 'Genotype', 'RE', 'Time']
+    d = []
+    for f in flanks:
+        dr = df[df.flank <= int(f)].groupby(keys, sort=False, dropna=False)[['leading', 'lagging', 'bases']].sum().reset_index()
+        dr['Flank'] = int(f)
+        d.append(dr)
+    return _strand_rows(pd.concat(d), 'Flank')
+
+
+# counts of each bin: Library, String, Genotype, RE, Time, Position, Strand, Sum, RPB
+def bin_table(conn, analysis, ts=None, labels=None):
+    df = _group_sums(conn, analysis, ts, labels).rename(columns={'flank':'Position'})
+    return _strand_rows(df, 'Position')
+
+
+# options to read tables from a store instead of a frequency file
+def add_store_args(parser, analysis='flanks'):
+    group = parser.add_argument_group('Count store')
+    group.add_argument('--store', help='Read counts from a SQLite store instead of the input file, use - as input file')
+    group.add_argument('--analysis', default=analysis, help=f'Analysis in the store, default={analysis}')
+    group.add_argument('--time_split', type=float, nargs='+', help='Separators of firing time for store counts, default=no split')
+    group.add_argument('--time_labels', nargs='+', help='Labels of firing time groups, default=separators')
+    return group
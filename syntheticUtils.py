@@ -0,0 +1,109 @@
+import numpy as np
+
+# sacCer3 chromosome sizes
+YEAST_SIZES = {'chrI':230218, 'chrII':813184, 'chrIII':316620, 'chrIV':1531933, 'chrV':576874, 'chrVI':270161, \
+        'chrVII':1090940, 'chrVIII':562643, 'chrIX':439888, 'chrX':745751, 'chrXI':666816, 'chrXII':1078177, \
+        'chrXIII':924431, 'chrXIV':784333, 'chrXV':1091291, 'chrXVI':948066, 'chrM':85779}
+BASES = ['A', 'C', 'G', 'T']
+
+
+# write .fai like index: chrom, size
+def write_faidx(path, sizes=YEAST_SIZES):
+    with open(path, 'w') as fw:
+        fw.write(''.join([f'{c}\t{s}\t0\t80\t81\n' for c, s in sizes.items()]))
+
+
+# origins shaped like ARS_bed/ars_timing.bed: chrom, start, end, name, firing time
+# origins are evenly spread over nuclear chromosomes with jitter
+def make_ars(n, rng, sizes=YEAST_SIZES, min_gap=2000):
+    chroms = [c for c in sizes if c != 'chrM']
+    total = sum(sizes[c] for c in chroms)
+    arss = []
+    for c in chroms:
+        k = max(1, int(round(n * sizes[c] / total)))
+        centers = np.linspace(0, sizes[c], k + 2)[1:-1]
+        jitter = rng.uniform(-0.25, 0.25, k) * sizes[c] / (k + 1)
+        starts = np.unique(np.clip(centers + jitter, min_gap, sizes[c] - min_gap).astype(int) // min_gap * min_gap)
+        times = rng.normal(27, 5, len(starts)).clip(15, 40)
+        arss += [(c, s, s + 1, f'{c}{s}', round(t, 2)) for s, t in zip(starts, times)]
+    return arss
+
+
+def write_ars(path, arss, with_time=True):
+    with open(path, 'w') as fw:
+        for a in arss:
+            fw.write('\t'.join([str(x) for x in (a if with_time else a[:4])]) + '\n')
+
+
+# rNMP reads in 6 column bed, uniform over the genome, written in chunks
+def write_reads(path, n, rng, sizes=YEAST_SIZES, chunk=1000000):
+    chroms = np.array(list(sizes.keys()))
+    lengths = np.array(list(sizes.values()))
+    with open(path, 'w') as fw:
+        for start in range(0, n, chunk):
+            size = min(chunk, n - start)
+            idx = rng.choice(len(chroms), size=size, p=lengths/lengths.sum())
+            pos = (rng.random(size) * lengths[idx]).astype(int)
+            order = np.lexsort([pos, idx])
+            idx, pos = idx[order], pos[order]
+            strands = np.where(rng.random(size) < 0.5, '+', '-')
+            lines = np.char.add(np.char.add(chroms[idx], '\t'), pos.astype(str))
+            lines = np.char.add(np.char.add(lines, '\t'), (pos + 1).astype(str))
+            lines = np.char.add(np.char.add(lines, '\t.\t0\t'), strands)
+            fw.write('\n'.join(lines.tolist()) + '\n')
+
+
+# library information: library, strain, genotype, RE set
+def make_libinfo(nlibs, genotypes=['WT', 'rnh201']):
+    return [[f'L{i}', 'E134', genotypes[i % len(genotypes)], f'RE{i % 3 + 1}'] for i in range(nlibs)]
+
+
+def write_libinfo(path, libinfo):
+    with open(path, 'w') as fw:
+        fw.write(''.join(['\t'.join(x) + '\n' for x in libinfo]))
+
+
+# ARS frequency table, input of normalize_ars and get_region
+# Library, String, Genotype, RE, Time, Position, Strand, Sum, A, C, G, T
+def make_freq_table(libinfo, positions, rng, times=['early', 'late'], strands=['leading', 'lagging']):
+    import pandas as pd
+    keys = pd.MultiIndex.from_product([range(len(libinfo)), times, positions, strands]).to_frame(index=False)
+    info = np.array(libinfo)[keys[0].to_numpy()]
+    counts = rng.poisson(rng.uniform(20, 200, (len(keys), 1)), (len(keys), 4))
+    df = pd.DataFrame({'Library':info[:, 0], 'String':info[:, 1], 'Genotype':info[:, 2], 'RE':info[:, 3], \
+            'Time':keys[1], 'Position':keys[2], 'Strand':keys[3], 'Sum':counts.sum(axis=1)})
+    for i, b in enumerate(BASES):
+        df[b] = counts[:, i]
+    return df
+
+
+# background table for normalize_ars, one row for each name_time_position_strand
+def make_bg_table(name, positions, rng, times=['early', 'late'], strands=['leading', 'lagging']):
+    import pandas as pd
+    index = [f'{name}_{t}_{p}_{s}' for t in times for p in positions for s in strands]
+    return pd.DataFrame(rng.integers(10000, 100000, (len(index), 4)), index=pd.Index(index, name='chrom'), columns=BASES)
+
+
+# table for calc_p_ars: Library, String, Genotype, RE, Time, Flank, Strand and features
+def make_pvalue_table(libinfo, rng, times=['25', '30', 'all'], flanks=[5000, 10000, 15000], nfeatures=12):
+    import pandas as pd
+    d = []
+    for lib in libinfo:
+        for t in times:
+            for f in flanks:
+                for s in ['leading', 'lagging']:
+                    d.append(list(lib) + [t, f, s])
+    df = pd.DataFrame(d, columns=['Library', 'String', 'Genotype', 'RE', 'Time', 'Flank', 'Strand'])
+    values = rng.random((len(df), nfeatures))
+    for i in range(nfeatures):
+        df[f'F{i}'] = values[:, i]
+    return df
+
+
+# count files for merge.py: chrom named library-strain-genotype, then counts
+def write_count_file(path, libinfo, rng, ncols=16):
+    columns = [a + b for a in BASES for b in BASES][:ncols]
+    with open(path, 'w') as fw:
+        fw.write('\t'.join(['chrom'] + columns) + '\n')
+        for lib in libinfo:
+            fw.write('\t'.join(['-'.join(lib[:3])] + [str(x) for x in rng.integers(0, 1000, ncols)]) + '\n')
@@ -0,0 +1,17 @@
+from checkTimeInputs import read_data, read_index
+from countUtils import build_index, CountIndex
+
+WINDOWS = [('chrI', 100, 200, 20.0, 'R', '+'), ('chrI', 300, 400, 20.0, 'L', '-')]
+READS = [('chrI', 150, '+'), ('chrI', 160, '-'), ('chrI', 170, '.'), ('chrI', 350, '-'), ('chrI', 360, '.'), ('chrI', 370, '+')]
+
+
+def test_bed_and_index_skip_other_strands(tmp_path):
+    with open(tmp_path / 'L0.bed', 'w') as fw:
+        for chrom, pos, strand in READS:
+            fw.write(f'{chrom}\t{pos}\t{pos + 1}\tr\t0\t{strand}\n')
+    build_index([str(tmp_path / 'L0.bed')], str(tmp_path / 'index'))
+    bed = read_data(WINDOWS, ['L0'], str(tmp_path))
+    index = read_index(WINDOWS, ['L0'], CountIndex(str(tmp_path / 'index')))
+    for w in WINDOWS:
+        assert dict(bed[w]['leading']) == dict(index[w]['leading']) == {'L0':1}
+        assert dict(bed[w]['lagging']) == dict(index[w]['lagging']) == {'L0':1}
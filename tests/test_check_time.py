@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+import syntheticUtils as su
+from check_time import main
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    rng = np.random.default_rng(5)
+    su.write_ars(tmp_path / 'early.bed', su.make_ars(60, rng))
+    su.write_ars(tmp_path / 'late.bed', su.make_ars(40, rng))
+    libinfo = su.make_libinfo(4)
+    (tmp_path / 'libs').mkdir()
+    for lib in libinfo:
+        su.write_reads(tmp_path / 'libs' / f'{lib[0]}.bed', 20000, rng)
+    for n in [3, 4]:
+        su.write_libinfo(tmp_path / f'list{n}.tsv', libinfo[:n])
+    return tmp_path
+
+
+def run(d, ars, n, o, *options):
+    main([str(d / x) for x in ars] + [str(d / f'list{n}.tsv'), '-bed', str(d / 'libs'), '-o', str(d / o), '--data-only'] + list(options))
+
+
+@pytest.mark.parametrize('ars', [['early.bed'], ['early.bed', 'late.bed']])
+def test_update_matches_full_run(inputs, ars):
+    tags = [''] if len(ars) == 1 else ['_early', '_late']
+    run(inputs, ars, 4, 'full')
+    run(inputs, ars, 3, 'full3')
+    # new library, then nothing changed, then a library removed from the list
+    for n, expected in [[3, 'full3'], [4, 'full'], [4, 'full'], [3, 'full3']]:
+        run(inputs, ars, n, 'update', '--update')
+        for t in tags:
+            pd.testing.assert_frame_equal(pd.read_csv(inputs / f'update{t}_data.csv'), pd.read_csv(inputs / f'{expected}{t}_data.csv'))
+
+
+def test_single_firing_time_skips_regression(inputs, capsys):
+    su.write_ars(inputs / 'confirmed.bed', su.make_ars(60, np.random.default_rng(6)), with_time=False)
+    run(inputs, ['confirmed.bed', 'early.bed'], 4, 'out', '--default_time', '30')
+    assert 'fewer than two firing times' in capsys.readouterr().out
+    assert (inputs / 'out_confirmed_summary.tsv').exists()
+    assert not (inputs / 'out_confirmed_regression.tsv').exists()
+    # later sets are still analyzed
+    assert (inputs / 'out_early_regression.tsv').exists()
@@ -0,0 +1,32 @@
+import numpy as np
+from rate_simulation import PARAMS, fork_coverage, leading_fractions, sample_ars, get_rates, monte_carlo, bin_labels
+
+
+def test_leading_coverage_is_whole_forks():
+    nforks = 3000
+    leading, lagging = fork_coverage([PARAMS, nforks, 0, 7])
+    assert leading.dtype.kind == 'i' and lagging.dtype.kind == 'i'
+    # same forks as fork_coverage
+    devs, pold_lengths = sample_ars(PARAMS, nforks, np.random.default_rng(7))
+    expected = leading_fractions(PARAMS['length_max'], devs, pold_lengths, PARAMS['length_pola']) * nforks
+    assert np.abs(leading - expected).max() < 1e-6
+    assert (leading.sum(axis=1) == nforks).all()
+    assert (lagging.sum(axis=1) == nforks).all()
+
+
+def test_monte_carlo_counts_match_expected():
+    params = dict(PARAMS, rate_pola=0.05, rate_pold=0.01, rate_pole=0.02)
+    nforks, chunk, binsize = 4000, 1000, 100
+    df = monte_carlo(params, 1, nforks, binsize, chunk=chunk)
+    # coverage of the same random streams as monte_carlo
+    lib_seed = np.random.SeedSequence(params['seed']).spawn(1)[0]
+    coverages = [fork_coverage([params, chunk, 0, s]) for s in lib_seed.spawn(nforks // chunk)]
+    rates = np.asarray(get_rates(params)[0])
+    positions, index = np.unique(bin_labels(params, binsize), return_inverse=True)
+    for k, strand in enumerate(['leading', 'lagging']):
+        coverage = np.sum([c[k] for c in coverages], axis=0)
+        expected = np.bincount(index, weights=(coverage * rates).sum(axis=1))
+        observed = df[df.Strand == strand].set_index('Position').loc[positions, 'Sum'].to_numpy()
+        # binomial variance is below the mean
+        assert np.all(np.abs(observed - expected) < 5 * np.sqrt(expected))
+        assert abs(observed.sum() - expected.sum()) < 4 * np.sqrt(expected.sum())
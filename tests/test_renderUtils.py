@@ -0,0 +1,64 @@
+import importlib
+import sys
+import pandas as pd
+from renderUtils import fingerprint, render_jobs
+
+MODULE = '''
+SIZE = {size}
+
+def scale(x):
+    return x * {factor}
+
+def draw(df, output):
+    with open(output, 'w') as fw:
+        fw.write(str(scale(df.x.sum()) + {figsize}) + '\\n')
+'''
+
+
+def load(tmp_path, monkeypatch, **kwargs):
+    params = {'size':1, 'factor':1, 'figsize':10}
+    params.update(kwargs)
+    (tmp_path / 'fake_plot.py').write_text(MODULE.format(**params))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    sys.modules.pop('fake_plot', None)
+    importlib.invalidate_caches()
+    return importlib.import_module('fake_plot')
+
+
+def job(module, tmp_path):
+    return [module.draw, [pd.DataFrame({'x':[1, 2]})], {'output':str(tmp_path / 'fig.txt')}]
+
+
+def test_unchanged_job_is_skipped(tmp_path, monkeypatch, capsys):
+    module = load(tmp_path, monkeypatch)
+    render_jobs([job(module, tmp_path)])
+    render_jobs([job(module, tmp_path)])
+    assert '1 of 1 figures unchanged, skipped' in capsys.readouterr().out
+
+
+def test_constant_change_renders_again(tmp_path, monkeypatch):
+    module = load(tmp_path, monkeypatch)
+    render_jobs([job(module, tmp_path)])
+    assert (tmp_path / 'fig.txt').read_text() == '13\n'
+    key = fingerprint(job(module, tmp_path))
+    old = module.draw
+    module = load(tmp_path, monkeypatch, figsize=200)
+    # bytecode alone does not see the new constant
+    assert module.draw.__code__.co_code == old.__code__.co_code
+    assert fingerprint(job(module, tmp_path)) != key
+    render_jobs([job(module, tmp_path)])
+    assert (tmp_path / 'fig.txt').read_text() == '203\n'
+
+
+def test_helper_change_renders_again(tmp_path, monkeypatch):
+    module = load(tmp_path, monkeypatch)
+    key = fingerprint(job(module, tmp_path))
+    module = load(tmp_path, monkeypatch, factor=100)
+    assert fingerprint(job(module, tmp_path)) != key
+
+
+def test_module_constant_change_renders_again(tmp_path, monkeypatch):
+    module = load(tmp_path, monkeypatch)
+    key = fingerprint(job(module, tmp_path))
+    module = load(tmp_path, monkeypatch, size=100)
+    assert fingerprint(job(module, tmp_path)) != key